@@ -0,0 +1,7 @@
+"""Shared numerics for the analysis scripts under `plots/`.
+
+The model directories (`hmm`, `state-space`, ...) are not importable packages,
+so their `plot.py` scripts put `plots/` on `sys.path` and import from here.
+`python -m analysis` runs any of them from one command line, see
+`analysis.cli`.
+"""
@@ -0,0 +1,101 @@
+"""Particle-count sweeps from the prefixes of one large run.
+
+Instead of a separate inference run per entry of `--num-particles-list`, the
+first n particles of a single run of N >= max(num_particles_list) particles
+are used as the n-particle estimate. Every prefix comes out of one pass over
+the run: blocks are fed into a `MomentAccumulator` (whose running maximum log
+weight plays the part of a cumulative logsumexp, and whose power sums are the
+cumulative weighted sums) and its estimate is read off whenever the number of
+particles seen reaches a requested prefix size.
+
+The prefixes of importance sampling and CSIS runs are exactly runs with fewer
+independent particles. The prefixes of a resampled SMC population are not: they
+are subsamples of a population of N, so their error shrinks faster with n than
+an n-particle SMC run's would.
+"""
+
+import itertools
+
+from analysis.driver import evaluate_grid, evaluation_grid
+
+
+def add_anytime_argument(parser):
+    """Adds --anytime-run to an argparse.ArgumentParser."""
+
+    parser.add_argument('--anytime-run', type=int, metavar='NUM_PARTICLES',
+                        help='evaluate every entry of --num-particles-list '
+                        'on the first particles of the single run '
+                        '{algorithm}_{dataset_num}_{NUM_PARTICLES}.csv '
+                        'instead of on separate runs')
+
+
+def prefix_estimates(blocks, accumulator, prefix_sizes, estimate):
+    """Returns {n: estimate(accumulator)} after feeding the first n particles
+    of blocks into accumulator, for every n in prefix_sizes, in one pass.
+
+    input:
+        blocks: iterable of (log_weights, particle_values), e.g. from
+            analysis.dumps.iter_dump_blocks
+        accumulator: object with update(log_weights, particle_values), e.g. an
+            analysis.moments.MomentAccumulator
+        prefix_sizes: iterable of positive ints
+        estimate: function of the accumulator; its result must not alias the
+            accumulator's state, which keeps changing
+
+    output: dict
+    """
+
+    prefix_sizes = sorted(set(prefix_sizes))
+    estimates = {}
+    num_seen = 0
+    next_prefix = 0
+    for log_weights, particle_values in blocks:
+        start = 0
+        while next_prefix < len(prefix_sizes) and \
+                prefix_sizes[next_prefix] <= num_seen + len(log_weights):
+            end = prefix_sizes[next_prefix] - num_seen
+            accumulator.update(log_weights[start:end],
+                               particle_values[start:end])
+            estimates[prefix_sizes[next_prefix]] = estimate(accumulator)
+            start = end
+            next_prefix += 1
+        if next_prefix == len(prefix_sizes):
+            return estimates
+        accumulator.update(log_weights[start:], particle_values[start:])
+        num_seen += len(log_weights)
+
+    raise ValueError('the run has {} particles but prefixes up to {} were '
+                     'requested'.format(num_seen, prefix_sizes[-1]))
+
+
+def evaluate_anytime(evaluate_run, dataset_nums, num_particles_list,
+                     algorithms, jobs=1, profiler=None):
+    """Returns {(dataset_num, num_particles, algorithm): result} like
+    analysis.driver.evaluate_grid, with one call per run instead of per cell.
+
+    input:
+        evaluate_run: picklable function taking (dataset_num, algorithm) and
+            returning {num_particles: result} for every num_particles in
+            num_particles_list
+        jobs: number of worker processes, see analysis.driver.evaluate_grid
+        profiler: analysis.profiling.Profiler or None; records every run as a
+            cell with the fields dataset_num and algorithm
+
+    output: dict in the order of analysis.driver.evaluation_grid
+    """
+
+    runs = list(itertools.product(dataset_nums, algorithms))
+    if profiler is None:
+        runs = evaluate_grid(evaluate_run, runs, jobs)
+    else:
+        runs = profiler.evaluate_grid(
+            evaluate_run, runs, jobs, fields=('dataset_num', 'algorithm')
+        )
+
+    return {
+        (dataset_num, num_particles, algorithm):
+            runs[(dataset_num, algorithm)][num_particles]
+        for dataset_num, num_particles, algorithm in evaluation_grid(
+            dataset_nums, num_particles_list, algorithms
+        )
+    }
@@ -0,0 +1,223 @@
+"""On-disk cache kept next to the files it is derived from.
+
+Cached artifacts live in a `.analysis-cache/` directory beside their source
+file. Converted dumps are stored with a small JSON record of the source's
+signature and go stale as soon as it no longer matches the source; computed
+results (`cached_arrays`) carry a digest of every file they were computed
+from.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+CACHE_DIRNAME = '.analysis-cache'
+VALIDATION_MODES = ('mtime', 'hash')
+
+
+def cache_filename(source_filename, suffix):
+    """Returns the path of a cache entry derived from source_filename."""
+
+    directory, basename = os.path.split(os.path.abspath(source_filename))
+    return os.path.join(directory, CACHE_DIRNAME, basename + suffix)
+
+
+def file_digest(filenames):
+    """Returns the SHA-1 hex digest of the concatenated contents of files."""
+
+    sha1 = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def file_signature(filename, validate='mtime'):
+    """Returns a dict that changes whenever the file changes.
+
+    input:
+        filename: str
+        validate: 'mtime' (size and modification time, free to compute) or
+            'hash' (content digest, robust to touched or copied files)
+
+    output: dict
+    """
+
+    if validate == 'mtime':
+        stat = os.stat(filename)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    elif validate == 'hash':
+        return {'sha1': file_digest([filename])}
+    else:
+        raise ValueError('validate must be one of {}, got {!r}'.format(
+            VALIDATION_MODES, validate
+        ))
+
+
+def read_signature(meta_filename):
+    """Returns the signature stored in meta_filename or None if missing."""
+
+    try:
+        with open(meta_filename) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_signature(meta_filename, signature):
+    """Writes signature to meta_filename atomically."""
+
+    _ensure_directory(meta_filename)
+    temp_filename = _temp_filename(meta_filename)
+    with open(temp_filename, 'w') as f:
+        json.dump(signature, f)
+    os.replace(temp_filename, meta_filename)
+
+
+def save_array(filename, array):
+    """Saves array as .npy to filename atomically.
+
+    Concurrent writers of the same entry are safe; the last one wins and
+    readers never see a partially written file.
+    """
+
+    _ensure_directory(filename)
+    temp_filename = _temp_filename(filename)
+    with open(temp_filename, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(temp_filename, filename)
+
+
+class ArrayAppender(object):
+    """Writes the float .npy entry at filename row block by row block, for
+    arrays whose number of rows is only known once the last block is in.
+
+    Blocks go to a temporary file right after a header for zero rows, and
+    `commit` overwrites that header with the final shape and moves the file
+    into place. numpy pads .npy headers so that the first axis can grow
+    without changing their length, so the data is written exactly once.
+    """
+
+    def __init__(self, filename):
+        _ensure_directory(filename)
+        self.filename = filename
+        self.num_rows = 0
+        self.row_shape = None
+        self._header_length = None
+        self._file = open(_temp_filename(filename), 'wb')
+
+    def append(self, rows):
+        """Writes rows, np.ndarray [num_rows, dim_1, ..., dim_N], after the
+        rows appended so far."""
+
+        rows = np.ascontiguousarray(rows, dtype=float)
+        if self.row_shape is None:
+            self.row_shape = rows.shape[1:]
+            header = _npy_header((0,) + self.row_shape)
+            self._header_length = len(header)
+            self._file.write(header)
+        self._file.write(rows.data)
+        self.num_rows += len(rows)
+
+    def commit(self):
+        """Publishes the rows appended so far as the entry at filename."""
+
+        shape = (self.num_rows,) + (self.row_shape or ())
+        header = _npy_header(shape)
+        if len(header) == self._header_length:
+            self._file.seek(0)
+            self._file.write(header)
+            self._file.close()
+            os.replace(_temp_filename(self.filename), self.filename)
+        else:
+            # No appended rows, or a numpy without room to grow the header.
+            self._file.close()
+            save_array(self.filename, np.fromfile(
+                _temp_filename(self.filename), dtype=float,
+                offset=self._header_length or 0
+            ).reshape(shape))
+
+    def discard(self):
+        """Removes the temporary file without publishing anything."""
+
+        self._file.close()
+        try:
+            os.remove(_temp_filename(self.filename))
+        except OSError:
+            pass
+
+
+def load_array(filename):
+    """Returns the .npy array at filename memory-mapped read-only."""
+
+    try:
+        return np.load(filename, mmap_mode='r')
+    except ValueError:
+        # Empty arrays cannot be memory-mapped.
+        return np.load(filename)
+
+
+def cached_arrays(entry_filename, input_filenames, compute, key=''):
+    """Returns compute(), a tuple of arrays, reusing a previous result.
+
+    The result is stored as .npz at entry_filename together with a digest of
+    key and of the contents of input_filenames; it is recomputed and
+    overwritten whenever any input file changes.
+
+    input:
+        entry_filename: str, e.g. from cache_filename
+        input_filenames: list of str
+        compute: function of no arguments returning a tuple of np.ndarray
+        key: str mixed into the digest, e.g. to version the computation
+
+    output: tuple of np.ndarray
+    """
+
+    digest = ':'.join(
+        [key] + [file_digest([filename]) for filename in input_filenames]
+    )
+    try:
+        with np.load(entry_filename) as entry:
+            if str(entry['digest']) == digest:
+                return tuple(
+                    entry['array_{}'.format(i)]
+                    for i in range(len(entry.files) - 1)
+                )
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+
+    arrays = tuple(compute())
+    _ensure_directory(entry_filename)
+    temp_filename = _temp_filename(entry_filename)
+    with open(temp_filename, 'wb') as f:
+        np.savez(f, digest=np.array(digest), **{
+            'array_{}'.format(i): array for i, array in enumerate(arrays)
+        })
+    os.replace(temp_filename, entry_filename)
+
+    return arrays
+
+
+def _npy_header(shape):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(float)),
+        'fortran_order': False,
+        'shape': shape
+    })
+    return header.getvalue()
+
+
+def _ensure_directory(filename):
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+
+
+def _temp_filename(filename):
+    return '{}.{}.tmp'.format(filename, os.getpid())
@@ -0,0 +1,120 @@
+"""One command line for the plot scripts of every model.
+
+From plots/,
+
+    python -m analysis [--directory DIR] [--output-directory DIR] MODEL \
+        [MODEL OPTIONS]
+
+runs the plot script of MODEL (see `PLUGINS`) with the options after the
+model name, exactly as if it had been run from DIR, which defaults to the
+model's own directory. `python -m analysis MODEL --help` lists the options
+of MODEL; the loader, cache and parallel driver options (`--no-cache`,
+`--dedupe`, `--jobs`, ...) are the ones every script gets from
+`analysis.dumps` and `analysis.driver`.
+
+A plot script is only imported once its model is chosen, so listing the
+models imports none of them. Scripts are imported by file name from their
+own directory, which lets the worker processes of `--jobs` import them
+again.
+
+Every figure, metric table and profile is written through
+`analysis.paths.output_filename`, which puts relative names under
+`--output-directory` (default: the directory). Files the script reads, such
+as the metric table of `--replot`, are still looked up as named.
+"""
+
+import argparse
+import collections
+import importlib
+import os
+import sys
+
+from analysis import paths
+
+PLOTS_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+)
+
+# model: (plot script relative to plots/, help)
+PLUGINS = collections.OrderedDict([
+    ('hmm', (
+        'hmm/plot.py',
+        'hidden Markov model posterior marginals'
+    )),
+    ('state-space', (
+        'state-space/plot.py',
+        'linear Gaussian state-space posterior means and variances'
+    )),
+    ('factorial-hmm', (
+        'factorial-hmm/plot.py',
+        'factorial HMM posterior feature marginals'
+    )),
+    ('poly-regression', (
+        'polynomial-regression-variable-x/plot.py',
+        'polynomial regression particles and posterior predictive error'
+    )),
+    ('gmm-fixed', (
+        'gmm-fixed-number-of-clusters/plot.py',
+        'GMM cluster means with a fixed number of clusters'
+    )),
+    ('gmm-variable', (
+        'gmm-variable-number-of-clusters/plot.py',
+        'GMM cluster means with a variable number of clusters'
+    )),
+    ('detector', (
+        'gmm-variable-number-of-clusters/detector-hits-clustering/'
+        'plot-object-detector.py',
+        'clustering of object detector hits on images'
+    ))
+])
+
+def plugin_filename(model):
+    """Returns the absolute path of the plot script of model."""
+
+    return os.path.abspath(os.path.join(PLOTS_DIRECTORY, PLUGINS[model][0]))
+
+
+def load_plugin(model):
+    """Imports and returns the plot script of model as a module."""
+
+    directory, basename = os.path.split(plugin_filename(model))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    return importlib.import_module(os.path.splitext(basename)[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m analysis',
+        description='Run the plot script of a model.',
+        epilog='models:\n' + '\n'.join(
+            '  {:<18}{}'.format(model, description)
+            for model, (_, description) in PLUGINS.items()
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--directory',
+                        help='directory the model files and inference '
+                        'results are read from, and relative paths in the '
+                        'model options are relative to (default: the '
+                        'model\'s directory under plots/)')
+    parser.add_argument('--output-directory',
+                        help='directory the figures, metric tables and '
+                        'profiles are written to (default: --directory)')
+    parser.add_argument('model', choices=list(PLUGINS), metavar='MODEL',
+                        help='one of the models below')
+    parser.add_argument('model_argv', nargs=argparse.REMAINDER,
+                        metavar='...',
+                        help='options of the model, see MODEL --help')
+    args = parser.parse_args(argv)
+
+    directory = args.directory or os.path.dirname(plugin_filename(args.model))
+    if args.output_directory is not None:
+        paths.set_output_directory(args.output_directory)
+    plugin = load_plugin(args.model)
+
+    os.chdir(directory)
+    # The script's own parser names itself after sys.argv[0].
+    sys.argv = ['python -m analysis ' + args.model] + args.model_argv
+    plugin.main(args.model_argv)
@@ -0,0 +1,200 @@
+"""Weight degeneracy diagnostics of importance-weighted particle sets.
+
+Posterior means hide how much of a particle set actually carries weight. For
+normalized weights p_1, ..., p_N these report
+
+    ess         effective sample size 1 / sum_i p_i^2, between 1 and N
+    max_weight  largest p_i
+    entropy     -sum_i p_i log p_i in nats, log N for equal weights
+    pareto_k    shape of a generalized Pareto distribution fitted to the
+                largest weights as in Pareto smoothed importance sampling
+                (Vehtari et al., 2015); above 0.7 the weights' variance is
+                effectively infinite and the estimates are unreliable
+
+All of them are computed from the unnormalized log weights alone, without
+exponentiating them unshifted.
+"""
+
+import collections
+import os
+import re
+
+import numpy as np
+
+from analysis.dumps import DEFAULT_BLOCK_SIZE, load_log_weights
+from analysis.metrics import make_metric_table
+from analysis.moments import logsumexp
+
+DUMP_PATTERN = re.compile(r'^([A-Za-z]+)_(\d+)_(\d+)\.csv$')
+TIMINGS_FILENAME = 'timings.csv'
+
+WeightDiagnostics = collections.namedtuple(
+    'WeightDiagnostics', ['ess', 'max_weight', 'entropy', 'pareto_k']
+)
+DIAGNOSTIC_NAMES = list(WeightDiagnostics._fields) + ['ess_per_second']
+
+
+def effective_sample_size(log_weights):
+    """Returns 1 / sum_i p_i^2 of the normalized weights p."""
+
+    log_weights = np.asarray(log_weights, dtype=float)
+    return np.exp(2 * logsumexp(log_weights) - logsumexp(2 * log_weights))
+
+
+def max_normalized_weight(log_weights):
+    """Returns the largest normalized weight."""
+
+    log_weights = np.asarray(log_weights, dtype=float)
+    return np.exp(np.max(log_weights) - logsumexp(log_weights))
+
+
+def weight_entropy(log_weights):
+    """Returns the entropy in nats of the normalized weights."""
+
+    log_weights = np.asarray(log_weights, dtype=float)
+    log_normalized = log_weights - logsumexp(log_weights)
+    positive = np.isfinite(log_normalized)
+    return -np.sum(
+        np.exp(log_normalized[positive]) * log_normalized[positive]
+    )
+
+
+def pareto_k(log_weights):
+    """Returns the Pareto smoothed importance sampling shape estimate k of the
+    weights' upper tail, or nan if fewer than five weights exceed the tail
+    cutoff (e.g. when all weights are equal).
+
+    The tail is the largest min(N / 5, 3 sqrt(N)) weights and the shape is
+    fitted with the method of Zhang and Stephens (2009), using the same weakly
+    informative prior as PSIS.
+    """
+
+    log_weights = np.sort(np.asarray(log_weights, dtype=float))
+    log_weights = log_weights[np.isfinite(log_weights)]
+    num_particles = len(log_weights)
+    if num_particles == 0:
+        return np.nan
+    log_weights -= log_weights[-1]
+
+    tail_length = int(np.ceil(min(0.2 * num_particles,
+                                  3 * np.sqrt(num_particles))))
+    cutoff = log_weights[max(num_particles - tail_length - 1, 0)]
+    cutoff = max(cutoff, np.log(np.finfo(float).tiny))
+    tail = log_weights[log_weights > cutoff]
+    if len(tail) <= 4:
+        return np.nan
+
+    return _fit_generalized_pareto_shape(np.exp(tail) - np.exp(cutoff))
+
+
+def weight_diagnostics(log_weights):
+    """Returns WeightDiagnostics of a particle set.
+
+    input:
+        log_weights: np.ndarray [num_particles] of unnormalized log weights
+    """
+
+    return WeightDiagnostics(
+        ess=effective_sample_size(log_weights),
+        max_weight=max_normalized_weight(log_weights),
+        entropy=weight_entropy(log_weights),
+        pareto_k=pareto_k(log_weights)
+    )
+
+
+def dump_weight_diagnostics(filename, block_size=DEFAULT_BLOCK_SIZE,
+                            cache=True):
+    """Returns WeightDiagnostics of an inference dump from its log weight
+    column alone, see analysis.dumps.load_log_weights."""
+
+    return weight_diagnostics(
+        load_log_weights(filename, block_size=block_size, cache=cache)
+    )
+
+
+def find_dumps(directory):
+    """Returns [(dataset_num, num_particles, algorithm)] of every
+    `{algorithm}_{dataset_num}_{num_particles}.csv` in directory, sorted."""
+
+    cells = []
+    for name in os.listdir(directory):
+        match = DUMP_PATTERN.match(name)
+        if match:
+            cells.append((
+                int(match.group(2)), int(match.group(3)), match.group(1)
+            ))
+
+    return sorted(cells)
+
+
+def read_timings(filename):
+    """Returns {(dataset_num, num_particles, algorithm): seconds} from a CSV
+    file with the header `algorithm,dataset_num,num_particles,seconds`, or an
+    empty dict if it does not exist."""
+
+    if not os.path.exists(filename):
+        return {}
+    timings = {}
+    with open(filename) as f:
+        columns = f.readline().strip().split(',')
+        for line in f:
+            if line.strip():
+                row = dict(zip(columns, line.strip().split(',')))
+                timings[(
+                    int(row['dataset_num']), int(row['num_particles']),
+                    row['algorithm']
+                )] = float(row['seconds'])
+
+    return timings
+
+
+def diagnostics_table(directory, block_size=DEFAULT_BLOCK_SIZE, cache=True):
+    """Returns the weight diagnostics of every dump in directory as a table
+    (see analysis.metrics.make_metric_table) with the columns of
+    DIAGNOSTIC_NAMES. ess_per_second is nan for runs missing from the
+    directory's timings.csv."""
+
+    timings = read_timings(os.path.join(directory, TIMINGS_FILENAME))
+    rows = []
+    for cell in find_dumps(directory):
+        dataset_num, num_particles, algorithm = cell
+        diagnostics = dump_weight_diagnostics(
+            os.path.join(directory, '{}_{}_{}.csv'.format(
+                algorithm, dataset_num, num_particles
+            )),
+            block_size=block_size,
+            cache=cache
+        )
+        seconds = timings.get(cell, np.nan)
+        rows.append(cell + tuple(diagnostics) + (
+            diagnostics.ess / seconds if seconds > 0 else np.nan,
+        ))
+
+    return make_metric_table(DIAGNOSTIC_NAMES, rows)
+
+
+def _fit_generalized_pareto_shape(exceedances):
+    """Returns the posterior mean shape of a generalized Pareto distribution
+    fitted to positive exceedances (Zhang and Stephens, 2009)."""
+
+    exceedances = np.sort(exceedances)
+    num_exceedances = len(exceedances)
+    prior_bs = 3
+    prior_k = 10
+    num_grid = 30 + int(np.sqrt(num_exceedances))
+
+    b = 1 - np.sqrt(num_grid / (np.arange(1, num_grid + 1) - 0.5))
+    b /= prior_bs * exceedances[int(num_exceedances / 4 + 0.5) - 1]
+    b += 1 / exceedances[-1]
+    k = np.mean(np.log1p(-b[:, np.newaxis] * exceedances), axis=1)
+    log_likelihood = num_exceedances * (np.log(-b / k) - k - 1)
+    with np.errstate(over='ignore'):
+        weights = 1 / np.sum(
+            np.exp(log_likelihood - log_likelihood[:, np.newaxis]), axis=1
+        )
+    weights /= np.sum(weights)
+
+    b_post = np.sum(b * weights)
+    k_post = np.mean(np.log1p(-b_post * exceedances))
+    return (num_exceedances * k_post + prior_k * 0.5) / \
+        (num_exceedances + prior_k)
@@ -0,0 +1,58 @@
+"""Evaluation of the dataset x number of particles x algorithm grid.
+
+Every cell of the grid reads its own dump and reduces it to a small result, so
+cells are independent and can be spread over a process pool. Results are
+gathered in the parent keyed by cell, which makes the rendering code see
+exactly what the serial loop would have produced.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def add_jobs_argument(parser):
+    """Adds --jobs to an argparse.ArgumentParser."""
+
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes evaluating the grid '
+                        '(default: 1, 0 uses every core)')
+
+
+def evaluation_grid(dataset_nums, num_particles_list, algorithms):
+    """Returns the list of (dataset_num, num_particles, algorithm) cells in
+    the order the serial loops visit them."""
+
+    return list(
+        itertools.product(dataset_nums, num_particles_list, algorithms)
+    )
+
+
+def evaluate_grid(evaluate_cell, cells, jobs=1):
+    """Returns {cell: evaluate_cell(*cell)} for every cell.
+
+    input:
+        evaluate_cell: picklable function (a module-level function or a
+            functools.partial of one) taking the elements of a cell
+        cells: list of tuples, e.g. from evaluation_grid
+        jobs: number of worker processes; 1 evaluates in this process and 0
+            uses one worker per core
+
+    output: dict
+    """
+
+    if jobs == 0:
+        jobs = os.cpu_count()
+    if jobs == 1 or len(cells) <= 1:
+        return {cell: evaluate_cell(*cell) for cell in cells}
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(cells))) as executor:
+        results = list(
+            executor.map(_call, [evaluate_cell] * len(cells), cells)
+        )
+
+    return dict(zip(cells, results))
+
+
+def _call(function, args):
+    return function(*args)
@@ -0,0 +1,269 @@
+"""Loader for `{algorithm}_{dataset_num}_{num_particles}.csv` inference dumps.
+
+Each line of a dump is `<unnormalized_log_weight>,<value_1>,...,<value_D>`.
+Parsing the text is the slow part of every analysis run, so the first load
+converts a dump into two column files in the cache (see `analysis.cache`):
+
+    .analysis-cache/<dump>.log_weights.npy    [num_particles]
+    .analysis-cache/<dump>.values.npy         [num_particles, D]
+
+Later loads memory-map those files, so no bytes are copied until they are
+used. `iter_dump_blocks` reads a dump in fixed-size blocks for reductions that
+should run in constant memory, and `load_log_weights` reads only the log
+weight column.
+
+Resampled runs repeat many identical rows. With `dedupe=True` both loaders
+collapse them into unique rows whose weight is the sum of the copies' weights
+(see `deduplicate`), which leaves every weighted average unchanged.
+"""
+
+import collections
+import itertools
+import os
+
+import numpy as np
+
+from analysis import cache as cache_lib
+from analysis import profiling
+
+DEFAULT_BLOCK_SIZE = 10000
+
+ParticleDump = collections.namedtuple(
+    'ParticleDump', ['log_weights', 'particle_values']
+)
+
+
+def dump_filename(algorithm, dataset_num, num_particles):
+    """Returns the filename of an inference dump."""
+
+    return '{}_{}_{}.csv'.format(algorithm, dataset_num, num_particles)
+
+
+def read_dump_csv(filename):
+    """Parses an inference dump without touching the cache.
+
+    output: np.ndarray [num_particles, 1 + D]
+    """
+
+    with profiling.stage('parse'):
+        profiling.count_bytes_read(os.path.getsize(filename))
+        return np.loadtxt(filename, delimiter=',', ndmin=2)
+
+
+def add_dedupe_argument(parser):
+    """Adds --dedupe to an argparse.ArgumentParser."""
+
+    parser.add_argument('--dedupe', action='store_true',
+                        help='collapse identical particles into one particle '
+                        'with their summed weight before evaluating')
+
+
+def deduplicate(log_weights, particle_values):
+    """Returns a ParticleDump with one row per distinct particle value, in
+    order of first appearance, whose log weight is the log of the summed
+    weights of its copies.
+
+    Rows are compared bit for bit through a hashable void view, in one
+    np.unique pass.
+
+    input:
+        log_weights: np.ndarray [num_particles]
+        particle_values: np.ndarray [num_particles, D]
+
+    output: ParticleDump(log_weights: np.ndarray [num_unique],
+                         particle_values: np.ndarray [num_unique, D])
+    """
+
+    log_weights = np.asarray(log_weights, dtype=float)
+    particle_values = np.ascontiguousarray(particle_values, dtype=float)
+    if len(log_weights) == 0:
+        return ParticleDump(log_weights, particle_values)
+
+    rows = particle_values.view(
+        np.dtype((np.void, particle_values.dtype.itemsize *
+                  particle_values.shape[1]))
+    ).ravel()
+    _, first, inverse = np.unique(
+        rows, return_index=True, return_inverse=True
+    )
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    inverse = rank[np.ravel(inverse)]
+
+    group_max = np.full(len(order), -np.inf)
+    np.maximum.at(group_max, inverse, log_weights)
+    group_max[~np.isfinite(group_max)] = 0
+    sums = np.bincount(
+        inverse, weights=np.exp(log_weights - group_max[inverse]),
+        minlength=len(order)
+    )
+    with np.errstate(divide='ignore'):
+        unique_log_weights = np.log(sums) + group_max
+
+    return ParticleDump(unique_log_weights, particle_values[first[order]])
+
+
+def load_dump(filename, cache=True, validate='mtime', dedupe=False):
+    """Returns a ParticleDump of the inference dump at filename.
+
+    input:
+        filename: str
+        cache: bool; if False the CSV is always parsed and nothing is written
+        validate: 'mtime' or 'hash', see `analysis.cache.file_signature`
+        dedupe: bool; collapse identical particles, see `deduplicate`
+
+    output: ParticleDump(log_weights: np.ndarray [num_particles],
+                         particle_values: np.ndarray [num_particles, D])
+    """
+
+    if dedupe:
+        return deduplicate(*load_dump(filename, cache, validate))
+    if not cache:
+        inference_result = read_dump_csv(filename)
+        return ParticleDump(inference_result[:, 0], inference_result[:, 1:])
+
+    log_weights_filename, values_filename, meta_filename = \
+        _cache_filenames(filename)
+    signature = cache_lib.file_signature(filename, validate)
+    if cache_lib.read_signature(meta_filename) != signature:
+        inference_result = read_dump_csv(filename)
+        cache_lib.save_array(log_weights_filename, inference_result[:, 0])
+        cache_lib.save_array(values_filename, inference_result[:, 1:])
+        cache_lib.write_signature(meta_filename, signature)
+
+    with profiling.stage('load'):
+        dump = ParticleDump(
+            cache_lib.load_array(log_weights_filename),
+            cache_lib.load_array(values_filename)
+        )
+        profiling.count_bytes_read(
+            dump.log_weights.nbytes + dump.particle_values.nbytes
+        )
+    return dump
+
+
+def is_cached(filename, validate='mtime'):
+    """Returns whether the cache holds an up to date copy of filename."""
+
+    meta_filename = _cache_filenames(filename)[2]
+    return cache_lib.read_signature(meta_filename) == \
+        cache_lib.file_signature(filename, validate)
+
+
+def load_log_weights(filename, block_size=DEFAULT_BLOCK_SIZE, cache=True,
+                     validate='mtime'):
+    """Returns np.ndarray [num_particles] of the log weight column of the
+    inference dump at filename.
+
+    If cache is set and the cache entry is fresh, only its log weight file is
+    read. Otherwise only the first column of the CSV is converted, block_size
+    lines at a time, and the cache is left untouched because the values are
+    never parsed.
+    """
+
+    if cache and is_cached(filename, validate):
+        with profiling.stage('load'):
+            log_weights = np.array(
+                cache_lib.load_array(_cache_filenames(filename)[0])
+            )
+            profiling.count_bytes_read(log_weights.nbytes)
+        return log_weights
+
+    blocks = []
+    with open(filename) as f:
+        while True:
+            with profiling.stage('parse'):
+                lines = list(itertools.islice(f, block_size))
+                profiling.count_bytes_read(sum(len(line) for line in lines))
+                if lines:
+                    blocks.append(np.loadtxt(
+                        lines, delimiter=',', usecols=0, ndmin=1
+                    ))
+            if not lines:
+                return np.concatenate(blocks) if blocks else np.zeros(0)
+
+
+def iter_dump_blocks(filename, block_size=DEFAULT_BLOCK_SIZE, cache=True,
+                     validate='mtime', dedupe=False):
+    """Yields an inference dump in blocks of at most block_size particles.
+
+    Only one block is held in memory at a time. A fresh cache entry is sliced
+    through its memory map; otherwise the CSV is parsed block by block and,
+    if cache is set, each block is also appended to a new cache entry, which
+    is published once the last block has been yielded. A consumer that stops
+    early leaves no entry behind: finishing the entry would mean parsing the
+    rest of the CSV, which is what stopping early avoids. With
+    dedupe, each block is deduplicated on its own, so copies that fall in
+    different blocks stay separate rows; weighted sums are unaffected.
+
+    output: iterator of (log_weights: np.ndarray [block_size],
+                         particle_values: np.ndarray [block_size, D])
+    """
+
+    if dedupe:
+        for block in iter_dump_blocks(filename, block_size, cache, validate):
+            yield deduplicate(*block)
+    elif not cache:
+        for block in _parse_blocks(filename, block_size):
+            yield block
+    elif is_cached(filename, validate):
+        log_weights, particle_values = load_dump(filename, True, validate)
+        for start in range(0, len(log_weights), block_size):
+            yield np.asarray(log_weights[start:start + block_size]), \
+                np.asarray(particle_values[start:start + block_size])
+    else:
+        for block in _parse_blocks_into_cache(filename, block_size, validate):
+            yield block
+
+
+def _parse_blocks(filename, block_size):
+    with open(filename) as f:
+        while True:
+            with profiling.stage('parse'):
+                lines = list(itertools.islice(f, block_size))
+                profiling.count_bytes_read(sum(len(line) for line in lines))
+                if lines:
+                    block = np.loadtxt(lines, delimiter=',', ndmin=2)
+            if not lines:
+                return
+            if block.size:
+                yield block[:, 0], block[:, 1:]
+
+
+def _parse_blocks_into_cache(filename, block_size, validate):
+    log_weights_filename, values_filename, meta_filename = \
+        _cache_filenames(filename)
+    signature = cache_lib.file_signature(filename, validate)
+
+    appenders = None
+    try:
+        for log_weights, particle_values in _parse_blocks(
+            filename, block_size
+        ):
+            if appenders is None:
+                appenders = (
+                    cache_lib.ArrayAppender(log_weights_filename),
+                    cache_lib.ArrayAppender(values_filename)
+                )
+            appenders[0].append(log_weights)
+            appenders[1].append(particle_values)
+            yield log_weights, particle_values
+
+        if appenders is not None:
+            for appender in appenders:
+                appender.commit()
+            appenders = None
+            cache_lib.write_signature(meta_filename, signature)
+    finally:
+        if appenders is not None:
+            for appender in appenders:
+                appender.discard()
+
+
+def _cache_filenames(filename):
+    return (
+        cache_lib.cache_filename(filename, '.log_weights.npy'),
+        cache_lib.cache_filename(filename, '.values.npy'),
+        cache_lib.cache_filename(filename, '.json')
+    )
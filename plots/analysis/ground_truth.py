@@ -0,0 +1,422 @@
+"""Exact posteriors the inference results are compared against.
+
+`kalman_smoother` and `forward_backward` are plain NumPy implementations for
+the one-dimensional state-space model and the Gaussian-emission HMM. Both
+take observations of shape [..., num_timesteps], so many sequences are
+smoothed with one pass over time. `factorial_forward_backward` is exact for
+the factorial HMM. `factorial_gibbs` approximates it when there are too many
+features, but only on request, because its estimates can be far off. The
+`*_posterior`
+functions read `model.csv` and `data_{dataset_num}.csv` in the formats
+documented in the model READMEs and cache their result in `.analysis-cache/`.
+"""
+
+import warnings
+
+import numpy as np
+
+from analysis import cache as cache_lib
+from analysis import profiling
+
+# Bump when the computations below change so that cached results are redone.
+VERSION = '1'
+
+# 2^20 joint states take 8 MB per timestep in factorial_forward_backward.
+MAX_EXACT_FEATURES = 20
+
+
+def kalman_smoother(model, observations):
+    """Returns smoothed posterior means and variances of a 1-D linear
+    Gaussian state-space model.
+
+    The first observation is emitted by the initial state, as in pykalman.
+
+    input:
+        model: sequence of <initial_mean>, <initial_variance>,
+            <transition_multiplier>, <transition_offset>,
+            <transition_variance>, <emission_multiplier>, <emission_offset>,
+            <emission_variance>
+        observations: np.ndarray [..., num_timesteps]
+
+    output: (means, variances), each np.ndarray [..., num_timesteps]
+    """
+
+    initial_mean, initial_variance, transition_multiplier, transition_offset, \
+        transition_variance, emission_multiplier, emission_offset, \
+        emission_variance = model
+    observations = np.asarray(observations, dtype=float)
+    num_timesteps = observations.shape[-1]
+
+    predicted_means = np.empty(observations.shape)
+    predicted_variances = np.empty(num_timesteps)
+    filtered_means = np.empty(observations.shape)
+    filtered_variances = np.empty(num_timesteps)
+
+    predicted_mean = np.full(observations.shape[:-1], float(initial_mean))
+    predicted_variance = float(initial_variance)
+    for t in range(num_timesteps):
+        predicted_means[..., t] = predicted_mean
+        predicted_variances[t] = predicted_variance
+
+        gain = predicted_variance * emission_multiplier / (
+            emission_multiplier**2 * predicted_variance + emission_variance
+        )
+        filtered_means[..., t] = predicted_mean + gain * (
+            observations[..., t] - emission_multiplier * predicted_mean -
+            emission_offset
+        )
+        filtered_variances[t] = \
+            (1 - gain * emission_multiplier) * predicted_variance
+
+        predicted_mean = transition_multiplier * filtered_means[..., t] + \
+            transition_offset
+        predicted_variance = transition_multiplier**2 * \
+            filtered_variances[t] + transition_variance
+
+    smoothed_means = np.empty(observations.shape)
+    smoothed_variances = np.empty(num_timesteps)
+    smoothed_means[..., -1] = filtered_means[..., -1]
+    smoothed_variances[-1] = filtered_variances[-1]
+    for t in range(num_timesteps - 2, -1, -1):
+        smoother_gain = filtered_variances[t] * transition_multiplier / \
+            predicted_variances[t + 1]
+        smoothed_means[..., t] = filtered_means[..., t] + smoother_gain * (
+            smoothed_means[..., t + 1] - predicted_means[..., t + 1]
+        )
+        smoothed_variances[t] = filtered_variances[t] + smoother_gain**2 * (
+            smoothed_variances[t + 1] - predicted_variances[t + 1]
+        )
+
+    return smoothed_means, np.broadcast_to(
+        smoothed_variances, observations.shape
+    ).copy()
+
+
+def gaussian_log_likelihoods(means, variances, observations):
+    """Returns np.ndarray [..., num_timesteps, num_states] of log densities of
+    each observation under each state's normal emission distribution."""
+
+    observations = np.asarray(observations, dtype=float)[..., np.newaxis]
+    return -0.5 * (
+        np.log(2 * np.pi * variances) + (observations - means)**2 / variances
+    )
+
+
+def forward_backward(initial_probabilities, transition_matrix,
+                     log_likelihoods):
+    """Returns posterior state marginals of an HMM.
+
+    Scaled forward-backward recursions; each step is one batched matrix
+    product over all sequences.
+
+    input:
+        initial_probabilities: np.ndarray [..., num_states]
+        transition_matrix: np.ndarray [..., num_states, num_states] where
+            element (j, k) is the probability of transitioning from state j
+            to k
+        log_likelihoods: np.ndarray [..., num_timesteps, num_states]
+
+    The leading dimensions of the three inputs broadcast against each other,
+    so independent chains with different parameters can share one call.
+
+    output: np.ndarray [..., num_states, num_timesteps]
+    """
+
+    log_likelihoods = np.asarray(log_likelihoods, dtype=float)
+    transition_matrix = np.asarray(transition_matrix, dtype=float)
+    num_timesteps = log_likelihoods.shape[-2]
+    likelihoods = np.exp(
+        log_likelihoods - np.max(log_likelihoods, axis=-1, keepdims=True)
+    )
+
+    alphas = [None] * num_timesteps
+    alpha = initial_probabilities * likelihoods[..., 0, :]
+    for t in range(num_timesteps):
+        if t > 0:
+            alpha = np.einsum('...j,...jk->...k', alpha, transition_matrix) * \
+                likelihoods[..., t, :]
+        alpha = alpha / np.sum(alpha, axis=-1, keepdims=True)
+        alphas[t] = alpha
+
+    posteriors = [None] * num_timesteps
+    posteriors[-1] = alphas[-1]
+    beta = np.ones(likelihoods.shape[-1:])
+    for t in range(num_timesteps - 2, -1, -1):
+        beta = np.einsum(
+            '...k,...jk->...j', likelihoods[..., t + 1, :] * beta,
+            transition_matrix
+        )
+        beta = beta / np.sum(beta, axis=-1, keepdims=True)
+        posterior = alphas[t] * beta
+        posteriors[t] = posterior / np.sum(posterior, axis=-1, keepdims=True)
+
+    return np.stack(posteriors, axis=-1)
+
+
+def hmm_parameters(model):
+    """Splits an HMM model.csv array into (initial_probabilities,
+    transition_matrix, emission_means, emission_variances)."""
+
+    num_states = np.shape(model)[1]
+    return model[0], model[1:(num_states + 1)], model[num_states + 1], \
+        model[num_states + 2]
+
+
+def hmm_posterior(model_filename, data_filename, cache=True):
+    """Returns np.ndarray [num_states, num_timesteps] of exact posterior state
+    marginals for the HMM in model_filename given data_filename."""
+
+    def compute():
+        initial_probabilities, transition_matrix, means, variances = \
+            hmm_parameters(np.genfromtxt(model_filename, delimiter=','))
+        observations = np.genfromtxt(data_filename, delimiter=',')
+        posterior = forward_backward(
+            initial_probabilities,
+            transition_matrix,
+            gaussian_log_likelihoods(means, variances, observations)
+        )
+        return (posterior,)
+
+    return _cached('hmm', model_filename, data_filename, compute, cache)[0]
+
+
+def state_space_posterior(model_filename, data_filename, cache=True):
+    """Returns (means, variances), each np.ndarray [num_timesteps], of the
+    exact smoothing posterior for the state-space model in model_filename
+    given data_filename."""
+
+    def compute():
+        return kalman_smoother(
+            np.genfromtxt(model_filename, delimiter=','),
+            np.genfromtxt(data_filename, delimiter=',')
+        )
+
+    return _cached(
+        'state_space', model_filename, data_filename, compute, cache
+    )
+
+
+def read_factorial_hmm_model(model_filename):
+    """Returns (initial_probabilities [num_features], transition_matrices
+    [num_features, 2, 2], emission_weights [num_features], emission_variance)
+    from a factorial HMM model.csv, whose rows have different lengths."""
+
+    with open(model_filename) as f:
+        rows = [[float(x) for x in line.split(',')]
+                for line in f if line.strip()]
+    num_features = len(rows[0])
+
+    return np.array(rows[0]), \
+        np.reshape(rows[1:(num_features + 1)], (num_features, 2, 2)), \
+        np.array(rows[num_features + 1]), rows[num_features + 2][0]
+
+
+def factorial_forward_backward(initial_probabilities, transition_matrices,
+                               emission_weights, emission_variance,
+                               observations):
+    """Returns exact posterior probabilities of each feature being on.
+
+    Forward-backward over the 2^num_features joint states, held as an array
+    with one axis of length 2 per feature. Transitions factorize over
+    features, so each step applies the num_features 2x2 matrices one axis at
+    a time: O(num_features 2^num_features) instead of O(4^num_features).
+    Memory is num_timesteps joint arrays.
+
+    input:
+        initial_probabilities: np.ndarray [num_features]
+        transition_matrices: np.ndarray [num_features, 2, 2]
+        emission_weights: np.ndarray [num_features]
+        emission_variance: float
+        observations: np.ndarray [num_timesteps]
+
+    output: np.ndarray [num_features, num_timesteps]
+    """
+
+    num_features = len(initial_probabilities)
+    num_timesteps = len(observations)
+
+    def along_axis(vector, feature):
+        return np.reshape(vector, (1,) * feature + (2,) +
+                          (1,) * (num_features - feature - 1))
+
+    joint_means = 0
+    joint_initial_probabilities = 1
+    for feature in range(num_features):
+        joint_means = joint_means + \
+            emission_weights[feature] * along_axis([0, 1], feature)
+        joint_initial_probabilities = joint_initial_probabilities * along_axis(
+            [1 - initial_probabilities[feature],
+             initial_probabilities[feature]],
+            feature
+        )
+
+    def likelihood(t):
+        log_likelihood = -(observations[t] - joint_means)**2 / \
+            (2 * emission_variance)
+        return np.exp(log_likelihood - np.max(log_likelihood))
+
+    def transition(joint, transpose):
+        for feature in range(num_features):
+            matrix = transition_matrices[feature]
+            joint = np.moveaxis(np.tensordot(
+                matrix.T if transpose else matrix, joint, axes=([0], [feature])
+            ), 0, feature)
+        return joint
+
+    alphas = [None] * num_timesteps
+    alpha = joint_initial_probabilities * likelihood(0)
+    for t in range(num_timesteps):
+        if t > 0:
+            alpha = transition(alpha, False) * likelihood(t)
+        alpha /= np.sum(alpha)
+        alphas[t] = alpha
+
+    marginals = np.empty((num_features, num_timesteps))
+    beta = np.ones(alpha.shape)
+    for t in range(num_timesteps - 1, -1, -1):
+        if t < num_timesteps - 1:
+            beta = transition(beta * likelihood(t + 1), True)
+            beta /= np.sum(beta)
+        posterior = alphas[t] * beta
+        posterior /= np.sum(posterior)
+        for feature in range(num_features):
+            marginals[feature, t] = np.sum(np.take(posterior, 1, axis=feature))
+        alphas[t] = None
+
+    return marginals
+
+
+def factorial_gibbs(initial_probabilities, transition_matrices,
+                    emission_weights, emission_variance, observations,
+                    num_chains=64, num_sweeps=300, num_burn_in=100, seed=0):
+    """Returns Gibbs estimates of the posterior probabilities of each feature
+    being on, for models too large for factorial_forward_backward.
+
+    Each sweep resamples every feature's whole state sequence given the
+    others by forward filtering, backward sampling, for num_chains
+    independent chains at once. Features whose emission weights nearly sum to
+    another's mix slowly when the emission variance is small. On the model in
+    factorial-hmm/, 256 chains of 1000 sweeps are no closer to the exact
+    marginals than the defaults, so compare against exact marginals of a
+    smaller model before trusting the estimates.
+
+    input: as factorial_forward_backward, plus
+        num_chains: int, chains run side by side
+        num_sweeps: int, sweeps per chain including burn-in
+        num_burn_in: int, sweeps discarded from the estimate
+        seed: int
+
+    output: np.ndarray [num_features, num_timesteps]
+    """
+
+    random_state = np.random.RandomState(seed)
+    num_features = len(initial_probabilities)
+    num_timesteps = len(observations)
+
+    states = (random_state.rand(num_chains, num_timesteps, num_features) <
+              initial_probabilities).astype(float)
+    filtered = np.empty((num_chains, num_timesteps, 2))
+    totals = np.zeros((num_timesteps, num_features))
+    for sweep in range(num_sweeps):
+        for feature in range(num_features):
+            weight = emission_weights[feature]
+            transition_matrix = transition_matrices[feature]
+            residuals = observations - np.dot(states, emission_weights) + \
+                states[..., feature] * weight
+            log_likelihoods = np.stack(
+                [-residuals**2, -(residuals - weight)**2], axis=-1
+            ) / (2 * emission_variance)
+            likelihoods = np.exp(
+                log_likelihoods -
+                np.max(log_likelihoods, axis=-1, keepdims=True)
+            )
+
+            alpha = likelihoods[:, 0] * [
+                1 - initial_probabilities[feature],
+                initial_probabilities[feature]
+            ]
+            for t in range(num_timesteps):
+                if t > 0:
+                    alpha = np.dot(alpha, transition_matrix) * \
+                        likelihoods[:, t]
+                alpha = alpha / np.sum(alpha, axis=-1, keepdims=True)
+                filtered[:, t] = alpha
+
+            uniforms = random_state.rand(num_chains, num_timesteps)
+            sampled = (uniforms[:, -1] < filtered[:, -1, 1]).astype(int)
+            states[:, -1, feature] = sampled
+            for t in range(num_timesteps - 2, -1, -1):
+                unnormalized = filtered[:, t] * transition_matrix[:, sampled].T
+                sampled = (uniforms[:, t] * np.sum(unnormalized, axis=-1) <
+                           unnormalized[:, 1]).astype(int)
+                states[:, t, feature] = sampled
+
+        if sweep >= num_burn_in:
+            totals += np.mean(states, axis=0)
+
+    return np.transpose(totals / (num_sweeps - num_burn_in))
+
+
+def factorial_hmm_posterior(model_filename, data_filename,
+                            max_exact_features=MAX_EXACT_FEATURES,
+                            approximate=False, cache=True):
+    """Returns np.ndarray [num_features, num_timesteps] of posterior
+    probabilities of each feature being on, exact when there are at most
+    max_exact_features features.
+
+    With more features, Gibbs estimates from factorial_gibbs are returned
+    with a warning if approximate is set, and ValueError is raised otherwise:
+    the chains can stay in one mode however long they run, so distances to
+    the estimates need not be distances to the posterior.
+    """
+
+    def compute():
+        parameters = read_factorial_hmm_model(model_filename)
+        observations = np.genfromtxt(data_filename, delimiter=',')
+        if len(parameters[0]) <= max_exact_features:
+            marginals = factorial_forward_backward(*(
+                parameters + (observations,)
+            ))
+        else:
+            marginals = factorial_gibbs(*(parameters + (observations,)))
+        return (marginals,)
+
+    with open(model_filename) as f:
+        num_features = len(f.readline().split(','))
+    if num_features <= max_exact_features:
+        method = 'exact'
+    elif approximate:
+        method = 'gibbs'
+        warnings.warn(
+            'the ground truth of {} is a Gibbs estimate, not exact: {} has '
+            '{} features, more than {}'.format(
+                data_filename, model_filename, num_features,
+                max_exact_features
+            )
+        )
+    else:
+        raise ValueError(
+            '{} has {} features, more than the {} the exact ground truth is '
+            'computed for; set approximate to estimate it by Gibbs sampling '
+            'instead'.format(model_filename, num_features, max_exact_features)
+        )
+
+    return _cached(
+        'factorial_hmm_{}'.format(method), model_filename, data_filename,
+        compute, cache
+    )[0]
+
+
+def _cached(name, model_filename, data_filename, compute, cache):
+    with profiling.stage('ground_truth'):
+        if not cache:
+            return compute()
+
+        return cache_lib.cached_arrays(
+            cache_lib.cache_filename(
+                data_filename, '.{}_ground_truth.npz'.format(name)
+            ),
+            [model_filename, data_filename],
+            compute,
+            key='{}-{}'.format(name, VERSION)
+        )
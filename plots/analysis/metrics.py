@@ -0,0 +1,158 @@
+"""Distances between exact and estimated posterior marginals, and the table
+of every distance over the evaluation grid that the plots are drawn from."""
+
+import json
+
+import numpy as np
+
+from analysis import profiling
+from analysis.paths import output_filename
+
+
+def get_sum_kl(posterior_1, posterior_2, epsilon=1e-10):
+    """Returns sum over timesteps of KL(posterior_1 || posterior_2).
+
+    input:
+        posterior_1, posterior_2: np.ndarray [num_states, ...] of marginal
+            probabilities, states along the first axis
+    """
+
+    return np.sum(
+        posterior_1 * (
+            np.log(posterior_1 + epsilon) - np.log(posterior_2 + epsilon)
+        )
+    )
+
+
+def get_sum_l2(posterior_1, posterior_2):
+    """Returns sum over timesteps of the L2 distance between posterior_1 and
+    posterior_2, laid out as in get_sum_kl."""
+
+    return np.sum(np.sqrt(np.sum((posterior_1 - posterior_2)**2, axis=0)))
+
+
+def metric_table(true_posteriors, posteriors, metrics):
+    """Returns every metric of every evaluated cell as one table.
+
+    input:
+        true_posteriors: {dataset_num: exact posterior}
+        posteriors: {(dataset_num, num_particles, algorithm): estimated
+            posterior}, e.g. the result of analysis.driver.evaluate_grid
+        metrics: list of (name, function) pairs where function takes the
+            exact and the estimated posterior and returns a float
+
+    output: np.ndarray [num_cells] structured with fields dataset_num,
+        num_particles, algorithm and one float field per metric name, rows in
+        the order of posteriors
+    """
+
+    with profiling.stage('metrics'):
+        return make_metric_table(
+            [name for name, _ in metrics],
+            [
+                cell + tuple(
+                    metric(true_posteriors[cell[0]], posterior)
+                    for _, metric in metrics
+                ) for cell, posterior in posteriors.items()
+            ]
+        )
+
+
+def make_metric_table(metric_names, rows):
+    """Returns a table like metric_table's from already computed values.
+
+    input:
+        metric_names: list of str
+        rows: list of (dataset_num, num_particles, algorithm, value_1, ...,
+            value_M) tuples, one value per metric name
+
+    output: np.ndarray [len(rows)] structured as in metric_table
+    """
+
+    table = np.empty(len(rows), dtype=_table_dtype(
+        metric_names, max([len(row[2]) for row in rows] + [1])
+    ))
+    for i, row in enumerate(rows):
+        table[i] = tuple(row)
+
+    return table
+
+
+def save_metric_table(filename, table):
+    """Writes a table from metric_table as CSV with a header line, or as a
+    JSON list of one object per row if filename ends in .json.
+
+    output: the path the table was written to, see
+        analysis.paths.output_filename
+    """
+
+    filename = output_filename(filename)
+    if filename.endswith('.json'):
+        with open(filename, 'w') as f:
+            json.dump([
+                dict(zip(table.dtype.names, row)) for row in table.tolist()
+            ], f, indent=2)
+            f.write('\n')
+        return filename
+
+    with open(filename, 'w') as f:
+        f.write(','.join(table.dtype.names) + '\n')
+        for row in table.tolist():
+            f.write(','.join(
+                repr(value) if isinstance(value, float) else str(value)
+                for value in row
+            ) + '\n')
+
+    return filename
+
+
+def load_metric_table(filename):
+    """Returns a table saved by save_metric_table at filename, which is
+    opened as named."""
+
+    if filename.endswith('.json'):
+        with open(filename) as f:
+            rows = json.load(f)
+        names = list(rows[0]) if rows else list(_table_dtype([], 1).names)
+        return make_metric_table(names[3:], [
+            tuple(row[name] for name in names) for row in rows
+        ])
+
+    with open(filename) as f:
+        names = f.readline().strip().split(',')
+        rows = [line.strip().split(',') for line in f if line.strip()]
+
+    return make_metric_table(names[3:], [
+        (int(row[0]), int(row[1]), row[2]) +
+        tuple(float(value) for value in row[3:]) for row in rows
+    ])
+
+
+def metric_series(table, metric, dataset_num, algorithm, num_particles_list):
+    """Returns the values of metric for one dataset and algorithm, in the
+    order of num_particles_list.
+
+    output: list of floats
+    """
+
+    rows = table[
+        (table['dataset_num'] == dataset_num) &
+        (table['algorithm'] == algorithm)
+    ]
+    values = dict(zip(rows['num_particles'].tolist(), rows[metric].tolist()))
+
+    return [values[num_particles] for num_particles in num_particles_list]
+
+
+def column_values(table, column):
+    """Returns the distinct values of a table column in order of appearance."""
+
+    return list(dict.fromkeys(table[column].tolist()))
+
+
+def _table_dtype(metric_names, max_algorithm_length):
+    return np.dtype(
+        [('dataset_num', int), ('num_particles', int),
+         ('algorithm', 'U{}'.format(max_algorithm_length))] +
+        [(name, float) for name in metric_names]
+    )
@@ -0,0 +1,270 @@
+"""Weighted moments and quantiles of particle sets.
+
+Every function works on a whole `[num_particles, dim_1, ..., dim_N]` array at
+once; there is no per-particle Python loop. `MomentAccumulator` gives the same
+moments for particle sets that arrive in blocks and never fit in memory
+together.
+"""
+
+import math
+
+import numpy as np
+
+from analysis import profiling
+
+
+def logsumexp(a, axis=None):
+    """Returns log(sum(exp(a))) along axis without overflowing.
+
+    input:
+        a: np.ndarray
+        axis: int or None (reduce over all elements)
+
+    output: float if axis is None, otherwise np.ndarray with axis removed
+    """
+
+    a = np.asarray(a, dtype=float)
+    a_max = np.amax(a, axis=axis, keepdims=True)
+    a_max[~np.isfinite(a_max)] = 0
+    with np.errstate(divide='ignore'):
+        result = np.log(np.sum(np.exp(a - a_max), axis=axis, keepdims=True))
+    result += a_max
+
+    if axis is None:
+        return float(result.reshape(()))
+    return np.squeeze(result, axis=axis)
+
+
+def normalize_log_weights(log_weights):
+    """Returns normalized weights.
+
+    input:
+        log_weights: np.ndarray [num_particles] of unnormalized log weights
+
+    output: np.ndarray [num_particles] summing to one
+    """
+
+    log_weights = np.asarray(log_weights, dtype=float)
+    with profiling.stage('normalize'):
+        return np.exp(log_weights - logsumexp(log_weights))
+
+
+def empirical_expectation(particle_values, normalized_weights, f):
+    """Returns empirical expectation.
+
+    input:
+        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
+        normalized_weights: np.ndarray [num_particles]
+        f: function that takes np.ndarray [num_particles, dim_1, ..., dim_N]
+            and returns np.ndarray [num_particles, out_dim_1, ..., out_dim_M],
+            applied to all particles at once
+
+    output: np.ndarray [out_dim_1, ..., out_dim_M]
+    """
+
+    return np.tensordot(
+        np.asarray(normalized_weights, dtype=float),
+        f(np.asarray(particle_values, dtype=float)),
+        axes=1
+    )
+
+
+def empirical_moments(particle_values, normalized_weights, max_order=2):
+    """Returns empirical mean and central moments up to max_order.
+
+    input:
+        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
+        normalized_weights: np.ndarray [num_particles]
+        max_order: int >= 1
+
+    output: np.ndarray [max_order, dim_1, ..., dim_N] where element 0 is the
+        mean and element k - 1 is the k-th central moment for k >= 2
+    """
+
+    particle_values = np.asarray(particle_values, dtype=float)
+    normalized_weights = np.asarray(normalized_weights, dtype=float)
+
+    moments = np.empty((max_order,) + particle_values.shape[1:])
+    moments[0] = np.tensordot(normalized_weights, particle_values, axes=1)
+    if max_order > 1:
+        centered = particle_values - moments[0]
+        power = centered.copy()
+        for order in range(2, max_order + 1):
+            power *= centered
+            moments[order - 1] = np.tensordot(
+                normalized_weights, power, axes=1
+            )
+
+    return moments
+
+
+def empirical_mean(particle_values, normalized_weights):
+    """Returns empirical mean.
+
+    input:
+        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
+        normalized_weights: np.ndarray [num_particles]
+
+    output: np.ndarray [dim_1, ..., dim_N]
+    """
+
+    return empirical_moments(particle_values, normalized_weights, 1)[0]
+
+
+def empirical_variance(particle_values, normalized_weights):
+    """Returns empirical variance.
+
+    input:
+        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
+        normalized_weights: np.ndarray [num_particles]
+
+    output: np.ndarray [dim_1, ..., dim_N]
+    """
+
+    return empirical_moments(particle_values, normalized_weights, 2)[1]
+
+
+def empirical_quantiles(particle_values, normalized_weights, quantiles):
+    """Returns empirical quantiles (inverse of the weighted empirical CDF).
+
+    input:
+        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
+        normalized_weights: np.ndarray [num_particles]
+        quantiles: list of floats in [0, 1]
+
+    output: np.ndarray [len(quantiles), dim_1, ..., dim_N]
+    """
+
+    particle_values = np.asarray(particle_values, dtype=float)
+    normalized_weights = np.asarray(normalized_weights, dtype=float)
+    num_particles = len(normalized_weights)
+    flat_values = np.reshape(particle_values, (num_particles, -1))
+
+    order = np.argsort(flat_values, axis=0)
+    sorted_values = np.take_along_axis(flat_values, order, axis=0)
+    cdf = np.cumsum(normalized_weights[order], axis=0)
+
+    result = np.empty((len(quantiles), flat_values.shape[1]))
+    for i, quantile in enumerate(quantiles):
+        index = np.minimum(np.sum(cdf < quantile, axis=0), num_particles - 1)
+        result[i] = np.take_along_axis(
+            sorted_values, index[np.newaxis], axis=0
+        )[0]
+
+    return np.reshape(result, (len(quantiles),) + particle_values.shape[1:])
+
+
+class MomentAccumulator(object):
+    """Empirical mean and central moments over blocks of particles.
+
+    Blocks carry unnormalized log weights, so the normalizing constant is only
+    known once every block has been seen. Weights are kept relative to the
+    running maximum log weight and power sums are taken around the first
+    block's mean, which keeps both the exponentials and the central moment
+    recovery well conditioned.
+    """
+
+    def __init__(self, max_order=2):
+        self.max_order = max_order
+        self.log_max_weight = -np.inf
+        self.total_weight = 0.0
+        self.shift = None
+        self.power_sums = None
+
+    def update(self, log_weights, particle_values):
+        """Adds a block of particles.
+
+        input:
+            log_weights: np.ndarray [block_size] of unnormalized log weights
+            particle_values: np.ndarray [block_size, dim_1, ..., dim_N]
+
+        output: self
+        """
+
+        log_weights = np.asarray(log_weights, dtype=float)
+        particle_values = np.asarray(particle_values, dtype=float)
+        if len(log_weights) == 0:
+            return self
+        block_max = np.max(log_weights)
+        if block_max == -np.inf:
+            return self
+
+        if self.shift is None:
+            self.shift = np.tensordot(
+                normalize_log_weights(log_weights), particle_values, axes=1
+            )
+            self.power_sums = np.zeros(
+                (self.max_order,) + particle_values.shape[1:]
+            )
+        with profiling.stage('normalize'):
+            if block_max > self.log_max_weight:
+                scale = np.exp(self.log_max_weight - block_max)
+                self.total_weight *= scale
+                self.power_sums *= scale
+                self.log_max_weight = block_max
+
+            weights = np.exp(log_weights - self.log_max_weight)
+            self.total_weight += np.sum(weights)
+
+        with profiling.stage('reduce'):
+            centered = particle_values - self.shift
+            power = centered.copy()
+            for order in range(1, self.max_order + 1):
+                if order > 1:
+                    power *= centered
+                self.power_sums[order - 1] += np.tensordot(
+                    weights, power, axes=1
+                )
+
+        return self
+
+    @property
+    def log_normalizer(self):
+        """Log of the sum of all unnormalized weights seen so far."""
+
+        return self.log_max_weight + np.log(self.total_weight)
+
+    def moments(self):
+        """Returns what `empirical_moments` would on all blocks at once.
+
+        Raises ValueError if no particle had a nonzero weight.
+        """
+
+        self._check_weighted()
+        raw = self.power_sums / self.total_weight
+        offset = raw[0]
+        moments = np.empty_like(raw)
+        moments[0] = self.shift + offset
+        for order in range(2, self.max_order + 1):
+            central = (-offset)**order
+            for j in range(1, order + 1):
+                central = central + \
+                    math.comb(order, j) * raw[j - 1] * (-offset)**(order - j)
+            moments[order - 1] = central
+
+        return moments
+
+    def _check_weighted(self):
+        if self.shift is None:
+            raise ValueError('no particles with nonzero weight: every block '
+                             'was empty or had all log weights -inf')
+
+
+def chunked_moments(blocks, max_order=2):
+    """Returns empirical mean and central moments of a stream of blocks.
+
+    input:
+        blocks: iterable of (log_weights, particle_values) pairs as taken by
+            `MomentAccumulator.update`
+        max_order: int >= 1
+
+    output: np.ndarray [max_order, dim_1, ..., dim_N] as `empirical_moments`
+
+    Raises ValueError if no particle has a nonzero weight.
+    """
+
+    accumulator = MomentAccumulator(max_order)
+    for log_weights, particle_values in blocks:
+        accumulator.update(log_weights, particle_values)
+
+    return accumulator.moments()
@@ -0,0 +1,37 @@
+"""Where the analysis writes its files.
+
+Every figure, metric table and profile is written through `output_filename`,
+which puts relative names under the output directory once one is set with
+`set_output_directory` (as `python -m analysis --output-directory` does) and
+leaves them as they are otherwise. Only output paths go through here; the
+files a script reads are opened as named.
+"""
+
+import os
+
+_output_directory = None
+
+
+def set_output_directory(directory):
+    """Makes output_filename put relative names under directory, which is
+    created if needed; None writes them where they are named again."""
+
+    global _output_directory
+
+    if directory is None:
+        _output_directory = None
+        return
+
+    _output_directory = os.path.abspath(directory)
+    os.makedirs(_output_directory, exist_ok=True)
+
+
+def output_filename(filename):
+    """Returns the path a file the analysis writes is saved to: filename
+    under the output directory, or filename itself when none is set or
+    filename is absolute."""
+
+    if _output_directory is None:
+        return filename
+
+    return os.path.join(_output_directory, filename)
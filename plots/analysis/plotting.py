@@ -0,0 +1,53 @@
+"""Rendering shared by the plot scripts.
+
+Kept apart from the numerics so that computing metrics does not need
+matplotlib. matplotlib itself is only imported once a figure is drawn, which
+keeps the start-up of metrics-only runs short.
+"""
+
+from analysis import profiling
+from analysis.paths import output_filename
+
+
+def plot_metric(filename, title, ylabel, num_particles_list, metrics,
+                loglog=False):
+    """Plots one line per algorithm of a metric against the number of
+    particles and saves the figure to filename.
+
+    input:
+        metrics: {algorithm: list of floats, one per num_particles_list entry}
+        loglog: use logarithmic axes
+    """
+
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1, 1)
+    fig.suptitle(title, fontsize=14)
+    for algorithm, values in metrics.items():
+        if loglog:
+            ax.loglog(num_particles_list, values, label=algorithm)
+        else:
+            ax.plot(num_particles_list, values, label=algorithm)
+
+    ax.legend()
+    ax.set_xlabel('Number of particles')
+    ax.set_ylabel(ylabel)
+
+    print('\nPlot saved to {}'.format(save_figure(fig, filename)))
+
+
+def save_figure(fig, filename):
+    """Saves fig tightly cropped to filename and closes it.
+
+    matplotlib draws lazily, so this is where the figure is rendered.
+
+    output: the path fig was saved to, see analysis.paths.output_filename
+    """
+
+    import matplotlib.pyplot as plt
+
+    filename = output_filename(filename)
+    with profiling.stage('savefig'):
+        fig.savefig(filename, bbox_inches='tight')
+    plt.close(fig)
+    return filename
@@ -0,0 +1,327 @@
+"""Per-stage wall time, peak memory and bytes read of an analysis run.
+
+The analysis code marks its stages with
+
+    with profiling.stage('parse'):
+        ...
+
+which does nothing unless a recording is active in the process. `Profiler`
+(driven by `--profile`) starts one for the script itself and one for every
+dataset x number of particles x algorithm cell, also inside the worker
+processes of `analysis.driver.evaluate_grid`, and writes them all as JSON:
+
+    {
+      "seconds": ..., "peak_rss_bytes": ..., "bytes_read": ...,
+      "stages": {"ground_truth": {"calls": ..., "seconds": ...,
+                                  "bytes_read": ...}, ...},
+      "cells": [{"dataset_num": ..., "num_particles": ..., "algorithm": ...,
+                 "seconds": ..., "peak_rss_bytes": ..., "bytes_read": ...,
+                 "stages": {...}}, ...]
+    }
+
+Stages are summed by name; time spent outside of every stage only shows in
+the total. `bytes_read` counts the dump bytes the loaders hand out, whether
+parsed from CSV or taken from the cache. `peak_rss_bytes` is the high-water
+mark of the resident set size of the process; on Linux it is reset at the
+start of every cell, elsewhere it covers everything the process has run
+before.
+"""
+
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import time
+
+from analysis.driver import evaluate_grid
+from analysis.paths import output_filename
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CELL_FIELDS = ('dataset_num', 'num_particles', 'algorithm')
+MAIN_CPROFILE_FILENAME = 'main.prof'
+
+_recording = None
+
+
+class Recording(object):
+    """Totals of the stages entered and bytes read while it is active."""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.bytes_read = 0
+        self.max_rss_bytes = None
+        self.stages = collections.OrderedDict()
+
+    def add_stage(self, name, seconds, bytes_read):
+        totals = self.stages.setdefault(
+            name, {'calls': 0, 'seconds': 0.0, 'bytes_read': 0}
+        )
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['bytes_read'] += bytes_read
+
+    def note_peak_rss(self):
+        """Remembers the current peak resident set size, before a nested
+        recording resets it."""
+
+        rss_bytes = peak_rss_bytes()
+        if rss_bytes is not None:
+            self.max_rss_bytes = max(self.max_rss_bytes or 0, rss_bytes)
+
+    def summary(self):
+        """Returns a JSON-serializable dict of the totals so far."""
+
+        self.note_peak_rss()
+        return collections.OrderedDict([
+            ('seconds', time.perf_counter() - self.start_time),
+            ('peak_rss_bytes', self.max_rss_bytes),
+            ('bytes_read', self.bytes_read),
+            ('stages', self.stages)
+        ])
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Adds the wall time and bytes read of the with block to the active
+    recording under name."""
+
+    recording = _recording
+    if recording is None:
+        yield
+        return
+
+    start_bytes_read = recording.bytes_read
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        recording.add_stage(
+            name, time.perf_counter() - start_time,
+            recording.bytes_read - start_bytes_read
+        )
+
+
+def count_bytes_read(num_bytes):
+    """Adds num_bytes to the bytes read by the active recording."""
+
+    if _recording is not None:
+        _recording.bytes_read += int(num_bytes)
+
+
+@contextlib.contextmanager
+def recording(cprofile_filename=None):
+    """Makes a new Recording active in this process for the with block.
+
+    input:
+        cprofile_filename: str or None; if given, the block is also profiled
+            with cProfile and the statistics are dumped to it
+    """
+
+    global _recording
+    previous_recording = _recording
+    if previous_recording is not None:
+        previous_recording.note_peak_rss()
+    _reset_peak_rss()
+    _recording = Recording()
+    profile = None
+    if cprofile_filename is not None:
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        yield _recording
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(cprofile_filename)
+        _recording = previous_recording
+
+
+def peak_rss_bytes():
+    """Returns the peak resident set size of this process in bytes, or None
+    if the platform does not report it."""
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    return max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
+
+
+def add_profile_argument(parser):
+    """Adds --profile and --cprofile to an argparse.ArgumentParser."""
+
+    parser.add_argument('--profile', metavar='FILENAME',
+                        help='write the wall time, peak memory and bytes '
+                        'read of every stage and every evaluated cell as '
+                        'JSON to FILENAME')
+    parser.add_argument('--cprofile', metavar='DIRECTORY',
+                        help='with --profile, also dump cProfile statistics '
+                        'of every cell to DIRECTORY/{algorithm}_'
+                        '{dataset_num}_{num_particles}.prof and of the rest '
+                        'of the run to DIRECTORY/' + MAIN_CPROFILE_FILENAME)
+
+
+def profile_cell(evaluate_cell, cprofile_directory, fields, *cell):
+    """Returns (evaluate_cell(*cell), record) where record is the
+    JSON-serializable profile of the call, keyed by fields."""
+
+    with recording(_cprofile_filename(
+        cprofile_directory, fields, cell
+    )) as cell_recording:
+        result = evaluate_cell(*cell)
+
+    return result, _cell_record(fields, cell, cell_recording)
+
+
+class Profiler(object):
+    """Collects the profile of one run of an analysis script.
+
+    Profiler(None) profiles nothing, so scripts can call the same methods
+    whether or not --profile was given.
+
+    input:
+        filename: str or None; where finish() writes the JSON profile
+        cprofile_directory: str or None; see add_profile_argument
+    """
+
+    def __init__(self, filename, cprofile_directory=None):
+        if filename is not None:
+            filename = output_filename(filename)
+        if cprofile_directory is not None:
+            cprofile_directory = output_filename(cprofile_directory)
+        self.filename = filename
+        self.cprofile_directory = cprofile_directory
+        self.cells = []
+        self._recording = None
+        self._profile = None
+
+    def start(self):
+        """Starts recording the script's own stages.
+
+        output: self
+        """
+
+        global _recording
+        if self.filename is None:
+            return self
+        if self.cprofile_directory is not None:
+            os.makedirs(self.cprofile_directory, exist_ok=True)
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._recording = _recording = Recording()
+        return self
+
+    def evaluate_grid(self, evaluate_cell, cells, jobs=1,
+                      fields=CELL_FIELDS):
+        """Returns analysis.driver.evaluate_grid(evaluate_cell, cells, jobs),
+        recording the profile of every cell.
+
+        input:
+            fields: names of the elements of a cell in the JSON profile
+        """
+
+        if self._recording is None:
+            return evaluate_grid(evaluate_cell, cells, jobs)
+
+        # Serial cells run their own cProfile, and only one can be active.
+        if self._profile is not None:
+            self._profile.disable()
+        results = evaluate_grid(
+            functools.partial(
+                profile_cell, evaluate_cell, self.cprofile_directory, fields
+            ),
+            cells, jobs
+        )
+        if self._profile is not None:
+            self._profile.enable()
+
+        self.cells.extend(record for _, record in results.values())
+        return collections.OrderedDict(
+            (cell, result) for cell, (result, _) in results.items()
+        )
+
+    @contextlib.contextmanager
+    def cell(self, *cell):
+        """Records the with block as the evaluation of cell, a
+        (dataset_num, num_particles, algorithm) tuple, in this process."""
+
+        if self._recording is None:
+            yield
+            return
+
+        if self._profile is not None:
+            self._profile.disable()
+        try:
+            with recording(_cprofile_filename(
+                self.cprofile_directory, CELL_FIELDS, cell
+            )) as cell_recording:
+                yield
+        finally:
+            if self._profile is not None:
+                self._profile.enable()
+        self.cells.append(_cell_record(CELL_FIELDS, cell, cell_recording))
+
+    def finish(self):
+        """Stops recording and writes the JSON profile, and the script's
+        cProfile statistics if requested."""
+
+        global _recording
+        if self._recording is None:
+            return
+
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(os.path.join(
+                self.cprofile_directory, MAIN_CPROFILE_FILENAME
+            ))
+        profile = self._recording.summary()
+        profile['cells'] = self.cells
+        _recording = self._recording = None
+
+        with open(self.filename, 'w') as f:
+            json.dump(profile, f, indent=2)
+            f.write('\n')
+        print('\nProfile saved to {}'.format(self.filename))
+
+
+def _cell_record(fields, cell, cell_recording):
+    record = collections.OrderedDict(zip(fields, cell))
+    record.update(cell_recording.summary())
+    return record
+
+
+def _cprofile_filename(cprofile_directory, fields, cell):
+    if cprofile_directory is None:
+        return None
+
+    values = dict(zip(fields, cell))
+    if set(CELL_FIELDS) <= set(values):
+        name = '{}_{}_{}'.format(
+            values['algorithm'], values['dataset_num'],
+            values['num_particles']
+        )
+    else:
+        name = '_'.join(str(values[field]) for field in fields)
+    return os.path.join(cprofile_directory, name + '.prof')
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux 4.0+).
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except (IOError, OSError):
+        pass
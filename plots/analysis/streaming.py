@@ -0,0 +1,102 @@
+"""One-pass posterior summaries over blocks of particles.
+
+Combined with `analysis.dumps.iter_dump_blocks` these reduce dumps of any size
+in memory proportional to the block size and the number of timesteps, never to
+the number of particles.
+"""
+
+import numpy as np
+
+from analysis import profiling
+from analysis.dumps import DEFAULT_BLOCK_SIZE, iter_dump_blocks
+from analysis.moments import MomentAccumulator
+
+
+class PosteriorAccumulator(MomentAccumulator):
+    """Per-timestep state marginals, means and variances of discrete latents.
+
+    Extends `MomentAccumulator` (which supplies the running logsumexp of the
+    weights and the means and variances) with weighted state counts.
+    """
+
+    def __init__(self, num_states):
+        super(PosteriorAccumulator, self).__init__(max_order=2)
+        self.num_states = num_states
+        self.state_sums = None
+
+    def update(self, log_weights, particle_values):
+        """Adds a block of particles.
+
+        input:
+            log_weights: np.ndarray [block_size] of unnormalized log weights
+            particle_values: np.ndarray [block_size, num_timesteps] of states
+                in {0, ..., num_states - 1}
+
+        output: self
+        """
+
+        particle_values = np.asarray(particle_values)
+        states = particle_values.astype(int)
+        if states.size and (
+            np.min(states) < 0 or np.max(states) >= self.num_states
+        ):
+            raise ValueError('states must be in [0, {}), got [{}, {}]'.format(
+                self.num_states, np.min(states), np.max(states)
+            ))
+
+        previous_log_max_weight = self.log_max_weight
+        super(PosteriorAccumulator, self).update(log_weights, particle_values)
+        if self.shift is None:
+            return self
+
+        num_timesteps = states.shape[1]
+        with profiling.stage('reduce'):
+            if self.state_sums is None:
+                self.state_sums = np.zeros((self.num_states, num_timesteps))
+            elif self.log_max_weight > previous_log_max_weight:
+                self.state_sums *= np.exp(
+                    previous_log_max_weight - self.log_max_weight
+                )
+
+            weights = np.exp(np.asarray(log_weights) - self.log_max_weight)
+            index = states * num_timesteps + np.arange(num_timesteps)
+            self.state_sums += np.bincount(
+                np.ravel(index),
+                weights=np.repeat(weights, num_timesteps),
+                minlength=self.num_states * num_timesteps
+            ).reshape(self.num_states, num_timesteps)
+
+        return self
+
+    def marginals(self):
+        """Returns np.ndarray [num_states, num_timesteps] of posterior
+        probabilities of each state at each timestep.
+
+        Raises ValueError if no particle had a nonzero weight.
+        """
+
+        self._check_weighted()
+        return self.state_sums / self.total_weight
+
+    def means(self):
+        """Returns np.ndarray [num_timesteps] of posterior means."""
+
+        return self.moments()[0]
+
+    def variances(self):
+        """Returns np.ndarray [num_timesteps] of posterior variances."""
+
+        return self.moments()[1]
+
+
+def stream_posterior(filename, num_states, block_size=DEFAULT_BLOCK_SIZE,
+                     cache=True, dedupe=False):
+    """Returns a PosteriorAccumulator fed with the whole dump at filename."""
+
+    accumulator = PosteriorAccumulator(num_states)
+    for log_weights, particle_values in iter_dump_blocks(
+        filename, block_size, cache, dedupe=dedupe
+    ):
+        accumulator.update(log_weights, particle_values)
+
+    return accumulator
@@ -0,0 +1,296 @@
+"""Synthetic problems and inference dumps for benchmarking the analysis.
+
+Every `write_*` function writes files in exactly the formats documented in the
+model READMEs, so the plot scripts read them like real inference results. The
+dumps are importance sampling runs with the prior as proposal: latents are
+drawn from the model's prior and weighted by the likelihood of the data,
+which gives the weights the spread real dumps have. Dumps are generated and
+written in blocks, so particle counts are limited by disk space rather than
+memory, and appear under their final name only once complete.
+
+HMM and state-space latents are drawn for all particles of a block at once
+with one vectorized step per timestep. `sample_state_space_blocks` draws
+large sets of state-space sequences in blocks over worker processes, each
+block from its own `np.random.SeedSequence` stream.
+"""
+
+import functools
+import os
+
+import numpy as np
+import scipy.stats
+
+from analysis.driver import evaluate_grid
+from analysis.dumps import DEFAULT_BLOCK_SIZE
+
+# Likelihood of the query in
+# src/worksheets/polynomial_regression_variable_x.clj
+STUDENT_T_DEGREES_OF_FREEDOM = 4
+STUDENT_T_SCALE = 1
+
+HMM_MODEL = (
+    np.array([1 / 3, 1 / 3, 1 / 3]),
+    np.array([[0.1, 0.5, 0.4], [0.2, 0.2, 0.6], [0.15, 0.15, 0.7]]),
+    np.array([-1.0, 1.0, 0.0]),
+    np.array([1.0, 1.0, 1.0])
+)
+STATE_SPACE_MODEL = (0.0, 1.0, 0.9, 0.0, 1.0, 1.0, 0.0, 0.5)
+
+
+def sample_hmm(rng, initial_probabilities, transition_matrix, num_samples,
+               num_timesteps):
+    """Returns np.ndarray [num_samples, num_timesteps] of state sequences
+    drawn from the prior of an HMM."""
+
+    cumulative_transitions = np.cumsum(transition_matrix, axis=1)
+    num_states = len(initial_probabilities)
+
+    states = np.empty((num_samples, num_timesteps), dtype=int)
+    uniforms = rng.random_sample((num_samples, num_timesteps))
+    states[:, 0] = np.searchsorted(
+        np.cumsum(initial_probabilities), uniforms[:, 0], side='right'
+    )
+    for t in range(1, num_timesteps):
+        states[:, t] = np.sum(
+            uniforms[:, t, np.newaxis] >=
+            cumulative_transitions[states[:, t - 1]],
+            axis=1
+        )
+
+    return np.minimum(states, num_states - 1)
+
+
+def sample_state_space(rng, model, num_samples, num_timesteps):
+    """Returns (latents, observations), each np.ndarray
+    [num_samples, num_timesteps], drawn from a 1-D linear Gaussian
+    state-space model. The first observation is emitted by the initial state,
+    as in analysis.ground_truth.kalman_smoother.
+
+    input:
+        model: sequence of the 8 parameters of the state-space README
+    """
+
+    initial_mean, initial_variance, transition_multiplier, transition_offset, \
+        transition_variance, emission_multiplier, emission_offset, \
+        emission_variance = model
+
+    noise = rng.standard_normal((num_samples, num_timesteps))
+    latents = np.empty((num_samples, num_timesteps))
+    latents[:, 0] = initial_mean + np.sqrt(initial_variance) * noise[:, 0]
+    for t in range(1, num_timesteps):
+        latents[:, t] = transition_multiplier * latents[:, t - 1] + \
+            transition_offset + np.sqrt(transition_variance) * noise[:, t]
+    observations = emission_multiplier * latents + emission_offset + \
+        np.sqrt(emission_variance) * rng.standard_normal(latents.shape)
+
+    return latents, observations
+
+
+def sample_state_space_blocks(model, num_samples, num_timesteps, seed=0,
+                              block_size=DEFAULT_BLOCK_SIZE, jobs=1):
+    """Returns (latents, observations) like sample_state_space, drawn in
+    blocks of block_size sequences by analysis.driver.evaluate_grid.
+
+    Every block gets its own np.random.Generator, seeded by a child of
+    np.random.SeedSequence(seed), so the result depends on seed and
+    block_size but not on jobs.
+    """
+
+    starts = range(0, num_samples, block_size)
+    cells = [
+        (seed_sequence, min(block_size, num_samples - start))
+        for start, seed_sequence in zip(
+            starts, np.random.SeedSequence(seed).spawn(len(starts))
+        )
+    ]
+    results = evaluate_grid(
+        functools.partial(_sample_state_space_block, model, num_timesteps),
+        cells, jobs
+    )
+
+    latents = np.empty((num_samples, num_timesteps))
+    observations = np.empty((num_samples, num_timesteps))
+    for start, cell in zip(starts, cells):
+        latents[start:start + cell[1]], observations[start:start + cell[1]] = \
+            results[cell]
+    return latents, observations
+
+
+def write_state_space_sequences(filename, latents, observations):
+    """Writes state-space sequences in one pass: as the latents and
+    observations arrays of an .npz archive if filename ends in .npz,
+    otherwise as CSV of the observations, one sequence per line in the form
+    of data_{dataset_num}.csv."""
+
+    temp_filename = filename + '.tmp'
+    if filename.endswith('.npz'):
+        with open(temp_filename, 'wb') as f:
+            np.savez(f, latents=latents, observations=observations)
+    else:
+        np.savetxt(temp_filename, observations, delimiter=',', fmt='%.17g')
+    os.replace(temp_filename, filename)
+
+
+def gaussian_log_density(x, mean, variance):
+    return -0.5 * (np.log(2 * np.pi * variance) + (x - mean)**2 / variance)
+
+
+def write_hmm_problem(directory, num_timesteps, seed=0, model=HMM_MODEL):
+    """Writes model.csv and data_1.csv of an HMM problem into directory."""
+
+    initial_probabilities, transition_matrix, means, variances = model
+    rng = np.random.RandomState(seed)
+    states = sample_hmm(
+        rng, initial_probabilities, transition_matrix, 1, num_timesteps
+    )[0]
+    observations = means[states] + np.sqrt(variances[states]) * \
+        rng.standard_normal(num_timesteps)
+
+    np.savetxt(os.path.join(directory, 'model.csv'), np.vstack([
+        initial_probabilities, transition_matrix, means, variances
+    ]), delimiter=',')
+    np.savetxt(os.path.join(directory, 'data_1.csv'),
+               observations[np.newaxis], delimiter=',')
+
+
+def write_hmm_dump(filename, observations, num_particles, seed=0,
+                   model=HMM_MODEL, block_size=DEFAULT_BLOCK_SIZE):
+    """Writes an HMM dump of num_particles prior samples weighted by the
+    likelihood of observations."""
+
+    initial_probabilities, transition_matrix, means, variances = model
+
+    def sample_block(rng, num_samples):
+        states = sample_hmm(
+            rng, initial_probabilities, transition_matrix, num_samples,
+            len(observations)
+        )
+        log_weights = np.sum(gaussian_log_density(
+            observations, means[states], variances[states]
+        ), axis=1)
+        return log_weights, states
+
+    _write_dump(filename, num_particles, seed, block_size, sample_block,
+                '%d')
+
+
+def write_state_space_problem(directory, num_timesteps, seed=0,
+                              model=STATE_SPACE_MODEL):
+    """Writes model.csv and data_1.csv of a state-space problem into
+    directory."""
+
+    _, observations = sample_state_space(
+        np.random.RandomState(seed), model, 1, num_timesteps
+    )
+    np.savetxt(os.path.join(directory, 'model.csv'),
+               np.reshape(model, (1, -1)), delimiter=',')
+    np.savetxt(os.path.join(directory, 'data_1.csv'), observations,
+               delimiter=',')
+
+
+def write_state_space_dump(filename, observations, num_particles, seed=0,
+                           model=STATE_SPACE_MODEL,
+                           block_size=DEFAULT_BLOCK_SIZE):
+    """Writes a state-space dump of num_particles prior samples weighted by
+    the likelihood of observations."""
+
+    emission_multiplier, emission_offset, emission_variance = model[5:]
+
+    def sample_block(rng, num_samples):
+        latents, _ = sample_state_space(
+            rng, model, num_samples, len(observations)
+        )
+        log_weights = np.sum(gaussian_log_density(
+            observations, emission_multiplier * latents + emission_offset,
+            emission_variance
+        ), axis=1)
+        return log_weights, latents
+
+    _write_dump(filename, num_particles, seed, block_size, sample_block,
+                '%.10g')
+
+
+def write_polynomial_regression_problem(directory, num_points, seed=0):
+    """Writes data_1.csv and data_1_test.csv of a polynomial regression
+    problem with num_points x values into directory."""
+
+    rng = np.random.RandomState(seed)
+    weights = rng.standard_normal(3)
+    for name in ['data_1.csv', 'data_1_test.csv']:
+        x = np.sort(rng.uniform(-10, 10, num_points))
+        y = weights[0] + weights[1] * x + weights[2] * x**2 + \
+            STUDENT_T_SCALE * rng.standard_t(
+                STUDENT_T_DEGREES_OF_FREEDOM, num_points
+            )
+        with open(os.path.join(directory, name), 'w') as f:
+            for row in [weights, x, y]:
+                f.write(','.join(repr(float(value)) for value in row) + '\n')
+
+
+def write_polynomial_regression_dump(filename, x, y, num_particles, seed=0,
+                                     block_size=DEFAULT_BLOCK_SIZE):
+    """Writes a polynomial regression dump of num_particles standard normal
+    prior samples of the weights, weighted by the likelihood of (x, y)."""
+
+    x = np.asarray(x, dtype=float)
+    vandermonde = np.vander(x, 3, increasing=True)
+
+    def sample_block(rng, num_samples):
+        weights = rng.standard_normal((num_samples, 3))
+        log_weights = np.sum(scipy.stats.t.logpdf(
+            y, STUDENT_T_DEGREES_OF_FREEDOM,
+            loc=np.dot(weights, vandermonde.T), scale=STUDENT_T_SCALE
+        ), axis=1)
+        return log_weights, weights
+
+    _write_dump(filename, num_particles, seed, block_size, sample_block,
+                '%.17g')
+
+
+def write_gmm_run(filename, num_points, num_samples, num_clusters=3,
+                  dimension=2, seed=0):
+    """Writes a GMM run in the key-value CSV format read by the GMM plot
+    scripts: num_points data points in [-1, 1]^dimension and num_samples
+    MAP estimates of num_clusters cluster means."""
+
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(-0.6, 0.6, (num_clusters, dimension))
+    data = centers[rng.randint(num_clusters, size=num_points)] + \
+        0.1 * rng.standard_normal((num_points, dimension))
+    means = centers[np.arange(num_samples * num_clusters) % num_clusters] + \
+        0.05 * rng.standard_normal((num_samples * num_clusters, dimension))
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        f.write('num-reruns,{}\n'.format(num_samples))
+        f.write('num-samples,{}\n'.format(num_samples))
+        f.write('dimension,{}\n'.format(dimension))
+        for field, values in [('data', data), ('means-MAP-list', means)]:
+            f.write(field + ',' + ','.join(
+                repr(float(value)) for value in np.ravel(values)
+            ) + '\n')
+    os.replace(temp_filename, filename)
+
+
+def _sample_state_space_block(model, num_timesteps, seed_sequence,
+                              num_samples):
+    return sample_state_space(
+        np.random.default_rng(seed_sequence), model, num_samples,
+        num_timesteps
+    )
+
+
+def _write_dump(filename, num_particles, seed, block_size, sample_block,
+                value_format):
+    rng = np.random.RandomState(seed)
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        for start in range(0, num_particles, block_size):
+            log_weights, values = sample_block(
+                rng, min(block_size, num_particles - start)
+            )
+            np.savetxt(
+                f, np.column_stack([log_weights, values]), delimiter=',',
+                fmt=['%.17g'] + [value_format] * values.shape[1]
+            )
+    os.replace(temp_filename, filename)
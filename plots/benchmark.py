@@ -0,0 +1,369 @@
+"""Times the analysis of synthetic inference dumps of growing size.
+
+Usage, from plots/:
+
+    python benchmark.py --num-particles-list 1000 10000 100000 \
+        --num-timesteps-list 50 200
+
+For every model, sequence length and number of particles it writes a
+synthetic problem and an importance sampling dump in the model's README
+format into --directory (see analysis/synthetic.py; existing files are
+reused), analyses it and appends one row per run to --results:
+
+    date,commit,model,num_particles,num_timesteps,cache,seconds,
+    load_seconds,reduce_seconds,render_seconds,ground_truth_seconds,
+    peak_rss_bytes,bytes_read
+
+so that runs on different commits can be compared. The hmm and state-space
+rows come from running their plot.py with --profile: load is parsing and
+loading the dump, reduce is normalizing and summing the weights and render
+is savefig. The polynomial regression and GMM scripts have no --profile, so
+their functions are timed in this process: reading the dump, the
+posterior predictive or the KDE of the cluster means, and drawing the
+particles or the contours (which recomputes the KDE) plus savefig.
+
+For the GMM, num_particles is the number of MAP estimates and num_timesteps
+the number of data points; for polynomial regression num_timesteps is the
+number of x values.
+"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa
+import numpy as np  # noqa
+
+PLOTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PLOTS_DIRECTORY)
+from analysis import profiling  # noqa
+from analysis import synthetic  # noqa
+from analysis.dumps import dump_filename, load_dump  # noqa
+from analysis.kde import gaussian_kernel_sum  # noqa
+from analysis.moments import normalize_log_weights  # noqa
+from analysis.plotting import save_figure  # noqa
+
+MODELS = ['hmm', 'state-space', 'polynomial-regression', 'gmm']
+RESULT_FIELDS = [
+    'date', 'commit', 'model', 'num_particles', 'num_timesteps', 'cache',
+    'seconds', 'load_seconds', 'reduce_seconds', 'render_seconds',
+    'ground_truth_seconds', 'peak_rss_bytes', 'bytes_read'
+]
+# Stages of analysis.profiling that make up each timed phase.
+PHASE_STAGES = {
+    'load_seconds': ['parse', 'load'],
+    'reduce_seconds': ['normalize', 'reduce'],
+    'render_seconds': ['savefig'],
+    'ground_truth_seconds': ['ground_truth']
+}
+GMM_KDE_SIGMA = 0.08
+
+
+def problem_directory(directory, model, num_timesteps, seed):
+    """Returns the directory of a synthetic problem, creating it and its
+    model and data files if needed."""
+
+    problem = os.path.join(directory, '{}-{}-{}'.format(
+        model, num_timesteps, seed
+    ))
+    os.makedirs(problem, exist_ok=True)
+    if model == 'hmm' and \
+            not os.path.exists(os.path.join(problem, 'data_1.csv')):
+        synthetic.write_hmm_problem(problem, num_timesteps, seed)
+    elif model == 'state-space' and \
+            not os.path.exists(os.path.join(problem, 'data_1.csv')):
+        synthetic.write_state_space_problem(problem, num_timesteps, seed)
+    elif model == 'polynomial-regression' and \
+            not os.path.exists(os.path.join(problem, 'data_1_test.csv')):
+        synthetic.write_polynomial_regression_problem(
+            problem, num_timesteps, seed
+        )
+
+    return problem
+
+
+def write_dump(problem, model, num_particles, num_timesteps, seed):
+    """Writes the synthetic dump of num_particles particles into problem
+    unless it exists, and returns its filename."""
+
+    if model == 'gmm':
+        filename = os.path.join(problem, 'smc-{}.csv'.format(num_particles))
+    else:
+        filename = os.path.join(
+            problem, dump_filename('is', 1, num_particles)
+        )
+    if os.path.exists(filename):
+        return filename
+
+    print('Writing {}'.format(filename))
+    if model == 'hmm':
+        synthetic.write_hmm_dump(
+            filename, _read_row(problem, 'data_1.csv', 0), num_particles, seed
+        )
+    elif model == 'state-space':
+        synthetic.write_state_space_dump(
+            filename, _read_row(problem, 'data_1.csv', 0), num_particles, seed
+        )
+    elif model == 'polynomial-regression':
+        synthetic.write_polynomial_regression_dump(
+            filename, _read_row(problem, 'data_1.csv', 1),
+            _read_row(problem, 'data_1.csv', 2), num_particles, seed
+        )
+    else:
+        synthetic.write_gmm_run(filename, num_timesteps, num_particles,
+                                seed=seed)
+
+    return filename
+
+
+def run_plot_script(problem, model, num_particles, cache):
+    """Returns the phases of the model's plot.py on the dump of num_particles
+    particles, taken from its --profile output."""
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        profile_filename = os.path.join(temp_directory, 'profile.json')
+        command = [
+            sys.executable, os.path.join(PLOTS_DIRECTORY, model, 'plot.py'),
+            '--dataset-num-list', '1',
+            '--num-particles-list', str(num_particles),
+            '--algorithms', 'is',
+            '--profile', profile_filename,
+            '--metrics-table', os.path.join(temp_directory, 'metrics.csv')
+        ]
+        environment = dict(os.environ, MPLBACKEND='Agg')
+        if not cache:
+            command.append('--no-cache')
+        else:
+            # Fills the cache so that the timed run reads from it.
+            subprocess.check_call(command, cwd=problem, env=environment,
+                                  stdout=subprocess.DEVNULL)
+
+        subprocess.check_call(command, cwd=problem, env=environment,
+                              stdout=subprocess.DEVNULL)
+        with open(profile_filename) as f:
+            profile = json.load(f)
+
+    records = [profile] + profile['cells']
+    phases = {
+        phase: sum(
+            record['stages'][stage]['seconds']
+            for record in records for stage in stages
+            if stage in record['stages']
+        ) for phase, stages in PHASE_STAGES.items()
+    }
+    phases['seconds'] = profile['seconds']
+    phases['peak_rss_bytes'] = profile['peak_rss_bytes']
+    phases['bytes_read'] = sum(record['bytes_read'] for record in records)
+    return phases
+
+
+def run_polynomial_regression(problem, dump, cache):
+    """Returns the phases of the polynomial regression analysis of dump."""
+
+    script = _load_script('polynomial-regression-variable-x')
+    x = _read_row(problem, 'data_1_test.csv', 1)
+    y = _read_row(problem, 'data_1_test.csv', 2)
+    if cache:
+        load_dump(dump)
+
+    def load():
+        return load_dump(dump, cache=cache)
+
+    def reduce(particles):
+        script.posteriorPredictive(particles[0], particles[1], x, y)
+
+    def render(particles):
+        fig, ax = plt.subplots(1, 1)
+        script.plotQuadratics(
+            ax, particles[1], normalize_log_weights(particles[0]),
+            [x[0] - 1, x[-1] + 1]
+        )
+        save_figure(fig, os.path.join(problem, 'benchmark.pdf'))
+
+    return _time_phases(load, reduce, render)
+
+
+def run_gmm(problem, dump):
+    """Returns the phases of the GMM analysis of dump."""
+
+    script = _load_script('gmm-fixed-number-of-clusters')
+    grid = np.arange(-1.0, 1.0, 0.025)
+
+    def load():
+        profiling.count_bytes_read(os.path.getsize(dump))
+        return script.read_data(dump)
+
+    def reduce(data):
+        gaussian_kernel_sum(data[4], grid, grid, GMM_KDE_SIGMA)
+
+    def render(data):
+        fig, ax = plt.subplots(1, 1)
+        script.make_plots(ax, data, GMM_KDE_SIGMA, '')
+        save_figure(fig, os.path.join(problem, 'benchmark.pdf'))
+
+    return _time_phases(load, reduce, render)
+
+
+def format_rows(rows):
+    """Returns the timing columns of rows as aligned text."""
+
+    header = ['model', 'num_particles', 'num_timesteps', 'seconds',
+              'load_seconds', 'reduce_seconds', 'render_seconds']
+    lines = [header] + [
+        [row['model'], str(row['num_particles']), str(row['num_timesteps'])] +
+        ['{:.4g}'.format(row[field]) for field in header[3:]]
+        for row in rows
+    ]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+
+    return '\n'.join(
+        '  '.join(value.rjust(width) for value, width in zip(line, widths))
+        for line in lines
+    )
+
+
+def append_results(filename, rows):
+    """Appends rows to the CSV file filename, writing the header first if
+    the file is new."""
+
+    is_new = not os.path.exists(filename)
+    with open(filename, 'a') as f:
+        if is_new:
+            f.write(','.join(RESULT_FIELDS) + '\n')
+        for row in rows:
+            f.write(','.join(
+                repr(row[field]) if isinstance(row[field], float)
+                else str(row[field]) for field in RESULT_FIELDS
+            ) + '\n')
+
+
+def current_commit():
+    """Returns the short hash of the checked out commit, or '' outside of a
+    git checkout."""
+
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PLOTS_DIRECTORY,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Times loading, reducing and rendering synthetic '
+        'inference dumps and appends the timings to a CSV file.'
+    )
+    parser.add_argument('--models', nargs='+', choices=MODELS,
+                        default=MODELS,
+                        help='models to benchmark (default: all)')
+    parser.add_argument('--num-particles-list', nargs='+', type=int,
+                        default=[1000, 10000, 100000],
+                        help='space separated list of number of particles '
+                        '(default: 1000 10000 100000)')
+    parser.add_argument('--num-timesteps-list', nargs='+', type=int,
+                        default=[50],
+                        help='space separated list of sequence lengths '
+                        '(default: 50)')
+    parser.add_argument('--cache', action='store_true',
+                        help='time reads from a warm .analysis-cache/ '
+                        'instead of parsing the CSVs')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic problems and dumps')
+    parser.add_argument('--directory', default='benchmark-data',
+                        help='where the synthetic files are kept between '
+                        'runs (default: benchmark-data)')
+    parser.add_argument('--results', default='benchmark-results.csv',
+                        help='CSV file the timings are appended to '
+                        '(default: benchmark-results.csv)')
+    args = parser.parse_args()
+
+    date = datetime.datetime.now(datetime.timezone.utc).replace(
+        microsecond=0
+    ).isoformat()
+    commit = current_commit()
+    rows = []
+    for model in args.models:
+        for num_timesteps in args.num_timesteps_list:
+            problem = problem_directory(
+                args.directory, model, num_timesteps, args.seed
+            )
+            for num_particles in args.num_particles_list:
+                dump = write_dump(
+                    problem, model, num_particles, num_timesteps, args.seed
+                )
+                if model == 'polynomial-regression':
+                    phases = run_polynomial_regression(
+                        problem, dump, args.cache
+                    )
+                elif model == 'gmm':
+                    phases = run_gmm(problem, dump)
+                else:
+                    phases = run_plot_script(
+                        problem, model, num_particles, args.cache
+                    )
+
+                row = dict(
+                    phases, date=date, commit=commit, model=model,
+                    num_particles=num_particles, num_timesteps=num_timesteps,
+                    cache=args.cache
+                )
+                rows.append(row)
+                print(format_rows([row]).split('\n')[1])
+
+    print('\n' + format_rows(rows))
+    append_results(args.results, rows)
+    print('\nResults appended to {}'.format(args.results))
+
+
+def _time_phases(load, reduce, render):
+    phases = {'ground_truth_seconds': 0.0}
+    with profiling.recording() as recording:
+        start_time = time.perf_counter()
+        loaded = load()
+        phases['load_seconds'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        reduce(loaded)
+        phases['reduce_seconds'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        render(loaded)
+        phases['render_seconds'] = time.perf_counter() - start_time
+
+        summary = recording.summary()
+
+    phases['seconds'] = summary['seconds']
+    phases['peak_rss_bytes'] = summary['peak_rss_bytes']
+    phases['bytes_read'] = summary['bytes_read']
+    return phases
+
+
+def _load_script(directory):
+    spec = importlib.util.spec_from_file_location(
+        directory.replace('-', '_'),
+        os.path.join(PLOTS_DIRECTORY, directory, 'plot.py')
+    )
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+    return script
+
+
+def _read_row(problem, filename, row):
+    with open(os.path.join(problem, filename)) as f:
+        lines = f.read().splitlines()
+
+    return np.array([float(value) for value in lines[row].split(',')])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Reports the weight diagnostics of every inference dump in the given model
+directories; see analysis/diagnostics.py for what they mean.
+
+Usage, from plots/:
+
+    python diagnose_weights.py hmm state-space
+
+prints one row per `{algorithm}_{dataset_num}_{num_particles}.csv` and saves
+the table as `<directory>/diagnostics.csv`. If the directory has a
+`timings.csv` with the header `algorithm,dataset_num,num_particles,seconds`
+giving the wall-clock time of each infer run, ESS per second is reported too.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from analysis.diagnostics import DIAGNOSTIC_NAMES, diagnostics_table  # noqa
+from analysis.dumps import DEFAULT_BLOCK_SIZE  # noqa
+from analysis.metrics import save_metric_table  # noqa
+
+DIAGNOSTICS_FILENAME = 'diagnostics.csv'
+
+
+def format_table(table):
+    """Returns the table as aligned text."""
+
+    header = ['algorithm', 'dataset_num', 'num_particles'] + DIAGNOSTIC_NAMES
+    lines = [header]
+    for row in table:
+        lines.append(
+            [row['algorithm'], str(row['dataset_num']),
+             str(row['num_particles'])] +
+            ['{:.4g}'.format(row[name]) for name in DIAGNOSTIC_NAMES]
+        )
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+
+    return '\n'.join(
+        '  '.join(value.rjust(width) for value, width in zip(line, widths))
+        for line in lines
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Effective sample size, largest weight, weight entropy '
+        'and Pareto k of every inference dump in the given directories.'
+    )
+    parser.add_argument('directories', nargs='*', default=['.'],
+                        help='model directories (default: .)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='always parse the inference result CSVs instead '
+                        'of reusing them from .analysis-cache/')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='number of particles read into memory at a time')
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        table = diagnostics_table(
+            directory, block_size=args.block_size, cache=args.cache
+        )
+        if len(table) == 0:
+            print('No inference dumps in {}'.format(directory))
+            continue
+
+        print('{}:\n{}'.format(directory, format_table(table)))
+        filename = os.path.join(directory, DIAGNOSTICS_FILENAME)
+        print('\nDiagnostics saved to {}\n'.format(
+            save_metric_table(filename, table)
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+import argparse
+import functools
+import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.anytime import add_anytime_argument, evaluate_anytime, \
+    prefix_estimates  # noqa
+from analysis.driver import add_jobs_argument, evaluation_grid  # noqa
+from analysis.dumps import DEFAULT_BLOCK_SIZE, add_dedupe_argument, \
+    dump_filename, iter_dump_blocks  # noqa
+from analysis.ground_truth import MAX_EXACT_FEATURES, \
+    factorial_hmm_posterior  # noqa
+from analysis.metrics import column_values, get_sum_kl, get_sum_l2, \
+    load_metric_table, metric_series, metric_table, save_metric_table  # noqa
+from analysis.moments import MomentAccumulator  # noqa
+from analysis.plotting import plot_metric, save_figure  # noqa
+from analysis.profiling import Profiler, add_profile_argument  # noqa
+
+
+def get_posterior(blocks, num_features):
+    """Returns np.ndarray [num_features, num_timesteps] of posterior
+    probabilities of each feature being on.
+
+    input:
+        blocks: iterable of (log_weights, particle_values) where
+            particle_values is [block_size, num_timesteps * num_features] in
+            the order of the README
+        num_features: int
+    """
+
+    accumulator = MomentAccumulator(max_order=1)
+    for log_weights, particle_values in blocks:
+        accumulator.update(log_weights, particle_values)
+
+    return np.transpose(
+        np.reshape(accumulator.moments()[0], (-1, num_features))
+    )
+
+
+def get_distributions(posterior):
+    """Returns np.ndarray [2, num_features, num_timesteps] of probabilities of
+    each feature being off and on, the layout get_sum_kl expects."""
+
+    return np.stack([1 - posterior, posterior])
+
+
+def evaluate_cell(num_features, block_size, cache, dedupe, dataset_num,
+                  num_particles, algorithm):
+    return get_posterior(iter_dump_blocks(
+        dump_filename(algorithm, dataset_num, num_particles),
+        block_size=block_size,
+        cache=cache,
+        dedupe=dedupe
+    ), num_features)
+
+
+def evaluate_run(num_features, block_size, cache, run_size,
+                 num_particles_list, dataset_num, algorithm):
+    """Returns {num_particles: posterior} of the first num_particles particles
+    of one run of run_size particles, for every entry of num_particles_list.
+    """
+
+    return prefix_estimates(
+        iter_dump_blocks(
+            dump_filename(algorithm, dataset_num, run_size),
+            block_size=block_size,
+            cache=cache
+        ),
+        MomentAccumulator(max_order=1),
+        num_particles_list,
+        lambda accumulator: np.transpose(
+            np.reshape(accumulator.moments()[0], (-1, num_features))
+        )
+    )
+
+
+def plot_inference(true_posteriors, posteriors, dataset_num_list,
+                   num_particles_list, algorithms, approximate=False):
+    """Plots inference_{dataset_num}_{num_particles}.pdf of every cell, with
+    the ground truth titled as a Gibbs estimate if approximate is set."""
+
+    import matplotlib
+    import matplotlib.pyplot as plt
+
+    for dataset_num in dataset_num_list:
+        for num_particles in num_particles_list:
+            fig = plt.figure()
+            fig.suptitle('{} particle{}'.format(
+                num_particles, '' if num_particles == 1 else 's'
+            ), fontsize=14, x=0.4, horizontalalignment='center')
+
+            gs = matplotlib.gridspec.GridSpec(len(algorithms) + 1, 2)
+            axs = [plt.subplot(gs[i, :-1])
+                   for i in range(len(algorithms) + 1)]
+            colorbar_ax = plt.subplot(gs[:, -1], aspect=50)
+
+            temp = axs[0].imshow(
+                true_posteriors[dataset_num], clim=[0, 1], aspect='auto'
+            )
+            axs[0].set_title(
+                'Ground Truth (Gibbs estimate)' if approximate else
+                'Ground Truth', fontsize=12
+            )
+
+            for ax, algorithm in zip(axs[1:], algorithms):
+                temp = ax.imshow(
+                    posteriors[dataset_num][num_particles][algorithm],
+                    clim=[0, 1], aspect='auto'
+                )
+                ax.set_title(algorithm.upper(), fontsize=12)
+
+            for ax in axs:
+                ax.grid(False)
+                ax.set_ylabel('Feature')
+                ax.set_xticks([])
+                ax.set_yticks([])
+            axs[-1].set_xlabel('Time')
+            fig.colorbar(
+                temp, cax=colorbar_ax, orientation='vertical', ticks=[0, 1]
+            )
+
+            gs.tight_layout(fig, rect=[0, 0, 1, 0.95])
+
+            filename = 'inference_{0}_{1}.pdf'.format(
+                dataset_num, num_particles
+            )
+            print('\nPlot saved to {}'.format(save_figure(fig, filename)))
+
+
+def plot_metrics(table, dataset_num_list, num_particles_list, algorithms):
+    """Plots {,log_}kl_{dataset_num}.pdf and {,log_}l2_{dataset_num}.pdf from
+    a table made by analysis.metrics.metric_table."""
+
+    for dataset_num in dataset_num_list:
+        kls = {
+            algorithm: metric_series(
+                table, 'kl', dataset_num, algorithm, num_particles_list
+            ) for algorithm in algorithms
+        }
+        l2s = {
+            algorithm: metric_series(
+                table, 'l2', dataset_num, algorithm, num_particles_list
+            ) for algorithm in algorithms
+        }
+
+        for loglog, prefix in [(False, ''), (True, 'log_')]:
+            plot_metric(
+                '{}kl_{}.pdf'.format(prefix, dataset_num),
+                'Sum of KL divergences',
+                '$\\sum_{t, f} KL(p(x_{tf} | y_{1:T}) || '
+                '\\hat p(x_{tf} | y_{1:T}))$',
+                num_particles_list, kls, loglog
+            )
+            plot_metric(
+                '{}l2_{}.pdf'.format(prefix, dataset_num),
+                'Sum of L2 norms',
+                '$\\sum_{t, f} L_2(p(x_{tf} | y_{1:T}), '
+                '\\hat p(x_{tf} | y_{1:T}))$',
+                num_particles_list, l2s, loglog
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset-num-list', nargs='+', type=int,
+                        help='space separated list of dataset numbers')
+    parser.add_argument('--num-particles-list', nargs='+', type=int,
+                        help='space separated list of number of particles')
+    parser.add_argument('--algorithms', nargs='+', type=str,
+                        help='space separated list of algorithms')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='always parse the inference result CSVs and '
+                        'recompute the ground truth instead of reusing them '
+                        'from .analysis-cache/')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='number of particles read into memory at a time')
+    parser.add_argument('--max-exact-features', type=int,
+                        default=MAX_EXACT_FEATURES,
+                        help='largest number of features for which the '
+                        'ground truth is computed exactly (default: '
+                        '{})'.format(MAX_EXACT_FEATURES))
+    parser.add_argument('--approximate-ground-truth', action='store_true',
+                        help='with more than --max-exact-features features, '
+                        'estimate the ground truth by Gibbs sampling instead '
+                        'of stopping; the estimates can be far from exact, '
+                        'and so can the KL and L2')
+    parser.add_argument('--metrics-table', default='metrics.csv',
+                        help='CSV (or .json) file the KL and L2 of every '
+                        'evaluated cell are saved to (default: metrics.csv)')
+    parser.add_argument('--replot', action='store_true',
+                        help='only redraw the KL and L2 plots from '
+                        '--metrics-table, without reading the inference '
+                        'results; the lists default to what the table holds')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='only save --metrics-table, as JSON if its name '
+                        'ends in .json, without drawing any figure or '
+                        'importing matplotlib')
+    add_dedupe_argument(parser)
+    add_anytime_argument(parser)
+    add_jobs_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    if args.anytime_run is not None and args.dedupe:
+        parser.error('--dedupe merges particles, so it cannot be combined '
+                     'with --anytime-run')
+    if args.cprofile is not None and args.profile is None:
+        parser.error('--cprofile needs --profile')
+    if args.metrics_only and args.replot:
+        parser.error('--metrics-only and --replot exclude each other')
+    profiler = Profiler(args.profile, args.cprofile).start()
+
+    if args.replot:
+        table = load_metric_table(args.metrics_table)
+        plot_metrics(
+            table,
+            args.dataset_num_list or column_values(table, 'dataset_num'),
+            args.num_particles_list or column_values(table, 'num_particles'),
+            args.algorithms or column_values(table, 'algorithm')
+        )
+        profiler.finish()
+        return
+
+    with open('model.csv') as f:
+        num_features = len(f.readline().split(','))
+    approximate = num_features > args.max_exact_features
+    if approximate and not args.approximate_ground_truth:
+        parser.error('model.csv has {} features, more than '
+                     '--max-exact-features {}; pass '
+                     '--approximate-ground-truth to estimate the ground truth '
+                     'by Gibbs sampling'.format(
+                         num_features, args.max_exact_features
+                     ))
+
+    true_posteriors = {}
+    posteriors = {}
+    for dataset_num in args.dataset_num_list:
+        true_posteriors[dataset_num] = factorial_hmm_posterior(
+            'model.csv', 'data_{}.csv'.format(dataset_num),
+            max_exact_features=args.max_exact_features,
+            approximate=args.approximate_ground_truth, cache=args.cache
+        )
+        posteriors[dataset_num] = {
+            num_particles: {} for num_particles in args.num_particles_list
+        }
+
+    if args.anytime_run is not None:
+        results = evaluate_anytime(
+            functools.partial(
+                evaluate_run, num_features, args.block_size, args.cache,
+                args.anytime_run, args.num_particles_list
+            ),
+            args.dataset_num_list, args.num_particles_list, args.algorithms,
+            jobs=args.jobs, profiler=profiler
+        )
+    else:
+        results = profiler.evaluate_grid(
+            functools.partial(
+                evaluate_cell, num_features, args.block_size, args.cache,
+                args.dedupe
+            ),
+            evaluation_grid(
+                args.dataset_num_list, args.num_particles_list,
+                args.algorithms
+            ),
+            jobs=args.jobs
+        )
+    for (dataset_num, num_particles, algorithm), posterior in results.items():
+        posteriors[dataset_num][num_particles][algorithm] = posterior
+
+    if not args.metrics_only:
+        plot_inference(
+            true_posteriors, posteriors, args.dataset_num_list,
+            args.num_particles_list, args.algorithms, approximate
+        )
+
+    table = metric_table(true_posteriors, results, [
+        ('kl', lambda true_posterior, posterior: get_sum_kl(
+            get_distributions(true_posterior), get_distributions(posterior)
+        )),
+        ('l2', lambda true_posterior, posterior: get_sum_l2(
+            get_distributions(true_posterior), get_distributions(posterior)
+        ))
+    ])
+    print('\nMetrics saved to {}'.format(
+        save_metric_table(args.metrics_table, table)
+    ))
+    if approximate:
+        print('The KL and L2 are measured from Gibbs estimates of the ground '
+              'truth, not from exact marginals')
+
+    if not args.metrics_only:
+        plot_metrics(
+            table, args.dataset_num_list, args.num_particles_list,
+            args.algorithms
+        )
+    profiler.finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,29 @@
+import argparse
 import matplotlib
 import matplotlib.pylab as plt
 import numpy as np
 import numpy.linalg
 import csv
-import sys, getopt
+import glob
+import os
+import pickle
+import sys
+import time
+from matplotlib.backends.backend_pdf import PdfPages
+from scipy.spatial import cKDTree
 from scipy.stats import chi2
 from PIL import Image
 
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir
+))
+from analysis import paths  # noqa
+from analysis.driver import add_jobs_argument, evaluate_grid  # noqa
+
+# Above this many hits, nearest means are found with a KD-tree instead of the
+# full [num_hits, num_means] distance matrix.
+KD_TREE_MIN_HITS = 10000
+
 def tableau20(k):
     tableau20 = [(31, 119, 180), (174, 199, 232), (255, 127, 14), (255, 187, 120),
              (44, 160, 44), (152, 223, 138), (214, 39, 40), (255, 152, 150),
@@ -53,26 +70,42 @@ def read_data(data_filename):
                 print('not found')
     return num_samples, dimension, data, clusters, cluster_probs, means, variances
 
+def assign_clusters(data, means):
+    """
+    Return [num_data] np.array of the index of the closest mean to each row of data.
+    """
+    data = np.asarray(data, dtype=float)
+    means = np.asarray(means, dtype=float)
+    if len(data) >= KD_TREE_MIN_HITS:
+        return cKDTree(means).query(data)[1]
+    squared_distances = np.sum((data[:, np.newaxis, :] - means[np.newaxis, :, :])**2, axis=2)
+    return np.argmin(squared_distances, axis=1)
+
+def get_ellipses(mean, cov, num_points, confidences):
+    """
+    Return [len(confidences) * num_points * 2] np.array of the ellipses of get_ellipse for several confidences, sharing one eigendecomposition of cov.
+    """
+    eigenvals, eigenvecs = np.linalg.eig(np.linalg.inv(cov))
+    k = chi2.ppf(confidences, 2)
+    theta = np.reshape(np.linspace(0, 2 * np.pi, num = num_points), (-1, 1))
+    a = np.sqrt(1 / eigenvals[0])
+    b = np.sqrt(1 / eigenvals[1])
+    unit_ellipse = np.dot(np.concatenate([a * np.sin(theta), b * np.cos(theta)], axis = 1), np.linalg.inv(eigenvecs))
+    return np.sqrt(k)[:, np.newaxis, np.newaxis] * unit_ellipse + mean
+
 def get_ellipse(mean, cov, num_points, confidence, cluster_prob = 1.0):
     """
     Return [num_points * 2] np.array whose rows correspond to the point on the ellipse which encloses confidence (0 < confidence < 1) of the probability mass of a bivariate normal distribution parametrised by mean and cov.
 
     See https://bitbucket.org/tuananhle/smc-data-driven/src/830819061350d3fe7e1e77dabb72a23c4bb7782a/src/ddpmo_lein/plotting/getEllipse.m?at=april11&fileviewer=file-view-default.
     """
-    eigenvals, eigenvecs = np.linalg.eig(np.linalg.inv(cov))
-    k = chi2.ppf(confidence, 2)
-    theta = np.reshape(np.linspace(0, 2 * np.pi, num = num_points), (-1, 1))
-    a = np.sqrt(k / eigenvals[0])
-    b = np.sqrt(k / eigenvals[1])
-    y = np.concatenate([a * np.sin(theta), b * np.cos(theta)], axis = 1)
-    ellipse = np.dot(y, np.linalg.inv(eigenvecs)) + np.tile(mean, [num_points, 1])
-    return ellipse
+    return get_ellipses(mean, cov, num_points, [confidence])[0]
 
 def plot_mvn(ax, mean, cov, cluster_prob = 0, param_dict = {}):
-    ax.plot(*zip(*get_ellipse(mean, cov, 100, 0.66)), **param_dict)
-    ax.plot(*zip(*get_ellipse(mean, cov, 100, 0.95)), **param_dict)
-    out = ax.plot(*zip(*get_ellipse(mean, cov, 100, 0.99, cluster_prob)), **param_dict)
-    return out[0]
+    ellipses = get_ellipses(mean, cov, 100, [0.66, 0.95, 0.99])
+    # One plot call draws one line per column
+    out = ax.plot(ellipses[:, :, 0].T, ellipses[:, :, 1].T, **param_dict)
+    return out[-1]
 
 def make_plots(ax, data, image, imagewidth, imageheight):
     num_samples, dimension, data, clusters, cluster_probs, means, variances = data
@@ -100,16 +133,12 @@ def make_plots(ax, data, image, imagewidth, imageheight):
     handles = []
 
     # data_points = ax.scatter(*zip(*data))
-    for i in range(len(data)):
-        mindist = 100000000
-        # clusters[i] = 0
-        for j in range(len(means)):
-            dist = np.linalg.norm(data[i] - means[j])
-            if dist < mindist:
-                mindist = dist
-                clusters[i] = j
-
-        ax.scatter([((data[i][0] + 1) / 2)  * imagewidth], [((data[i][1] + 1) / 2) * imageheight], marker=marker_style(clusters[i]), color=tableau20(clusters[i]))
+    clusters = assign_clusters(data, means)
+    data_x = ((data[:, 0] + 1) / 2) * imagewidth
+    data_y = ((data[:, 1] + 1) / 2) * imageheight
+    for j in np.unique(clusters):
+        in_cluster = clusters == j
+        ax.scatter(data_x[in_cluster], data_y[in_cluster], marker=marker_style(j), color=tableau20(j))
     # labels.append('Data')
     # handles.append(matplotlib.lines.Line2D([0], [0], color='black', marker='x', linestyle='None'))
 
@@ -122,44 +151,109 @@ def make_plots(ax, data, image, imagewidth, imageheight):
 
     return ax
 
-def main(argv):
-    try:
-        opts, args = getopt.getopt(argv, "i:m:o:", ["datafile", "imagefile", "plotfile"])
-    except getopt.GetoptError:
-        print("plot.py -i <datafile> -m <imagefile> -o <output>")
-        sys.exit(2)
+def expand_filenames(arg):
+    """
+    Return the comma separated file names in arg, with glob patterns expanded in sorted order.
+    """
+    filenames = []
+    for pattern in arg.split(','):
+        if glob.has_magic(pattern):
+            filenames.extend(sorted(glob.glob(pattern)))
+        else:
+            filenames.append(pattern)
+    return filenames
 
-    for opt, arg in opts:
-        print(opt)
-        print(arg)
-        if opt in ("-i", "--datafile"):
-            data_filename_arg = arg
-        elif opt in ("-m", "--imagefile"):
-            image_filename_arg = arg
-        elif opt in ("-o", "--plotfile"):
-            plot_filename = arg
+def output_filename(plot_filename, image_filename):
+    """
+    Return plot_filename with the image's base name appended, e.g. plot.pdf and 1.jpg give plot_1.pdf.
+    """
+    root, ext = os.path.splitext(plot_filename)
+    return root + '_' + os.path.splitext(os.path.basename(image_filename))[0] + ext
 
-    data_filenames = data_filename_arg.split(',')
-    image_filenames = image_filename_arg.split(',')
+def plot_image(data_filename, image_filename, plot_filename):
+    """
+    Plot the clustering of one image. Save it to plot_filename, or return the pickled figure if plot_filename is None.
 
-    # set up figure
+    Return (pickled figure or None, seconds taken).
+    """
+    start = time.time()
     matplotlib.rc('font', size=12)
     fig = plt.figure(figsize=(8, 8))
     ax = fig.add_subplot(1, 1, 1)
 
-    (imagewidth, imageheight) = Image.open(image_filenames[0]).size
+    (imagewidth, imageheight) = Image.open(image_filename).size
 
     # plot
-    data = read_data(data_filenames[0])
-    image = plt.imread(image_filenames[0])
+    data = read_data(data_filename)
+    image = plt.imread(image_filename)
     make_plots(ax, data, image, imagewidth, imageheight)
 
     # axes postprocessing
     # ax.legend(handles=handles, loc='lower left', bbox_to_anchor=[0, 0], frameon=False, ncol=4, fontsize=8)
 
+    if plot_filename is None:
+        pickled_fig = pickle.dumps(fig)
+    else:
+        fig.savefig(plot_filename, bbox_inches='tight')
+        pickled_fig = None
+    plt.close(fig)
+    return pickled_fig, time.time() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--datafile", required=True,
+                        help="detector hits CSV, or a comma separated list or glob of them")
+    parser.add_argument("-m", "--imagefile", required=True,
+                        help="image, or a comma separated list or glob of images in the order of --datafile")
+    parser.add_argument("-o", "--plotfile", required=True,
+                        help="output file; with several images a PDF gets one page per image and any other format one file per image")
+    add_jobs_argument(parser)
+    args = parser.parse_args(argv)
+    plot_filename = paths.output_filename(args.plotfile)
+    jobs = args.jobs
+
+    data_filenames = expand_filenames(args.datafile)
+    image_filenames = expand_filenames(args.imagefile)
+    if len(data_filenames) != len(image_filenames):
+        print("got {} data files but {} image files".format(len(data_filenames), len(image_filenames)))
+        sys.exit(2)
+
+    # With several images, a PDF output gets one page per image; any other
+    # output gets one file per image.
+    multipage = len(image_filenames) > 1 and plot_filename.endswith('.pdf')
+    if multipage:
+        plot_filenames = [None] * len(image_filenames)
+    elif len(image_filenames) > 1:
+        plot_filenames = [output_filename(plot_filename, f) for f in image_filenames]
+    else:
+        plot_filenames = [plot_filename]
+
+    start = time.time()
+    cells = list(zip(data_filenames, image_filenames, plot_filenames))
+    results = evaluate_grid(plot_image, cells, jobs)
+
     # print figure
-    fig.savefig(plot_filename, bbox_inches='tight')
-    print("Plot saved to " + plot_filename)
+    # PdfPages cannot be written from several processes, so the pages of a
+    # multipage PDF are rendered here one after another; their render time is
+    # added to the time the worker took to build the figure.
+    seconds = {cell: results[cell][1] for cell in cells}
+    if multipage:
+        with PdfPages(plot_filename) as pdf:
+            for cell in cells:
+                render_start = time.time()
+                fig = pickle.loads(results[cell][0])
+                pdf.savefig(fig, bbox_inches='tight')
+                plt.close(fig)
+                seconds[cell] += time.time() - render_start
+        print("Plot saved to " + plot_filename)
+    else:
+        for cell in cells:
+            print("Plot saved to " + cell[2])
+
+    for cell in cells:
+        print("{}: {:.3f} s".format(cell[1], seconds[cell]))
+    total = time.time() - start
+    print("{} images in {:.3f} s ({:.2f} images/s)".format(len(cells), total, len(cells) / total))
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    main()
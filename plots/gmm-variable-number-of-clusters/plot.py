@@ -1,10 +1,15 @@
-import matplotlib
-import matplotlib.pylab as plt
+import argparse
 import numpy as np
 import numpy.linalg
 import csv
-import sys, getopt
-import matplotlib.mlab as mlab
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.kde import gaussian_kernel_sum  # noqa
+from analysis.plotting import save_figure  # noqa
 
 def chunks(lst, n):
     n = max(1, n)
@@ -42,9 +47,9 @@ def make_plots(ax, data, kde_sigma, title):
     # ax.spines["bottom"].set_linewidth(0.5)
     # ax.spines["bottom"].set_color('black')
     # ax.spines["bottom"].set_alpha(0.0)
-    ax.yaxis.grid(b=True, which='major', linestyle='dotted', lw=0.5, color='black', alpha=0.3)
-    ax.xaxis.grid(b=True, which='major', linestyle='dotted', lw=0.5, color='black', alpha=0.3)
-    ax.tick_params(axis="both", which="both", bottom="off", top="off", labelbottom="off", left="off", right="off", labelleft="off")
+    ax.yaxis.grid(True, which='major', linestyle='dotted', lw=0.5, color='black', alpha=0.3)
+    ax.xaxis.grid(True, which='major', linestyle='dotted', lw=0.5, color='black', alpha=0.3)
+    ax.tick_params(axis="both", which="both", bottom=False, top=False, labelbottom=False, left=False, right=False, labelleft=False)
     ax.set_xlim(-1, 1)
     ax.set_xticks([-1, 0, 1])
     ax.set_ylim(-1, 1)
@@ -57,34 +62,28 @@ def make_plots(ax, data, kde_sigma, title):
     labels = []
     handles = []
 
-    for i in range(len(data)):
-        ax.scatter([data[i][0]], [data[i][1]], marker='.', color='black', s=0.5)
+    ax.scatter(data[:, 0], data[:, 1], marker='.', color='black', s=0.5)
 
     delta = 0.025
     x = np.arange(-1.0, 1.0, delta)
     y = np.arange(-1.0, 1.0, delta)
     X, Y = np.meshgrid(x, y)
-    Z = np.zeros((len(x), len(y)))
-
-    for i in range(len(list_of_means_MAP)):
-        mean = list_of_means_MAP[i]
-        Z = Z + mlab.bivariate_normal(X, Y, kde_sigma, kde_sigma, mean[0], mean[1])
+    Z = gaussian_kernel_sum(list_of_means_MAP, x, y, kde_sigma)
 
     cs = ax.contour(X, Y, Z)
     # ax.clabel(cs, inline=1, fontsize=10)
 
     return ax
 
-def main(argv):
-    try:
-        opts, args = getopt.getopt(argv, "o:", [ "plotfile"])
-    except getopt.GetoptError:
-        print("plot.py -o <output>")
-        sys.exit(2)
+def main(argv=None):
+    import matplotlib
+    import matplotlib.pylab as plt
 
-    for opt, arg in opts:
-        if opt in ("-o", "--plotfile"):
-            plot_filename = arg
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--plotfile", required=True,
+                        help="output file of the contours of smc-{num_particles}.csv and csis-{num_particles}.csv")
+    args = parser.parse_args(argv)
+    plot_filename = args.plotfile
 
     num_particles_seq = [1, 10, 100, 1000, 10000]
     smc_titles = ['smc ' + str(x) for x in num_particles_seq]
@@ -117,8 +116,7 @@ def main(argv):
 
 
     # print figure
-    fig.savefig(plot_filename, bbox_inches='tight')
-    print("Plot saved to " + plot_filename)
+    print("Plot saved to " + save_figure(fig, plot_filename))
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    main()
@@ -1,100 +1,71 @@
 import argparse
-import matplotlib
-import matplotlib.pyplot as plt
+import functools
 import numpy as np
-import hmmlearn.hmm as hmm
-import scipy as sp
-
-
-def get_posterior(inference_result, num_states):
-    unnormalized_log_weights = inference_result[:, 0]
-    normalized_log_weights = unnormalized_log_weights - \
-        sp.misc.logsumexp(unnormalized_log_weights)
-    normalized_weights = np.exp(normalized_log_weights)
-
-    particle_values = inference_result[:, 1:]
-
-    num_timesteps = np.shape(particle_values)[1]
-
-    normalized_weights_duplicated = np.tile(
-        np.reshape(normalized_weights, (-1, 1)), reps=(1, num_timesteps)
-    )
-
-    posterior = np.zeros((num_states, num_timesteps))
-    for state in range(num_states):
-        posterior[state] = np.sum(
-            normalized_weights_duplicated * (particle_values == state), axis=0
-        )
-
-    return posterior
-
-
-def get_sum_kl(posterior_1, posterior_2, epsilon=1e-10):
-    return np.sum(
-        posterior_1 * (
-            np.log(posterior_1 + epsilon) - np.log(posterior_2 + epsilon)
-        )
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.anytime import add_anytime_argument, evaluate_anytime, \
+    prefix_estimates  # noqa
+from analysis.driver import add_jobs_argument, evaluation_grid  # noqa
+from analysis.dumps import DEFAULT_BLOCK_SIZE, add_dedupe_argument, \
+    dump_filename, iter_dump_blocks  # noqa
+from analysis.ground_truth import hmm_posterior  # noqa
+from analysis.metrics import column_values, get_sum_kl, get_sum_l2, \
+    load_metric_table, metric_series, metric_table, save_metric_table  # noqa
+from analysis.plotting import plot_metric, save_figure  # noqa
+from analysis.profiling import Profiler, add_profile_argument  # noqa
+from analysis.streaming import PosteriorAccumulator, stream_posterior  # noqa
+
+
+def evaluate_cell(num_states, block_size, cache, dedupe, dataset_num,
+                  num_particles, algorithm):
+    return stream_posterior(
+        dump_filename(algorithm, dataset_num, num_particles),
+        num_states,
+        block_size=block_size,
+        cache=cache,
+        dedupe=dedupe
+    ).marginals()
+
+
+def evaluate_run(num_states, block_size, cache, run_size, num_particles_list,
+                 dataset_num, algorithm):
+    """Returns {num_particles: marginals} of the first num_particles particles
+    of one run of run_size particles, for every entry of num_particles_list.
+    """
+
+    return prefix_estimates(
+        iter_dump_blocks(
+            dump_filename(algorithm, dataset_num, run_size),
+            block_size=block_size,
+            cache=cache
+        ),
+        PosteriorAccumulator(num_states),
+        num_particles_list,
+        PosteriorAccumulator.marginals
     )
 
 
-def get_sum_l2(posterior_1, posterior_2):
-    return np.sum(np.sqrt(np.sum((posterior_1 - posterior_2)**2, axis=0)))
-
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--dataset-num-list', nargs='+', type=int,
-                        help='space separated list of dataset numbers')
-    parser.add_argument('--num-particles-list', nargs='+', type=int,
-                        help='space separated list of number of particles')
-    parser.add_argument('--algorithms', nargs='+', type=str,
-                        help='space separated list of algorithms')
-    args = parser.parse_args()
-
-    model = np.genfromtxt('model.csv', delimiter=',')
-    num_states = np.shape(model)[1]
-    my_hmm = hmm.GaussianHMM(n_components=num_states, covariance_type='full')
-    my_hmm.startprob_ = model[0]
-    my_hmm.transmat_ = model[1:(num_states + 1)]
-    my_hmm.means_ = np.reshape(model[num_states + 1], (-1, 1))
-    my_hmm.covars_ = np.reshape(model[num_states + 2], (-1, 1, 1))
+def plot_inference(true_posteriors, posteriors, data, num_states,
+                   dataset_num_list, num_particles_list, algorithms):
+    """Plots inference_{dataset_num}_{num_particles}.pdf of every cell."""
 
-    true_posteriors = {}
-    posteriors = {}
-    data = {}
-    for dataset_num in args.dataset_num_list:
-        data[dataset_num] = np.genfromtxt(
-            'data_{}.csv'.format(dataset_num), delimiter=','
-        )
-        true_posteriors[dataset_num] = np.transpose(
-            my_hmm.predict_proba(np.reshape(data[dataset_num], (-1, 1)))
-        )
-        posteriors[dataset_num] = {}
+    import matplotlib
+    import matplotlib.pyplot as plt
 
-        for num_particles in args.num_particles_list:
-            posteriors[dataset_num][num_particles] = {}
-
-            for algorithm in args.algorithms:
-                inference_result = np.genfromtxt('{}_{}_{}.csv'.format(
-                    algorithm, dataset_num, num_particles
-                ), delimiter=',')
-                if len(np.shape(inference_result)) == 1:
-                    inference_result = np.reshape(inference_result, (1, -1))
-
-                posteriors[dataset_num][num_particles][algorithm] = \
-                    get_posterior(inference_result, num_states)
-
-    # Plot inference_{dataset_num}_{num_particles}.pdf
-    for dataset_num in args.dataset_num_list:
-        for num_particles in args.num_particles_list:
+    for dataset_num in dataset_num_list:
+        for num_particles in num_particles_list:
             fig = plt.figure()
             fig.suptitle('{} particle{}'.format(
                 num_particles, '' if num_particles == 1 else 's'
             ), fontsize=14, x=0.4, horizontalalignment='center')
 
-            gs = matplotlib.gridspec.GridSpec(len(args.algorithms) + 1, 2)
+            gs = matplotlib.gridspec.GridSpec(len(algorithms) + 1, 2)
             axs = [plt.subplot(gs[i, :-1])
-                   for i in range(len(args.algorithms) + 1)]
+                   for i in range(len(algorithms) + 1)]
             colorbar_ax = plt.subplot(gs[:, -1], aspect=50)
 
             temp = axs[0].imshow(
@@ -106,7 +77,7 @@ def main():
             axs[0].set_xticks([])
             axs[0].set_yticks(range(num_states))
 
-            for ax, algorithm in zip(axs[1:], args.algorithms):
+            for ax, algorithm in zip(axs[1:], algorithms):
                 temp = ax.imshow(
                     posteriors[dataset_num][num_particles][algorithm],
                     clim=[0, 1]
@@ -129,108 +100,152 @@ def main():
             filename = 'inference_{0}_{1}.pdf'.format(
                 dataset_num, num_particles
             )
-            fig.savefig(filename, bbox_inches='tight')
-            print('\nPlot saved to {}'.format(filename))
-
-    # Plot kl_{dataset_num}.pdf
-    for dataset_num in args.dataset_num_list:
-        fig, ax = plt.subplots(1, 1)
-        fig.suptitle('Sum of KL divergences', fontsize=14)
-        kls = {}
-        for algorithm in args.algorithms:
-            kls[algorithm] = []
-            for num_particles in args.num_particles_list:
-                kls[algorithm].append(get_sum_kl(
-                    true_posteriors[dataset_num],
-                    posteriors[dataset_num][num_particles][algorithm]
-                ))
-
-            ax.plot(args.num_particles_list, kls[algorithm], label=algorithm)
-
-        ax.legend()
-        ax.set_xlabel('Number of particles')
-        ax.set_ylabel(
-            '$\sum_{t = 1}^T KL(p(x_t | y_{1:T}) || \hat p(x_t | y_{1:T}))$'
-        )
+            print('\nPlot saved to {}'.format(save_figure(fig, filename)))
+
+
+def plot_metrics(table, dataset_num_list, num_particles_list, algorithms):
+    """Plots {,log_}kl_{dataset_num}.pdf and {,log_}l2_{dataset_num}.pdf from
+    a table made by analysis.metrics.metric_table."""
+
+    for dataset_num in dataset_num_list:
+        kls = {
+            algorithm: metric_series(
+                table, 'kl', dataset_num, algorithm, num_particles_list
+            ) for algorithm in algorithms
+        }
+        l2s = {
+            algorithm: metric_series(
+                table, 'l2', dataset_num, algorithm, num_particles_list
+            ) for algorithm in algorithms
+        }
+
+        for loglog, prefix in [(False, ''), (True, 'log_')]:
+            plot_metric(
+                '{}kl_{}.pdf'.format(prefix, dataset_num),
+                'Sum of KL divergences',
+                '$\\sum_{t = 1}^T KL(p(x_t | y_{1:T}) || '
+                '\\hat p(x_t | y_{1:T}))$',
+                num_particles_list, kls, loglog
+            )
+            plot_metric(
+                '{}l2_{}.pdf'.format(prefix, dataset_num),
+                'Sum of L2 norms',
+                '$\\sum_{t = 1}^T L_2(p(x_t | y_{1:T}), '
+                '\\hat p(x_t | y_{1:T}))$',
+                num_particles_list, l2s, loglog
+            )
 
-        filename = 'kl_{}.pdf'.format(dataset_num)
-        fig.savefig(filename, bbox_inches='tight')
-        print('\nPlot saved to {}'.format(filename))
 
-    # Plot l2_{dataset_num}.pdf
-    for dataset_num in args.dataset_num_list:
-        fig, ax = plt.subplots(1, 1)
-        fig.suptitle('Sum of L2 norms', fontsize=14)
-        l2s = {}
-        for algorithm in args.algorithms:
-            l2s[algorithm] = []
-            for num_particles in args.num_particles_list:
-                l2s[algorithm].append(get_sum_l2(
-                    true_posteriors[dataset_num],
-                    posteriors[dataset_num][num_particles][algorithm]
-                ))
-
-            ax.plot(args.num_particles_list, l2s[algorithm], label=algorithm)
-
-        ax.legend()
-        ax.set_xlabel('Number of particles')
-        ax.set_ylabel(
-            '$\sum_{t = 1}^T L_2(p(x_t | y_{1:T}), \hat p(x_t | y_{1:T}))$'
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset-num-list', nargs='+', type=int,
+                        help='space separated list of dataset numbers')
+    parser.add_argument('--num-particles-list', nargs='+', type=int,
+                        help='space separated list of number of particles')
+    parser.add_argument('--algorithms', nargs='+', type=str,
+                        help='space separated list of algorithms')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='always parse the inference result CSVs and '
+                        'recompute the ground truth instead of reusing them '
+                        'from .analysis-cache/')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='number of particles read into memory at a time')
+    parser.add_argument('--metrics-table', default='metrics.csv',
+                        help='CSV (or .json) file the KL and L2 of every '
+                        'evaluated cell are saved to (default: metrics.csv)')
+    parser.add_argument('--replot', action='store_true',
+                        help='only redraw the KL and L2 plots from '
+                        '--metrics-table, without reading the inference '
+                        'results; the lists default to what the table holds')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='only save --metrics-table, as JSON if its name '
+                        'ends in .json, without drawing any figure or '
+                        'importing matplotlib')
+    add_dedupe_argument(parser)
+    add_anytime_argument(parser)
+    add_jobs_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    if args.anytime_run is not None and args.dedupe:
+        parser.error('--dedupe merges particles, so it cannot be combined '
+                     'with --anytime-run')
+    if args.cprofile is not None and args.profile is None:
+        parser.error('--cprofile needs --profile')
+    if args.metrics_only and args.replot:
+        parser.error('--metrics-only and --replot exclude each other')
+    profiler = Profiler(args.profile, args.cprofile).start()
+
+    if args.replot:
+        table = load_metric_table(args.metrics_table)
+        plot_metrics(
+            table,
+            args.dataset_num_list or column_values(table, 'dataset_num'),
+            args.num_particles_list or column_values(table, 'num_particles'),
+            args.algorithms or column_values(table, 'algorithm')
         )
+        profiler.finish()
+        return
 
-        filename = 'l2_{}.pdf'.format(dataset_num)
-        fig.savefig(filename, bbox_inches='tight')
-        print('\nPlot saved to {}'.format(filename))
+    model = np.genfromtxt('model.csv', delimiter=',')
+    num_states = np.shape(model)[1]
 
-    # Plot log_kl_{dataset_num}.pdf
+    true_posteriors = {}
+    posteriors = {}
+    data = {}
     for dataset_num in args.dataset_num_list:
-        fig, ax = plt.subplots(1, 1)
-        fig.suptitle('Sum of KL divergences', fontsize=14)
-        kls = {}
-        for algorithm in args.algorithms:
-            kls[algorithm] = []
-            for num_particles in args.num_particles_list:
-                kls[algorithm].append(get_sum_kl(
-                    true_posteriors[dataset_num],
-                    posteriors[dataset_num][num_particles][algorithm]
-                ))
-
-            ax.loglog(args.num_particles_list, kls[algorithm], label=algorithm)
-
-        ax.legend()
-        ax.set_xlabel('Number of particles')
-        ax.set_ylabel(
-            '$\sum_{t = 1}^T KL(p(x_t | y_{1:T}) || \hat p(x_t | y_{1:T}))$'
+        data[dataset_num] = np.genfromtxt(
+            'data_{}.csv'.format(dataset_num), delimiter=','
         )
+        true_posteriors[dataset_num] = hmm_posterior(
+            'model.csv', 'data_{}.csv'.format(dataset_num), cache=args.cache
+        )
+        posteriors[dataset_num] = {
+            num_particles: {} for num_particles in args.num_particles_list
+        }
+
+    if args.anytime_run is not None:
+        results = evaluate_anytime(
+            functools.partial(
+                evaluate_run, num_states, args.block_size, args.cache,
+                args.anytime_run, args.num_particles_list
+            ),
+            args.dataset_num_list, args.num_particles_list, args.algorithms,
+            jobs=args.jobs, profiler=profiler
+        )
+    else:
+        results = profiler.evaluate_grid(
+            functools.partial(
+                evaluate_cell, num_states, args.block_size, args.cache,
+                args.dedupe
+            ),
+            evaluation_grid(
+                args.dataset_num_list, args.num_particles_list,
+                args.algorithms
+            ),
+            jobs=args.jobs
+        )
+    for (dataset_num, num_particles, algorithm), posterior in results.items():
+        posteriors[dataset_num][num_particles][algorithm] = posterior
 
-        filename = 'log_kl_{}.pdf'.format(dataset_num)
-        fig.savefig(filename, bbox_inches='tight')
-        print('\nPlot saved to {}'.format(filename))
-
-    # Plot log_l2_{dataset_num}.pdf
-    for dataset_num in args.dataset_num_list:
-        fig, ax = plt.subplots(1, 1)
-        fig.suptitle('Sum of L2 norms', fontsize=14)
-        l2s = {}
-        for algorithm in args.algorithms:
-            l2s[algorithm] = []
-            for num_particles in args.num_particles_list:
-                l2s[algorithm].append(get_sum_l2(
-                    true_posteriors[dataset_num],
-                    posteriors[dataset_num][num_particles][algorithm]
-                ))
-
-            ax.loglog(args.num_particles_list, l2s[algorithm], label=algorithm)
-
-        ax.legend()
-        ax.set_xlabel('Number of particles')
-        ax.set_ylabel(
-            '$\sum_{t = 1}^T L_2(p(x_t | y_{1:T}), \hat p(x_t | y_{1:T}))$'
+    if not args.metrics_only:
+        plot_inference(
+            true_posteriors, posteriors, data, num_states,
+            args.dataset_num_list, args.num_particles_list, args.algorithms
         )
 
-        filename = 'log_l2_{}.pdf'.format(dataset_num)
-        fig.savefig(filename, bbox_inches='tight')
-        print('\nPlot saved to {}'.format(filename))
+    table = metric_table(
+        true_posteriors, results, [('kl', get_sum_kl), ('l2', get_sum_l2)]
+    )
+    print('\nMetrics saved to {}'.format(
+        save_metric_table(args.metrics_table, table)
+    ))
+
+    if not args.metrics_only:
+        plot_metrics(
+            table, args.dataset_num_list, args.num_particles_list,
+            args.algorithms
+        )
+    profiler.finish()
 
 
 if __name__ == '__main__':
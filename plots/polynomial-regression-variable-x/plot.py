@@ -1,82 +1,92 @@
 import argparse
-import matplotlib.pyplot as plt
 import numpy as np
-import scipy.misc
+import os
 import scipy.stats
+import sys
 
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.dumps import add_dedupe_argument, dump_filename, \
+    load_dump  # noqa
+from analysis.metrics import make_metric_table, save_metric_table  # noqa
+from analysis.moments import empirical_mean, logsumexp, \
+    normalize_log_weights  # noqa
+from analysis.plotting import save_figure  # noqa
 
-def empirical_expectation(particle_values, normalized_weights, f):
-    """Returns empirical expectation.
+# Likelihood of the query in src/worksheets/polynomial_regression_variable_x.clj
+STUDENT_T_DEGREES_OF_FREEDOM = 4
+STUDENT_T_SCALE = 1
 
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-        f: function that takes np.ndarray [dim_1, ..., dim_N] and returns
-            np.ndarray [out_dim_1, ..., out_dim_M]
-
-    output: np.ndarray [out_dim_1, ..., out_dim_M]
-    """
-
-    result = 0
-    for p in range(len(normalized_weights)):
-        f_temp = f(particle_values[p])
-        result += normalized_weights[p] * f_temp
-
-    return result
-
-
-def empirical_mean(particle_values, normalized_weights):
-    """Returns empirical mean.
-
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-
-    output: np.ndarray [dim_1, ..., dim_N]
-    """
-
-    return empirical_expectation(
-        particle_values, normalized_weights, lambda x: x
-    )
-
-
-def empirical_variance(particle_values, normalized_weights):
-    """Returns empirical variance.
-
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-
-    output: np.ndarray [dim_1, ..., dim_N]
-    """
-
-    return empirical_expectation(
-        particle_values, normalized_weights, lambda x: x**2
-    ) - empirical_mean(particle_values, normalized_weights)**2
-
-def normalize_weights(log_weights):
-    weights = np.exp(log_weights)
-    norm = sum(weights)
-    return [i/norm for i in weights]
 
 def quadratic(w, x):
     """"Returns mapping of a single x-value to a polynomial with w = [w0,w1,w2]"""
     return w[0]+w[1]*x+w[2]*x**2
 
+def quadratics(particle_weights, X):
+    """Returns np.ndarray [num_particles, len(X)] of every particle's quadratic at
+    every x-value, as one matrix product"""
+    return np.dot(np.asarray(particle_weights, dtype=float).reshape(-1, 3),
+                  np.vander(np.asarray(X, dtype=float), 3, increasing=True).T)
+
+def posteriorPredictive(log_weights, particle_weights, X, Y):
+    """Returns (mean squared error, mean log predictive density) of the test
+    points (X, Y) under the posterior predictive distribution of the weighted
+    particles, with all particles evaluated at all test points at once.
+    The predictive mean is the weighted mean of the particles' predictions and
+    the predictive density is the weighted mixture of the query's student-t
+    likelihoods."""
+    log_weights = np.asarray(log_weights, dtype=float)
+    log_weights = log_weights - logsumexp(log_weights)
+    predictions = quadratics(particle_weights, X)
+    Y = np.asarray(Y, dtype=float)
+
+    predicted_Y = np.dot(np.exp(log_weights), predictions)
+    mse = np.mean((predicted_Y - Y)**2)
+
+    log_likelihoods = scipy.stats.t.logpdf(
+        Y, STUDENT_T_DEGREES_OF_FREEDOM, loc=predictions, scale=STUDENT_T_SCALE)
+    lpd = np.mean(logsumexp(log_weights[:, np.newaxis] + log_likelihoods, axis=0))
+    return mse, lpd
+
 def plotQuadratic(w, xrange = [-10, 10]):
     X = np.arange(xrange[0], xrange[1], 0.1)
-    Y = [quadratic(w,x) for x in X]
+    Y = quadratics(w, X)[0]
     return (X,Y)
 
-def plot(num_dataset, particles_range):
-    """ Plots the contents of the specified file, as described in the README """
+def plotQuadratics(ax, particle_weights, weights, xrange = [-10, 10], min_weight = 0):
+    """Draws every particle's quadratic as a single LineCollection, with the
+    opacity of each line given by its normalized weight. Particles with
+    normalized weight below min_weight are left out."""
+    from matplotlib.collections import LineCollection
+
+    weights = np.asarray(weights, dtype=float)
+    keep = weights >= min_weight
+    X = np.arange(xrange[0], xrange[1], 0.1)
+    Y = quadratics(np.asarray(particle_weights)[keep], X)
+    segments = np.empty(Y.shape + (2,))
+    segments[:, :, 0] = X
+    segments[:, :, 1] = Y
+    colors = np.zeros((len(Y), 4))
+    colors[:, 2] = 1
+    colors[:, 3] = np.minimum(1, 5*weights[keep])
+    ax.add_collection(LineCollection(segments, colors=colors))
+
+def plot(num_dataset, particles_range, min_weight=0, dedupe=False, cache=True):
+    """ Plots the contents of the specified file, as described in the README.
+    Particles with normalized weight below min_weight are not drawn; with
+    thousands of particles most of them are invisible anyway. With dedupe,
+    identical particles are drawn once with their summed weight. """
+    import matplotlib.pyplot as plt
+
     with open("data_" + str(num_dataset) + ".csv") as file:
         true_weights = [float(i) for i in file.readline().rstrip().split(",")]
         X = [float(i) for i in file.readline().rstrip().split(",")]
         Y = [float(i) for i in file.readline().rstrip().split(",")]
     
     true_x, true_y = plotQuadratic(true_weights, [X[0]-1, X[-1]+1])
-    fig, ax = plt.subplots(len(particles_range), 3, sharex = True, sharey = True)
+    fig, ax = plt.subplots(len(particles_range), 3, sharex = True, sharey = True,
+                           squeeze = False)
     
     #fig.suptitle(algorithm + " on dataset " + str(num_dataset))
     
@@ -87,23 +97,14 @@ def plot(num_dataset, particles_range):
             current_ax.plot(true_x, true_y, 'k')
             current_ax.plot(X, Y, 'k*')
             
-            log_weights, w0, w1, w2 = [], [], [], []
-            with open(["csis", "smc", "is"][column] + "_" + str(num_dataset) + "_" + str(num_particles) + ".csv") as predictions:
-                for line in predictions:
-                    line = [float(i) for i in line.split(",")]
-                    log_weights.append(line[0])
-                    w0.append(line[1])
-                    w1.append(line[2])
-                    w2.append(line[3])
-            weights = normalize_weights(log_weights)
-            mean_weights = [empirical_mean(i, weights) for i in [w0, w1, w2]]
+            log_weights, particle_weights = load_dump(dump_filename(["csis", "smc", "is"][column], num_dataset, num_particles), cache=cache, dedupe=dedupe)
+            weights = normalize_log_weights(log_weights)
+            mean_weights = empirical_mean(particle_weights, weights)
             mean_x, mean_y = plotQuadratic(mean_weights, [X[0]-1, X[-1]+1])
             current_ax.set_xlim(X[0]-1, X[-1]+1)
             current_ax.set_ylim(min(Y)*1.1-max(Y)*0.1, max(Y)*1.1-min(Y)*0.1)
             #current_ax.plot(mean_x, mean_y, 'b--')
-            for particle in range(len(w0)):
-                particle_x, particle_y = plotQuadratic([w0[particle],w1[particle],w2[particle]], [X[0]-1, X[-1]+1])
-                current_ax.plot(particle_x, particle_y, 'b', alpha=min(1, 5*weights[particle]))
+            plotQuadratics(current_ax, particle_weights, weights, [X[0]-1, X[-1]+1], min_weight)
     
     for i in range(len(particles_range)):
         ax[i, 0].set_ylabel(str(particles_range[i]) + " particles")
@@ -112,29 +113,36 @@ def plot(num_dataset, particles_range):
     
     fig.tight_layout()
     filename = "inference_" + str(num_dataset) + "_" + "_".join([str(i) for i in particles_range]) + ".pdf"
-    fig.savefig(filename, bbox_inches='tight')
+    save_figure(fig, filename)
     
-def plotError(num_dataset, particles_range, log=False):
+def plotError(num_dataset, particles_range, log=False, dedupe=False, cache=True):
+    """Plots the posterior predictive mean squared error and mean log
+    predictive density of the test data of each algorithm, as described in the
+    README. With dedupe, identical particles are evaluated once.
+
+    Returns a list of (num_dataset, num_particles, algorithm, mse, lpd)
+    tuples, one per algorithm and number of particles, as taken by
+    analysis.metrics.make_metric_table."""
+    import matplotlib.pyplot as plt
+
     with open("data_" + str(num_dataset) + "_test.csv") as file:
         file.readline()
         X = [float(i) for i in file.readline().rstrip().split(",")]
         test_Y = [float(i) for i in file.readline().rstrip().split(",")]
     errors = {}
+    lpds = {}
+    rows = []
     for algorithm in ["csis", "smc", "is"]:
         errors[algorithm] = []
+        lpds[algorithm] = []
         for num_particles in particles_range:
-            log_weights, w0, w1, w2 = [], [], [], []
-            with open(algorithm + "_" + str(num_dataset) + "_" + str(num_particles) + ".csv") as predictions:
-                for line in predictions:
-                    line = [float(i) for i in line.split(",")]
-                    log_weights.append(line[0])
-                    w0.append(line[1])
-                    w1.append(line[2])
-                    w2.append(line[3])
-            weights = normalize_weights(log_weights)
-            predicted_weights = np.array([empirical_mean(i, weights) for i in [w0, w1, w2]])
-            predicted_Y = np.array([quadratic(predicted_weights, x) for x in X])
-            errors[algorithm].append(sum([i**2 for i in predicted_Y - test_Y])/len(test_Y))
+            log_weights, particle_weights = load_dump(dump_filename(algorithm, num_dataset, num_particles), cache=cache, dedupe=dedupe)
+            mse, lpd = posteriorPredictive(log_weights, particle_weights, X, test_Y)
+            errors[algorithm].append(mse)
+            lpds[algorithm].append(lpd)
+            rows.append((num_dataset, num_particles, algorithm, mse, lpd))
+
+    fig = plt.figure()
     for algorithm in errors:
         if log:
             plt.loglog(particles_range, errors[algorithm], label = algorithm)
@@ -144,12 +152,62 @@ def plotError(num_dataset, particles_range, log=False):
         plt.ylabel("Mean Squared Error of Predictions")
     plt.legend()
     if log:
-        plt.savefig("test_log_error_" + str(num_dataset) + ".pdf")
+        save_figure(fig, "test_log_error_" + str(num_dataset) + ".pdf")
     else:
-        plt.savefig("test_error_" + str(num_dataset) + ".pdf")
+        save_figure(fig, "test_error_" + str(num_dataset) + ".pdf")
+
+    # The log predictive density can be negative, so it only gets a log x axis
+    fig = plt.figure()
+    for algorithm in lpds:
+        plt.semilogx(particles_range, lpds[algorithm], label = algorithm)
+    plt.xlabel("Number of Particles")
+    plt.ylabel("Mean Log Predictive Density")
+    plt.legend()
+    save_figure(fig, "test_lpd_" + str(num_dataset) + ".pdf")
+
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset-num-list', nargs='+', type=int, default=[1],
+                        help='space separated list of dataset numbers (default: 1)')
+    parser.add_argument('--num-particles-list', nargs='+', type=int,
+                        default=[10, 20, 40, 80, 160, 320, 640, 1280, 2560],
+                        help='space separated list of number of particles')
+    parser.add_argument('--linear', dest='log', action='store_false',
+                        help='draw test_error_{dataset_num}.pdf with a linear '
+                        'instead of test_log_error_{dataset_num}.pdf with a '
+                        'logarithmic error axis')
+    parser.add_argument('--inference', action='store_true',
+                        help='also draw the particles of every three '
+                        'consecutive numbers of particles to '
+                        'inference_{dataset_num}_{n1}_{n2}_{n3}.pdf')
+    parser.add_argument('--min-weight', type=float, default=0,
+                        help='with --inference, leave out particles of lower '
+                        'normalized weight')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='always parse the inference result CSVs instead '
+                        'of reusing them from .analysis-cache/')
+    parser.add_argument('--metrics-table', default='metrics.csv',
+                        help='CSV (or .json) file the predictive mean squared '
+                        'error (mse) and mean log predictive density (lpd) '
+                        'of every dataset, number of particles and algorithm '
+                        'are saved to (default: metrics.csv)')
+    add_dedupe_argument(parser)
+    args = parser.parse_args(argv)
+
+    rows = []
+    for dataset in args.dataset_num_list:
+        rows.extend(plotError(dataset, args.num_particles_list, args.log,
+                              dedupe=args.dedupe, cache=args.cache))
+        if args.inference:
+            for i in range(0, len(args.num_particles_list), 3):
+                plot(dataset, args.num_particles_list[i:i + 3],
+                     args.min_weight, dedupe=args.dedupe, cache=args.cache)
+
+    print('\nMetrics saved to {}'.format(save_metric_table(
+        args.metrics_table, make_metric_table(['mse', 'lpd'], rows)
+    )))
 
 if __name__ == "__main__":
-    plotError(1, [10,20,40,80,160,320,640,1280,2560], True)
-    #for dataset in [1,2,3]:
-    #    for particles_range in [[10,20,40],[80,160,320],[640,1280,2560]]:
-    #        plot(dataset, particles_range)
\ No newline at end of file
+    main()
\ No newline at end of file
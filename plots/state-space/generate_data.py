@@ -1,26 +1,24 @@
-import matplotlib.pyplot as plt
+import argparse
 import numpy as np
-import pykalman
+import os
+import sys
 
-np.random.seed(1)
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.driver import add_jobs_argument  # noqa
+from analysis.dumps import DEFAULT_BLOCK_SIZE  # noqa
+from analysis.plotting import save_figure  # noqa
+from analysis.synthetic import sample_state_space, \
+    sample_state_space_blocks, write_state_space_sequences  # noqa
 
 
-def main():
-    model = np.genfromtxt('model.csv', delimiter=',')
-    initial_mean, initial_variance, transition_multiplier, transition_offset, \
-        transition_variance, emission_multiplier, emission_offset, \
-        emission_variance = model
-
-    kf = pykalman.KalmanFilter(
-        initial_state_mean=[initial_mean],
-        initial_state_covariance=[[initial_variance]],
-        transition_matrices=[[transition_multiplier]],
-        transition_offsets=[transition_offset],
-        transition_covariance=[[transition_variance]],
-        observation_matrices=[[emission_multiplier]],
-        observation_offsets=[emission_offset],
-        observation_covariance=[[emission_variance]]
-    )
+def write_datasets(model, rng):
+    """Writes data_{1..10}.csv, sequences of 10 to 100 timesteps from the
+    model, data_{11..20}.csv, noisy sines of the same lengths, and data.pdf.
+    """
+
+    import matplotlib.pyplot as plt
 
     num_timesteps_list = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
 
@@ -28,11 +26,16 @@ def main():
     period = 20
     noise_variance = 0.1
 
+    # A prefix of a sequence of the model is a shorter sequence of it, so all
+    # ten are drawn at once.
+    _, model_observations = sample_state_space(
+        rng, model, len(num_timesteps_list), max(num_timesteps_list)
+    )
+
     fig, axs = plt.subplots(10, 2)
     fig.set_size_inches(8, 20)
     for i, num_timesteps in enumerate(num_timesteps_list):
-        _, observations = kf.sample(num_timesteps)
-        observations = np.reshape(observations, (-1))
+        observations = model_observations[i, :num_timesteps]
         observations_reshaped = np.reshape(observations, (1, -1))
         np.savetxt(
             'data_{}.csv'.format(i + 1), observations_reshaped, delimiter=','
@@ -44,7 +47,7 @@ def main():
         # sin
         observations = amplitude * \
             np.sin(np.arange(num_timesteps) * 2 * np.pi / period) + \
-            np.random.randn(num_timesteps) * np.sqrt(noise_variance)
+            rng.standard_normal(num_timesteps) * np.sqrt(noise_variance)
         observations_reshaped = np.reshape(observations, (1, -1))
         np.savetxt(
             'data_{}.csv'.format(i + 11), observations_reshaped, delimiter=','
@@ -54,7 +57,45 @@ def main():
         axs[i][1].plot(observations)
 
     fig.tight_layout()
-    fig.savefig('data.pdf', bbox_inches='tight')
+    save_figure(fig, 'data.pdf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1,
+                        help='seed of the np.random.SeedSequence every '
+                        'sequence is drawn from (default: 1)')
+    parser.add_argument('--num-sequences', type=int,
+                        help='instead of data_{1..20}.csv, draw this many '
+                        'sequences from model.csv into --output')
+    parser.add_argument('--num-timesteps', type=int, default=100,
+                        help='length of the --num-sequences sequences '
+                        '(default: 100)')
+    parser.add_argument('--output', default='sequences.csv',
+                        help='file the --num-sequences sequences are written '
+                        'to: the latents and observations as binary arrays '
+                        'if it ends in .npz, otherwise the observations as '
+                        'CSV, one sequence per line (default: sequences.csv)')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='number of --num-sequences sequences drawn at a '
+                        'time, each block from its own random stream; the '
+                        'sequences depend on it and --seed but not on --jobs '
+                        '(default: {})'.format(DEFAULT_BLOCK_SIZE))
+    add_jobs_argument(parser)
+    args = parser.parse_args(argv)
+
+    model = np.genfromtxt('model.csv', delimiter=',')
+
+    if args.num_sequences is None:
+        write_datasets(model, np.random.default_rng(args.seed))
+        return
+
+    latents, observations = sample_state_space_blocks(
+        model, args.num_sequences, args.num_timesteps, seed=args.seed,
+        block_size=args.block_size, jobs=args.jobs
+    )
+    write_state_space_sequences(args.output, latents, observations)
+    print('{} sequences saved to {}'.format(args.num_sequences, args.output))
 
 
 if __name__ == '__main__':
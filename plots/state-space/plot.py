@@ -1,149 +1,74 @@
 import argparse
-import matplotlib.pyplot as plt
+import functools
 import numpy as np
-import pykalman
-import scipy.misc
-import scipy.stats
-
-
-def empirical_expectation(particle_values, normalized_weights, f):
-    """Returns empirical expectation.
-
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-        f: function that takes np.ndarray [dim_1, ..., dim_N] and returns
-            np.ndarray [out_dim_1, ..., out_dim_M]
-
-    output: np.ndarray [out_dim_1, ..., out_dim_M]
-    """
-
-    result = 0
-    for p in range(len(normalized_weights)):
-        f_temp = f(particle_values[p])
-        result += normalized_weights[p] * f_temp
-
-    return result
-
-
-def empirical_mean(particle_values, normalized_weights):
-    """Returns empirical mean.
-
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-
-    output: np.ndarray [dim_1, ..., dim_N]
-    """
-
-    return empirical_expectation(
-        particle_values, normalized_weights, lambda x: x
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.anytime import add_anytime_argument, evaluate_anytime, \
+    prefix_estimates  # noqa
+from analysis.driver import add_jobs_argument, evaluation_grid  # noqa
+from analysis.dumps import add_dedupe_argument, dump_filename, \
+    iter_dump_blocks, load_dump  # noqa
+from analysis.ground_truth import state_space_posterior  # noqa
+from analysis.metrics import metric_series, metric_table, \
+    save_metric_table  # noqa
+from analysis.moments import MomentAccumulator, empirical_moments, \
+    normalize_log_weights  # noqa
+from analysis.plotting import save_figure  # noqa
+from analysis.profiling import Profiler, add_profile_argument  # noqa
+
+
+def evaluate_cell(cache, dedupe, dataset_num, num_particles, algorithm):
+    """Returns posterior means and variances, each np.ndarray [T]."""
+
+    log_weights, particle_values = load_dump(
+        dump_filename(algorithm, dataset_num, num_particles), cache=cache,
+        dedupe=dedupe
+    )
+    moments = empirical_moments(
+        particle_values, normalize_log_weights(log_weights)
+    )
+    return moments[0], moments[1]
+
+
+def evaluate_run(cache, run_size, num_particles_list, dataset_num,
+                 algorithm):
+    """Returns {num_particles: (means, variances)} of the first num_particles
+    particles of one run of run_size particles, for every entry of
+    num_particles_list."""
+
+    def estimate(accumulator):
+        moments = accumulator.moments()
+        return moments[0], moments[1]
+
+    return prefix_estimates(
+        iter_dump_blocks(
+            dump_filename(algorithm, dataset_num, run_size), cache=cache
+        ),
+        MomentAccumulator(max_order=2),
+        num_particles_list,
+        estimate
     )
 
 
-def empirical_variance(particle_values, normalized_weights):
-    """Returns empirical variance.
-
-    input:
-        particle_values: np.ndarray [num_particles, dim_1, ..., dim_N]
-        normalized_weights: np.ndarray [num_particles]
-
-    output: np.ndarray [dim_1, ..., dim_N]
-    """
-
-    return empirical_expectation(
-        particle_values, normalized_weights, lambda x: x**2
-    ) - empirical_mean(particle_values, normalized_weights)**2
+def get_l2(true_values, values):
+    """Returns the L2 distance between two np.ndarray [T]."""
 
+    return np.sqrt(np.sum((true_values - values)**2))
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--dataset-num-list', nargs='+', type=int,
-                        help='space separated list of dataset numbers')
-    parser.add_argument('--num-particles-list', nargs='+', type=int,
-                        help='space separated list of number of particles')
-    parser.add_argument('--algorithms', nargs='+', type=str,
-                        help='space separated list of algorithms')
-    args = parser.parse_args()
-
-    model = np.genfromtxt('model.csv', delimiter=',')
-    initial_mean, initial_variance, transition_multiplier, transition_offset, \
-        transition_variance, emission_multiplier, emission_offset, \
-        emission_variance = model
-
-    kf = pykalman.KalmanFilter(
-        initial_state_mean=[initial_mean],
-        initial_state_covariance=[[initial_variance]],
-        transition_matrices=[[transition_multiplier]],
-        transition_offsets=[transition_offset],
-        transition_covariance=[[transition_variance]],
-        observation_matrices=[[emission_multiplier]],
-        observation_offsets=[emission_offset],
-        observation_covariance=[[emission_variance]]
-    )
 
-    true_state_means = {}
-    true_state_variances = {}
-    particle_values = {}
-    normalized_weights = {}
-    posterior_means = {}
-    posterior_variances = {}
-    data = {}
-    for dataset_num in args.dataset_num_list:
-        data[dataset_num] = np.genfromtxt(
-            'data_{}.csv'.format(dataset_num), delimiter=','
-        )
+def plot_inference(data, true_state_means, true_state_variances,
+                   posterior_means, posterior_variances, dataset_num_list,
+                   num_particles_list, algorithms):
+    """Plots inference_{dataset_num}_{num_particles}.pdf of every cell."""
 
-        true_state_means[dataset_num], true_state_variances[dataset_num] = \
-            kf.smooth(data[dataset_num])
-        true_state_means[dataset_num] = \
-            np.reshape(true_state_means[dataset_num], (-1))
-        true_state_variances[dataset_num] = \
-            np.reshape(true_state_variances[dataset_num], (-1))
-
-        particle_values[dataset_num] = {}
-        normalized_weights[dataset_num] = {}
-        posterior_means[dataset_num] = {}
-        posterior_variances[dataset_num] = {}
-
-        for num_particles in args.num_particles_list:
-            particle_values[dataset_num][num_particles] = {}
-            normalized_weights[dataset_num][num_particles] = {}
-            posterior_means[dataset_num][num_particles] = {}
-            posterior_variances[dataset_num][num_particles] = {}
-
-            for algorithm in args.algorithms:
-                inference_result = np.genfromtxt('{}_{}_{}.csv'.format(
-                    algorithm, dataset_num, num_particles
-                ), delimiter=',')
-                if len(np.shape(inference_result)) == 1:
-                    inference_result = np.reshape(inference_result, (1, -1))
-
-                unnormalized_log_weights = inference_result[:, 0]
-                normalized_log_weights = unnormalized_log_weights - \
-                    scipy.misc.logsumexp(unnormalized_log_weights)
-                normalized_weights[dataset_num][num_particles][algorithm] = \
-                    np.exp(normalized_log_weights)
-
-                particle_values[dataset_num][num_particles][algorithm] = \
-                    inference_result[:, 1:]
-
-                posterior_means[dataset_num][num_particles][algorithm] = \
-                    empirical_mean(
-                        particle_values[dataset_num][num_particles][algorithm],
-                        normalized_weights[dataset_num][num_particles][
-                            algorithm]
-                )
-                posterior_variances[dataset_num][num_particles][algorithm] = \
-                    empirical_variance(
-                        particle_values[dataset_num][num_particles][algorithm],
-                        normalized_weights[dataset_num][num_particles][
-                            algorithm]
-                )
+    import matplotlib.pyplot as plt
 
-    # Plot inference_{dataset_num}_{num_particles}.pdf
-    for dataset_num in args.dataset_num_list:
-        for num_particles in args.num_particles_list:
+    for dataset_num in dataset_num_list:
+        for num_particles in num_particles_list:
             fig, ax = plt.subplots(1, 1)
             fig.suptitle('{} particle{}\nDataset {}'.format(
                 num_particles,
@@ -167,7 +92,7 @@ def main():
                 alpha=0.15,
                 color=temp[0].get_color()
             )
-            for algorithm in args.algorithms:
+            for algorithm in algorithms:
                 temp = ax.plot(
                     posterior_means[dataset_num][num_particles][algorithm],
                     linewidth=1,
@@ -195,39 +120,35 @@ def main():
             filename = 'inference_{0}_{1}.pdf'.format(
                 dataset_num, num_particles
             )
-            fig.savefig(filename, bbox_inches='tight')
-            plt.close(fig)
-            print('\nPlot saved to {}'.format(filename))
+            print('\nPlot saved to {}'.format(save_figure(fig, filename)))
 
-    # Plot meanvarl2_{dataset_num}_{num_particles}.pdf
-    for dataset_num in args.dataset_num_list:
+
+def plot_metrics(table, dataset_num_list, num_particles_list, algorithms):
+    """Plots meanvarl2_{dataset_num}.pdf from a table made by
+    analysis.metrics.metric_table."""
+
+    import matplotlib.pyplot as plt
+
+    for dataset_num in dataset_num_list:
         fig, axs = plt.subplots(2, 2)
         fig.suptitle('L2 between state means and variances\nDataset {}'.format(
             dataset_num
         ), fontsize=14)
 
-        for algorithm in args.algorithms:
-            mean_l2 = []
-            variance_l2 = []
-            for num_particles in args.num_particles_list:
-                mean_l2.append(np.sqrt(np.sum((
-                    true_state_means[dataset_num] -
-                    posterior_means[dataset_num][num_particles][algorithm]
-                )**2)))
-                variance_l2.append(np.sqrt(np.sum((
-                    true_state_variances[dataset_num] -
-                    posterior_variances[dataset_num][num_particles][algorithm]
-                )**2)))
-
-            axs[0][0].plot(args.num_particles_list, mean_l2, label=algorithm)
-            axs[0][1].loglog(args.num_particles_list, mean_l2, label=algorithm)
-            axs[1][0].plot(
-                args.num_particles_list, variance_l2, label=algorithm
+        for algorithm in algorithms:
+            mean_l2 = metric_series(
+                table, 'mean_l2', dataset_num, algorithm, num_particles_list
             )
-            axs[1][1].loglog(
-                args.num_particles_list, variance_l2, label=algorithm
+            variance_l2 = metric_series(
+                table, 'variance_l2', dataset_num, algorithm,
+                num_particles_list
             )
 
+            axs[0][0].plot(num_particles_list, mean_l2, label=algorithm)
+            axs[0][1].loglog(num_particles_list, mean_l2, label=algorithm)
+            axs[1][0].plot(num_particles_list, variance_l2, label=algorithm)
+            axs[1][1].loglog(num_particles_list, variance_l2, label=algorithm)
+
         axs[0][0].set_xticks([])
         axs[0][1].set_xticks([])
         axs[0][0].set_ylabel('$L_2(\mu_{1:T}, \hat \mu_{1:T})$')
@@ -239,9 +160,121 @@ def main():
         filename = 'meanvarl2_{}.pdf'.format(dataset_num)
 
         fig.tight_layout(rect=[0, 0, 1, 0.92])
-        fig.savefig(filename, bbox_inches='tight')
-        plt.close(fig)
-        print('\nPlot saved to {}'.format(filename))
+        print('\nPlot saved to {}'.format(save_figure(fig, filename)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset-num-list', nargs='+', type=int,
+                        help='space separated list of dataset numbers')
+    parser.add_argument('--num-particles-list', nargs='+', type=int,
+                        help='space separated list of number of particles')
+    parser.add_argument('--algorithms', nargs='+', type=str,
+                        help='space separated list of algorithms')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='always parse the inference result CSVs and '
+                        'recompute the ground truth instead of reusing them '
+                        'from .analysis-cache/')
+    parser.add_argument('--metrics-table', default='metrics.csv',
+                        help='CSV (or .json) file the L2 distances of the '
+                        'posterior means and variances of every evaluated '
+                        'cell are saved to (default: metrics.csv)')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='only save --metrics-table, as JSON if its name '
+                        'ends in .json, without drawing any figure or '
+                        'importing matplotlib')
+    add_dedupe_argument(parser)
+    add_anytime_argument(parser)
+    add_jobs_argument(parser)
+    add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    if args.anytime_run is not None and args.dedupe:
+        parser.error('--dedupe merges particles, so it cannot be combined '
+                     'with --anytime-run')
+    if args.cprofile is not None and args.profile is None:
+        parser.error('--cprofile needs --profile')
+    profiler = Profiler(args.profile, args.cprofile).start()
+
+    true_state_means = {}
+    true_state_variances = {}
+    posterior_means = {}
+    posterior_variances = {}
+    data = {}
+    for dataset_num in args.dataset_num_list:
+        data[dataset_num] = np.genfromtxt(
+            'data_{}.csv'.format(dataset_num), delimiter=','
+        )
+
+        true_state_means[dataset_num], true_state_variances[dataset_num] = \
+            state_space_posterior(
+                'model.csv', 'data_{}.csv'.format(dataset_num),
+                cache=args.cache
+            )
+
+        posterior_means[dataset_num] = {
+            num_particles: {} for num_particles in args.num_particles_list
+        }
+        posterior_variances[dataset_num] = {
+            num_particles: {} for num_particles in args.num_particles_list
+        }
+
+    if args.anytime_run is not None:
+        results = evaluate_anytime(
+            functools.partial(
+                evaluate_run, args.cache, args.anytime_run,
+                args.num_particles_list
+            ),
+            args.dataset_num_list, args.num_particles_list, args.algorithms,
+            jobs=args.jobs, profiler=profiler
+        )
+    else:
+        results = profiler.evaluate_grid(
+            functools.partial(evaluate_cell, args.cache, args.dedupe),
+            evaluation_grid(
+                args.dataset_num_list, args.num_particles_list,
+                args.algorithms
+            ),
+            jobs=args.jobs
+        )
+    for (dataset_num, num_particles, algorithm), (mean, variance) in \
+            results.items():
+        posterior_means[dataset_num][num_particles][algorithm] = mean
+        posterior_variances[dataset_num][num_particles][algorithm] = variance
+
+    if not args.metrics_only:
+        plot_inference(
+            data, true_state_means, true_state_variances, posterior_means,
+            posterior_variances, args.dataset_num_list,
+            args.num_particles_list, args.algorithms
+        )
+
+    table = metric_table(
+        {
+            dataset_num: (
+                true_state_means[dataset_num],
+                true_state_variances[dataset_num]
+            ) for dataset_num in args.dataset_num_list
+        },
+        results,
+        [
+            ('mean_l2', lambda true_moments, moments: get_l2(
+                true_moments[0], moments[0]
+            )),
+            ('variance_l2', lambda true_moments, moments: get_l2(
+                true_moments[1], moments[1]
+            ))
+        ]
+    )
+    print('\nMetrics saved to {}'.format(
+        save_metric_table(args.metrics_table, table)
+    ))
+
+    if not args.metrics_only:
+        plot_metrics(
+            table, args.dataset_num_list, args.num_particles_list,
+            args.algorithms
+        )
+    profiler.finish()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,77 @@
+"""Tests of analysis.diagnostics and the log weight loader it reads dumps
+with.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis import cache as cache_lib  # noqa
+from analysis.diagnostics import dump_weight_diagnostics, \
+    weight_diagnostics  # noqa
+from analysis.dumps import is_cached, load_dump, load_log_weights, \
+    read_dump_csv  # noqa
+
+
+def write_dump(filename, log_weights, particle_values):
+    np.savetxt(
+        filename, np.column_stack([log_weights, particle_values]),
+        delimiter=','
+    )
+
+
+def test_equal_weights():
+    diagnostics = weight_diagnostics(np.full(100, -3.0))
+
+    np.testing.assert_allclose(diagnostics.ess, 100)
+    np.testing.assert_allclose(diagnostics.max_weight, 0.01)
+    np.testing.assert_allclose(diagnostics.entropy, np.log(100))
+    assert np.isnan(diagnostics.pareto_k)
+
+
+def test_degenerate_weights():
+    log_weights = np.full(100, -np.inf)
+    log_weights[7] = 2.0
+    diagnostics = weight_diagnostics(log_weights)
+
+    np.testing.assert_allclose(diagnostics.ess, 1)
+    np.testing.assert_allclose(diagnostics.max_weight, 1)
+    np.testing.assert_allclose(diagnostics.entropy, 0, atol=1e-12)
+
+
+def test_load_log_weights_parses_only_without_cache(tmp_path):
+    rng = np.random.default_rng(12)
+    filename = str(tmp_path / 'is_1_50.csv')
+    write_dump(filename, rng.normal(size=50), rng.normal(size=(50, 4)))
+    expected = read_dump_csv(filename)[:, 0]
+
+    np.testing.assert_array_equal(
+        load_log_weights(filename, block_size=7), expected
+    )
+    assert not os.path.exists(str(tmp_path / cache_lib.CACHE_DIRNAME))
+
+    load_dump(filename)
+    assert is_cached(filename)
+    np.testing.assert_array_equal(load_log_weights(filename), expected)
+
+
+def test_dump_weight_diagnostics(tmp_path):
+    rng = np.random.default_rng(13)
+    log_weights = rng.normal(scale=2, size=300)
+    filename = str(tmp_path / 'is_1_300.csv')
+    write_dump(filename, log_weights, rng.normal(size=(300, 2)))
+
+    np.testing.assert_allclose(
+        dump_weight_diagnostics(filename, block_size=64),
+        weight_diagnostics(read_dump_csv(filename)[:, 0])
+    )
+
+    empty_filename = str(tmp_path / 'is_1_0.csv')
+    open(empty_filename, 'w').close()
+    assert load_log_weights(empty_filename).shape == (0,)
@@ -0,0 +1,136 @@
+"""Tests of analysis.dumps and the dump cache in analysis.cache.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis import cache as cache_lib  # noqa
+from analysis.dumps import deduplicate, is_cached, iter_dump_blocks, \
+    load_dump, read_dump_csv  # noqa
+from analysis.moments import chunked_moments, empirical_moments, \
+    normalize_log_weights  # noqa
+
+
+def write_dump(filename, log_weights, particle_values):
+    np.savetxt(
+        filename, np.column_stack([log_weights, particle_values]),
+        delimiter=','
+    )
+
+
+@pytest.mark.parametrize('block_sizes', [[3, 4, 1], [], [0, 2]])
+def test_array_appender_matches_save_array(tmp_path, block_sizes):
+    rows = np.arange(2.0 * sum(block_sizes)).reshape(-1, 2)
+    filename = str(tmp_path / 'rows.npy')
+
+    appender = cache_lib.ArrayAppender(filename)
+    for start, size in zip(np.cumsum([0] + block_sizes), block_sizes):
+        appender.append(rows[start:start + size])
+    appender.commit()
+
+    loaded = cache_lib.load_array(filename)
+    assert loaded.shape == (rows.shape if block_sizes else (0,))
+    np.testing.assert_array_equal(loaded, rows.reshape(loaded.shape))
+    assert os.listdir(str(tmp_path)) == ['rows.npy']
+
+
+def test_array_appender_discard_leaves_nothing(tmp_path):
+    appender = cache_lib.ArrayAppender(str(tmp_path / 'rows.npy'))
+    appender.append(np.ones((3, 2)))
+    appender.discard()
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_dump_blocks_fill_cache(tmp_path):
+    rng = np.random.default_rng(5)
+    filename = str(tmp_path / 'is_1_50.csv')
+    write_dump(filename, rng.normal(size=50), rng.normal(size=(50, 3)))
+    expected = read_dump_csv(filename)
+
+    for _ in range(2):
+        blocks = list(iter_dump_blocks(filename, block_size=7))
+        assert [len(log_weights) for log_weights, _ in blocks] == \
+            [7] * 7 + [1]
+        np.testing.assert_array_equal(
+            np.column_stack([np.concatenate([b[0] for b in blocks]),
+                             np.concatenate([b[1] for b in blocks])]),
+            expected
+        )
+        assert is_cached(filename)
+
+    log_weights, particle_values = load_dump(filename)
+    np.testing.assert_array_equal(log_weights, expected[:, 0])
+    np.testing.assert_array_equal(particle_values, expected[:, 1:])
+
+
+def test_dump_blocks_stopped_early_leave_no_entry(tmp_path):
+    rng = np.random.default_rng(6)
+    filename = str(tmp_path / 'is_1_50.csv')
+    write_dump(filename, rng.normal(size=50), rng.normal(size=(50, 3)))
+
+    blocks = iter_dump_blocks(filename, block_size=7)
+    next(blocks)
+    blocks.close()
+
+    assert not is_cached(filename)
+    assert os.listdir(str(tmp_path / cache_lib.CACHE_DIRNAME)) == []
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_empty_dump_has_no_blocks(tmp_path, cache):
+    filename = str(tmp_path / 'is_1_0.csv')
+    open(filename, 'w').close()
+
+    assert list(iter_dump_blocks(filename, cache=cache)) == []
+    assert not is_cached(filename)
+    with pytest.raises(ValueError):
+        chunked_moments(iter_dump_blocks(filename, cache=cache))
+
+
+def test_deduplicate_sums_weights_in_order_of_appearance():
+    log_weights = np.append(np.log([1.0, 2.0, 3.0, 4.0]), -np.inf)
+    particle_values = np.array([[1.0, 2.0], [0.0, 5.0], [1.0, 2.0],
+                                [0.0, 5.0], [7.0, 7.0]])
+
+    dump = deduplicate(log_weights, particle_values)
+    np.testing.assert_allclose(np.exp(dump.log_weights), [4.0, 6.0, 0.0])
+    np.testing.assert_array_equal(
+        dump.particle_values, [[1.0, 2.0], [0.0, 5.0], [7.0, 7.0]]
+    )
+
+
+def test_deduplicate_keeps_moments(tmp_path):
+    rng = np.random.default_rng(10)
+    log_weights = rng.normal(scale=3, size=200)
+    particle_values = rng.integers(4, size=(200, 2)).astype(float)
+    filename = str(tmp_path / 'smc_1_200.csv')
+    write_dump(filename, log_weights, particle_values)
+
+    dump = load_dump(filename, dedupe=True)
+    assert len(dump.log_weights) <= 16
+    np.testing.assert_allclose(
+        empirical_moments(dump.particle_values,
+                          normalize_log_weights(dump.log_weights)),
+        empirical_moments(particle_values,
+                          normalize_log_weights(log_weights))
+    )
+    np.testing.assert_allclose(
+        chunked_moments(iter_dump_blocks(filename, block_size=64,
+                                         dedupe=True)),
+        chunked_moments(iter_dump_blocks(filename))
+    )
+
+
+def test_deduplicate_empty():
+    dump = deduplicate(np.zeros(0), np.zeros((0, 3)))
+    assert dump.log_weights.shape == (0,)
+    assert dump.particle_values.shape == (0, 3)
@@ -0,0 +1,179 @@
+"""Tests of analysis.ground_truth against brute-force references.
+
+Run from plots/ with `python -m pytest tests`. The exact posteriors are
+checked against enumerating every latent sequence or conditioning the joint
+Gaussian directly, so no reference library is needed.
+"""
+
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis import cache as cache_lib  # noqa
+from analysis.ground_truth import factorial_forward_backward, \
+    factorial_hmm_posterior, forward_backward, gaussian_log_likelihoods, \
+    hmm_posterior, kalman_smoother  # noqa
+from analysis.synthetic import HMM_MODEL, write_hmm_problem  # noqa
+
+
+def test_forward_backward_matches_enumeration():
+    rng = np.random.default_rng(0)
+    initial_probabilities, transition_matrix, means, variances = HMM_MODEL
+    num_states = len(initial_probabilities)
+    observations = rng.normal(size=5)
+    log_likelihoods = gaussian_log_likelihoods(means, variances, observations)
+
+    expected = np.zeros((num_states, len(observations)))
+    for states in itertools.product(range(num_states),
+                                    repeat=len(observations)):
+        log_probability = np.log(initial_probabilities[states[0]]) + sum(
+            np.log(transition_matrix[j, k])
+            for j, k in zip(states[:-1], states[1:])
+        ) + sum(log_likelihoods[t, k] for t, k in enumerate(states))
+        expected[states, range(len(observations))] += np.exp(log_probability)
+    expected /= np.sum(expected, axis=0)
+
+    np.testing.assert_allclose(
+        forward_backward(initial_probabilities, transition_matrix,
+                         log_likelihoods),
+        expected
+    )
+
+
+def test_forward_backward_batches_sequences():
+    rng = np.random.default_rng(1)
+    initial_probabilities, transition_matrix, means, variances = HMM_MODEL
+    log_likelihoods = gaussian_log_likelihoods(
+        means, variances, rng.normal(size=(4, 6))
+    )
+
+    batched = forward_backward(initial_probabilities, transition_matrix,
+                               log_likelihoods)
+    for i in range(len(log_likelihoods)):
+        np.testing.assert_allclose(
+            batched[i],
+            forward_backward(initial_probabilities, transition_matrix,
+                             log_likelihoods[i])
+        )
+
+
+def test_kalman_smoother_matches_joint_gaussian():
+    initial_mean, initial_variance, transition_multiplier, \
+        transition_offset, transition_variance, emission_multiplier, \
+        emission_offset, emission_variance = model = \
+        (0.5, 2.0, 0.8, 0.3, 0.7, 1.5, -0.2, 0.4)
+    num_timesteps = 6
+    observations = np.random.default_rng(2).normal(size=num_timesteps)
+
+    latent_means = np.empty(num_timesteps)
+    latent_variances = np.empty(num_timesteps)
+    latent_means[0] = initial_mean
+    latent_variances[0] = initial_variance
+    for t in range(1, num_timesteps):
+        latent_means[t] = transition_multiplier * latent_means[t - 1] + \
+            transition_offset
+        latent_variances[t] = transition_multiplier**2 * \
+            latent_variances[t - 1] + transition_variance
+    timesteps = np.arange(num_timesteps)
+    lags = np.subtract.outer(timesteps, timesteps)
+    latent_covariance = transition_multiplier**np.abs(lags) * \
+        np.where(lags >= 0, latent_variances[np.newaxis, :],
+                 latent_variances[:, np.newaxis])
+
+    cross_covariance = emission_multiplier * latent_covariance
+    observation_covariance = emission_multiplier * cross_covariance + \
+        emission_variance * np.eye(num_timesteps)
+    gain = np.linalg.solve(observation_covariance, cross_covariance).T
+    expected_means = latent_means + np.dot(
+        gain,
+        observations - emission_multiplier * latent_means - emission_offset
+    )
+    expected_variances = np.diag(
+        latent_covariance - np.dot(gain, cross_covariance)
+    )
+
+    means, variances = kalman_smoother(model, observations)
+    np.testing.assert_allclose(means, expected_means)
+    np.testing.assert_allclose(variances, expected_variances)
+
+
+def test_factorial_forward_backward_matches_enumeration():
+    initial_probabilities = np.array([0.3, 0.6, 0.5])
+    transition_matrices = np.array([
+        [[0.9, 0.1], [0.2, 0.8]],
+        [[0.7, 0.3], [0.4, 0.6]],
+        [[0.5, 0.5], [0.1, 0.9]]
+    ])
+    emission_weights = np.array([1.0, -0.5, 2.0])
+    emission_variance = 0.8
+    observations = np.array([0.4, 2.5, -0.3])
+    num_features = len(initial_probabilities)
+    num_timesteps = len(observations)
+
+    expected = np.zeros((num_features, num_timesteps))
+    total = 0
+    for bits in itertools.product(range(2),
+                                  repeat=num_features * num_timesteps):
+        states = np.reshape(bits, (num_timesteps, num_features))
+        probability = np.prod(np.where(
+            states[0], initial_probabilities, 1 - initial_probabilities
+        ))
+        for t in range(1, num_timesteps):
+            probability *= np.prod(transition_matrices[
+                range(num_features), states[t - 1], states[t]
+            ])
+        probability *= np.prod(np.exp(
+            -(observations - np.dot(states, emission_weights))**2 /
+            (2 * emission_variance)
+        ))
+        expected += probability * states.T
+        total += probability
+
+    np.testing.assert_allclose(
+        factorial_forward_backward(initial_probabilities, transition_matrices,
+                                   emission_weights, emission_variance,
+                                   observations),
+        expected / total
+    )
+
+
+def test_hmm_posterior_is_cached(tmp_path):
+    write_hmm_problem(str(tmp_path), 8)
+    model_filename = str(tmp_path / 'model.csv')
+    data_filename = str(tmp_path / 'data_1.csv')
+
+    expected = hmm_posterior(model_filename, data_filename, cache=False)
+    assert not os.path.exists(str(tmp_path / cache_lib.CACHE_DIRNAME))
+    for _ in range(2):
+        np.testing.assert_array_equal(
+            hmm_posterior(model_filename, data_filename), expected
+        )
+    assert os.listdir(str(tmp_path / cache_lib.CACHE_DIRNAME)) == \
+        ['data_1.csv.hmm_ground_truth.npz']
+
+
+def test_factorial_gibbs_ground_truth_needs_opt_in(tmp_path):
+    model_filename = str(tmp_path / 'model.csv')
+    data_filename = str(tmp_path / 'data_1.csv')
+    with open(model_filename, 'w') as f:
+        f.write('0.3,0.6,0.5\n0.9,0.1,0.2,0.8\n0.7,0.3,0.4,0.6\n'
+                '0.5,0.5,0.1,0.9\n1.0,-0.5,2.0\n0.8\n')
+    np.savetxt(data_filename, [[0.4, 2.5, -0.3]], delimiter=',')
+
+    with pytest.raises(ValueError):
+        factorial_hmm_posterior(model_filename, data_filename,
+                                max_exact_features=2)
+    with pytest.warns(UserWarning, match='Gibbs'):
+        marginals = factorial_hmm_posterior(
+            model_filename, data_filename, max_exact_features=2,
+            approximate=True
+        )
+    assert marginals.shape == (3, 3)
+    assert os.listdir(str(tmp_path / cache_lib.CACHE_DIRNAME)) == \
+        ['data_1.csv.factorial_hmm_gibbs_ground_truth.npz']
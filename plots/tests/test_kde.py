@@ -0,0 +1,48 @@
+"""Tests of analysis.kde against a direct sum of Gaussian densities.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.kde import gaussian_kernel_sum  # noqa
+
+
+def direct_kernel_sum(points, x, y, sigma):
+    grid_x, grid_y = np.meshgrid(x, y)
+    return np.sum(np.exp(
+        -((grid_x[..., np.newaxis] - points[:, 0])**2 +
+          (grid_y[..., np.newaxis] - points[:, 1])**2) / (2 * sigma**2)
+    ), axis=-1) / (2 * np.pi * sigma**2)
+
+
+def test_gaussian_kernel_sum_matches_direct_sum():
+    rng = np.random.default_rng(8)
+    points = rng.uniform(-1, 1, size=(20, 2))
+    x = np.linspace(-2, 2, 81)
+    y = np.linspace(-1.5, 1.5, 61)
+    sigma = 0.5
+
+    expected = direct_kernel_sum(points, x, y, sigma)
+    np.testing.assert_allclose(
+        gaussian_kernel_sum(points, x, y, sigma), expected,
+        atol=1e-2 * np.max(expected)
+    )
+
+
+def test_points_outside_grid_contribute_tails():
+    points = np.array([[1.5, 0.0], [10.0, 10.0]])
+    x = np.linspace(-1, 1, 41)
+    y = np.linspace(-1, 1, 41)
+
+    expected = direct_kernel_sum(points, x, y, 0.5)
+    np.testing.assert_allclose(
+        gaussian_kernel_sum(points, x, y, 0.5), expected,
+        atol=1e-2 * np.max(expected)
+    )
@@ -0,0 +1,55 @@
+"""Tests of analysis.moments: streamed moments against in-memory ones.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.moments import MomentAccumulator, chunked_moments, \
+    empirical_moments, normalize_log_weights  # noqa
+
+
+def split_blocks(log_weights, particle_values, block_sizes):
+    """Returns [(log_weights, particle_values)] of consecutive blocks of the
+    given sizes."""
+
+    bounds = np.cumsum([0] + list(block_sizes))
+    return [(log_weights[start:end], particle_values[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def test_chunked_moments_match_in_memory():
+    rng = np.random.default_rng(3)
+    log_weights = rng.normal(scale=5, size=100)
+    log_weights[[3, 50]] = -np.inf
+    particle_values = rng.normal(size=(100, 2, 3))
+    blocks = split_blocks(log_weights, particle_values, [1, 30, 0, 69])
+
+    np.testing.assert_allclose(
+        chunked_moments(blocks, max_order=3),
+        empirical_moments(particle_values,
+                          normalize_log_weights(log_weights), max_order=3)
+    )
+
+
+@pytest.mark.parametrize('blocks', [
+    [],
+    [(np.zeros(0), np.zeros((0, 2)))],
+    [(np.full(2, -np.inf), np.ones((2, 2)))]
+])
+def test_moments_without_weight_raise(blocks):
+    with pytest.raises(ValueError):
+        chunked_moments(blocks)
+
+    accumulator = MomentAccumulator()
+    for block in blocks:
+        accumulator.update(*block)
+    with pytest.raises(ValueError):
+        accumulator.moments()
@@ -0,0 +1,54 @@
+"""Tests of analysis.paths and the metric table I/O that goes through it.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis import paths  # noqa
+from analysis.metrics import load_metric_table, make_metric_table, \
+    save_metric_table  # noqa
+
+
+@pytest.fixture
+def output_directory(tmp_path):
+    directory = str(tmp_path / 'out')
+    paths.set_output_directory(directory)
+    yield directory
+    paths.set_output_directory(None)
+
+
+def test_output_filename_without_directory():
+    assert paths.output_filename('metrics.csv') == 'metrics.csv'
+
+
+def test_output_filename_with_directory(output_directory):
+    assert os.path.isdir(output_directory)
+    assert paths.output_filename('metrics.csv') == \
+        os.path.join(output_directory, 'metrics.csv')
+    assert paths.output_filename('/tmp/metrics.csv') == '/tmp/metrics.csv'
+
+
+@pytest.mark.parametrize('name', ['metrics.csv', 'metrics.json'])
+def test_metric_tables_are_written_to_output_directory_and_read_as_named(
+        output_directory, name, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    table = make_metric_table(
+        ['kl'], [(1, 10, 'is', 0.5), (1, 20, 'smc', 2.0)]
+    )
+
+    filename = save_metric_table(name, table)
+    assert filename == os.path.join(output_directory, name)
+    with pytest.raises(IOError):
+        load_metric_table(name)
+    loaded = load_metric_table(filename)
+    assert loaded.dtype.names == table.dtype.names
+    for column in table.dtype.names:
+        np.testing.assert_array_equal(loaded[column], table[column])
@@ -0,0 +1,64 @@
+"""Tests of analysis.streaming against in-memory marginals.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.moments import normalize_log_weights  # noqa
+from analysis.streaming import PosteriorAccumulator, \
+    stream_posterior  # noqa
+
+
+def test_posterior_accumulator_matches_in_memory():
+    rng = np.random.default_rng(4)
+    num_states = 3
+    log_weights = rng.normal(scale=5, size=60)
+    states = rng.integers(num_states, size=(60, 4))
+    weights = normalize_log_weights(log_weights)
+
+    accumulator = PosteriorAccumulator(num_states)
+    for start, end in [(0, 25), (25, 50), (50, 60)]:
+        accumulator.update(log_weights[start:end], states[start:end])
+
+    expected = np.array([
+        np.dot(weights, states == state) for state in range(num_states)
+    ])
+    np.testing.assert_allclose(accumulator.marginals(), expected)
+    np.testing.assert_allclose(accumulator.means(),
+                               np.dot(weights, states))
+
+
+def test_stream_posterior_matches_accumulator(tmp_path):
+    rng = np.random.default_rng(9)
+    log_weights = rng.normal(size=30)
+    states = rng.integers(3, size=(30, 5))
+    filename = str(tmp_path / 'is_1_30.csv')
+    np.savetxt(filename, np.column_stack([log_weights, states]),
+               delimiter=',')
+
+    np.testing.assert_allclose(
+        stream_posterior(filename, 3, block_size=4).marginals(),
+        PosteriorAccumulator(3).update(log_weights, states).marginals()
+    )
+
+
+def test_marginals_without_weight_raise():
+    accumulator = PosteriorAccumulator(3)
+    accumulator.update(np.full(2, -np.inf), np.zeros((2, 4)))
+    with pytest.raises(ValueError):
+        accumulator.marginals()
+    with pytest.raises(ValueError):
+        PosteriorAccumulator(3).marginals()
+
+
+def test_states_out_of_range_raise():
+    with pytest.raises(ValueError):
+        PosteriorAccumulator(3).update(np.zeros(2), [[0, 3], [1, 2]])
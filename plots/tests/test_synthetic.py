@@ -0,0 +1,74 @@
+"""Tests of the state-space sampler in analysis.synthetic.
+
+Run from plots/ with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir
+))
+from analysis.synthetic import STATE_SPACE_MODEL, \
+    sample_state_space, sample_state_space_blocks, \
+    write_state_space_sequences  # noqa
+
+
+def test_state_space_blocks_do_not_depend_on_jobs():
+    serial = sample_state_space_blocks(STATE_SPACE_MODEL, 10, 5, seed=7,
+                                       block_size=3, jobs=1)
+    parallel = sample_state_space_blocks(STATE_SPACE_MODEL, 10, 5, seed=7,
+                                         block_size=3, jobs=2)
+    for serial_array, parallel_array in zip(serial, parallel):
+        np.testing.assert_array_equal(serial_array, parallel_array)
+
+
+def test_state_space_samples_match_prior_moments():
+    initial_mean, initial_variance, transition_multiplier, \
+        transition_offset, transition_variance, emission_multiplier, \
+        emission_offset, emission_variance = model = \
+        (0.5, 2.0, 0.8, 0.3, 0.7, 1.5, -0.2, 0.4)
+    num_samples = 200000
+    latents, observations = sample_state_space(
+        np.random.default_rng(11), model, num_samples, 4
+    )
+
+    means = [initial_mean]
+    variances = [initial_variance]
+    for _ in range(3):
+        means.append(transition_multiplier * means[-1] + transition_offset)
+        variances.append(transition_multiplier**2 * variances[-1] +
+                         transition_variance)
+    tolerance = 5 / np.sqrt(num_samples)
+    np.testing.assert_allclose(np.mean(latents, axis=0), means,
+                               atol=tolerance * np.sqrt(max(variances)))
+    np.testing.assert_allclose(np.var(latents, axis=0), variances,
+                               rtol=tolerance * 2)
+    np.testing.assert_allclose(
+        np.var(observations - emission_multiplier * latents -
+               emission_offset, axis=0),
+        emission_variance, rtol=tolerance * 2
+    )
+
+
+def test_write_state_space_sequences(tmp_path):
+    latents, observations = sample_state_space_blocks(
+        STATE_SPACE_MODEL, 3, 6, block_size=2
+    )
+
+    csv_filename = str(tmp_path / 'sequences.csv')
+    write_state_space_sequences(csv_filename, latents, observations)
+    np.testing.assert_array_equal(
+        np.loadtxt(csv_filename, delimiter=','), observations
+    )
+
+    npz_filename = str(tmp_path / 'sequences.npz')
+    write_state_space_sequences(npz_filename, latents, observations)
+    with np.load(npz_filename) as sequences:
+        np.testing.assert_array_equal(sequences['latents'], latents)
+        np.testing.assert_array_equal(sequences['observations'],
+                                      observations)
+    assert sorted(os.listdir(str(tmp_path))) == \
+        ['sequences.csv', 'sequences.npz']
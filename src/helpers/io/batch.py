@@ -0,0 +1,143 @@
+# Python script which runs one of csv2edn.py, csv2hst.py or png2edn.py over
+# many files in a single process, so that Python and NumPy start up once rather
+# than once per file. Inputs are given as file names or glob patterns, and/or
+# as a manifest file listing one input per line.
+#
+# By default one EDN value per input is printed to stdout, one per line and in
+# input order. With --output-dir, each input is written to <output-dir>/<name>.edn
+# instead, or <output-dir>/<name>.obs with --format binary (see obsfile.py).
+# --jobs spreads the conversions over a pool of worker processes.
+#
+# Example:
+#
+#   > python batch.py png2edn '../../../resources/facebook-dataset/*.png' \
+#       --output-dir edn --jobs 0
+#   > <one .edn file per image in edn/>
+#
+#   > python batch.py csv2hst --manifest hits.txt --dims 50 50
+#   > <one 50x50 matrix in edn format per line>
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+#   - Pillow (http://python-pillow.org/), for png2edn
+
+import argparse
+import functools
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import csv2edn
+import csv2hst
+from edn import to_edn, write_edn
+from obsfile import EXTENSION as OBS_EXTENSION, save_obs
+
+CONVERTERS = ['csv2edn', 'csv2hst', 'png2edn']
+
+def get_converter(name):
+    if name == 'png2edn':
+        # Imported lazily so that the CSV converters do not need Pillow.
+        import png2edn
+        return png2edn
+    return {'csv2edn': csv2edn, 'csv2hst': csv2hst}[name]
+
+def expand_inputs(patterns, manifest=None):
+    """Returns the list of input files, in the order given. Patterns without
+    glob characters are kept as they are so that missing files are reported."""
+    if manifest is not None:
+        with open(manifest) as f:
+            patterns = list(patterns) + [
+                line.strip() for line in f
+                if line.strip() and not line.lstrip().startswith('#')]
+    filenames = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            filenames.extend(sorted(glob.glob(pattern)))
+        else:
+            filenames.append(pattern)
+    return filenames
+
+def output_filename(output_dir, filename, extension='.edn'):
+    return os.path.join(
+        output_dir, os.path.splitext(os.path.basename(filename))[0] + extension)
+
+def convert_file(converter_name, dims, output_dir, output_format, filename):
+    """Converts one file. Returns its EDN string, or the name of the written
+    file if output_dir is given."""
+    converter = get_converter(converter_name)
+    if converter_name == 'csv2hst':
+        array = converter.convert(filename, dims)
+    else:
+        array = converter.convert(filename)
+    if output_dir is None:
+        return to_edn(array)
+    if output_format == 'binary':
+        path = output_filename(output_dir, filename, OBS_EXTENSION)
+        save_obs(array, path)
+        return path
+    path = output_filename(output_dir, filename)
+    with open(path, 'w') as f:
+        write_edn(array, f)
+        f.write('\n')
+    return path
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Convert many files to edn format in one process.')
+    parser.add_argument('converter', choices=CONVERTERS)
+    parser.add_argument('inputs', nargs='*',
+                        help='input files or glob patterns (quote them)')
+    parser.add_argument('--manifest',
+                        help='file listing one input file or glob per line')
+    parser.add_argument('--output-dir',
+                        help='write <output-dir>/<name>.edn per input instead '
+                        'of printing one edn value per line')
+    parser.add_argument('--format', choices=['edn', 'binary'], default='edn',
+                        help='format of the files in --output-dir; binary '
+                        'writes <name>.obs observation files (see obsfile.py)')
+    parser.add_argument('--dims', nargs='+', type=int, default=[100, 100],
+                        help='number of bins along each dimension, for '
+                        'csv2hst (default: 100 100)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of worker processes (default: 1, 0 uses '
+                        'every core)')
+    args = parser.parse_args(argv)
+
+    if args.format == 'binary' and args.output_dir is None:
+        parser.error('--format binary needs --output-dir')
+    filenames = expand_inputs(args.inputs, args.manifest)
+    if len(filenames) == 0:
+        parser.error('no input files')
+    basenames = [os.path.basename(output_filename('', f)) for f in filenames]
+    if args.output_dir is not None:
+        if len(set(basenames)) < len(basenames):
+            parser.error('inputs with the same name would overwrite each '
+                         'other in --output-dir')
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+
+    convert = functools.partial(
+        convert_file, args.converter, args.dims, args.output_dir, args.format)
+    jobs = os.cpu_count() if args.jobs == 0 else args.jobs
+    if jobs == 1 or len(filenames) == 1:
+        results = map(convert, filenames)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(filenames)))
+        # Large chunks keep the per-file IPC overhead small; map still yields
+        # results in input order.
+        results = executor.map(
+            convert, filenames,
+            chunksize=max(1, len(filenames) // (4 * jobs)))
+
+    try:
+        for result in results:
+            if args.output_dir is None:
+                print(result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
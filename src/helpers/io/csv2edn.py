@@ -11,18 +11,32 @@
 #      [4 5 6]
 #      [7 8 9]]
 #
+#   > python csv2edn.py myfile.csv --binary myfile.obs
+#   > <myfile.obs, readable with obsfile.load_obs>
+#
 # Dependencies:
 #   - NumPy (http://www.numpy.org/)
 
-import sys, numpy
+import argparse, sys, numpy
+from edn import write_edn
+from obsfile import save_obs
+
+def convert(filename):
+    return numpy.genfromtxt(filename, delimiter=",")
 
 def main(argv):
-    numpy.set_printoptions(threshold=numpy.nan, linewidth=numpy.nan, formatter={'float': lambda x: format(x, '.3f')})
-    print(" ".join(
-        numpy.array_str(numpy.genfromtxt (argv[0], delimiter=","))
-            .replace('\n', '')
-            .split()
-    ))
+    parser = argparse.ArgumentParser(description='Numeric CSV file as a matrix in edn format.')
+    parser.add_argument('filename', help='numeric CSV file')
+    parser.add_argument('--binary', metavar='OUTPUT',
+                        help='write a binary observation file (see obsfile.py) instead of edn')
+    args = parser.parse_args(argv)
+
+    array = convert(args.filename)
+    if args.binary is not None:
+        save_obs(array, args.binary)
+    else:
+        write_edn(array, sys.stdout)
+        sys.stdout.write("\n")
 
 if __name__ == "__main__":
     main(sys.argv[1:])
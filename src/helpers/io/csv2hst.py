@@ -4,66 +4,84 @@
 # Python script which takes a filename of a numeric, 2-column, CSV file
 # containing 2d vectors. It ignores points outside of [-1, 1]x[-1, 1] and
 # outputs a 100x100 histogram matrix of the remaining points in
-# [edn](https://github.com/edn-format/edn) format.
+# [edn](https://github.com/edn-format/edn) format. The histogram is normalized
+# so that its largest bin is 1. Use --dims to change the grid size; it takes
+# one size per column of the CSV file.
 #
 # Example:
 #
 #   > python csv2hst.py mydata.csv
 #   > <100x100 matrix in edn format>
 #
+#   > python csv2hst.py mydata.csv --dims 50 80
+#   > <50x80 matrix in edn format>
+#
+#   > python csv2hst.py mydata.csv --binary mydata.obs
+#   > <mydata.obs, readable with obsfile.load_obs>
+#
 # Dependencies:
 #   - NumPy (http://www.numpy.org/)
 
+import argparse
 import numpy as np
 import sys
+from edn import write_edn
+from obsfile import save_obs
 
-def is_in_box(x, lower_bounds, upper_bounds):
-    num_dims = len(lower_bounds)
-    for d in range(num_dims):
-        if ((x[d] < lower_bounds[d]) or (x[d] > upper_bounds[d])):
-            return False
-    return True
+def move_to_unit_box(points):
+    """Returns the points inside [-1, 1]^d, rescaled to [0, 1]^d."""
+    points = np.asarray(points, dtype=float)
+    in_box = np.all((points >= -1) & (points <= 1), axis=1)
+    points = points[in_box]
+    points += 1
+    points /= 2
+    return points
 
-def move_to_unit_box(lst):
-    num_dims = len(lst[0])
-    res = []
-    for x in lst:
-        if is_in_box(x, np.repeat(-1, num_dims), np.repeat(1, num_dims)):
-            res.append((np.array(x) + 1) / 2)
-    return np.array(res)
+def get_grid_indices(points, dims):
+    """Returns the [num_points, d] grid cell indices of points in [0, 1]^d.
+    Points on the upper boundary fall in the last cell."""
+    indices = np.floor(points * dims).astype(int)
+    np.minimum(indices, np.asarray(dims) - 1, out=indices)
+    return indices
 
-def get_grid_index(x, dims):
-    res = [None] * len(dims)
-    for i in range(len(dims)):
-        res[i] = int(x[i] * dims[i])
-        if res[i] == dims[i]:
-            res[i] = res[i] - 1
-    return tuple(res)
+def get_grid_counts(points, dims):
+    flat_indices = np.ravel_multi_index(
+        np.transpose(get_grid_indices(points, dims)), dims)
+    counts = np.bincount(flat_indices, minlength=int(np.prod(dims)))
+    return np.reshape(counts, dims).astype(float)
 
-def get_grid_counts(lst, dims):
-    res = np.zeros(dims)
-    for x in lst:
-        res[get_grid_index(x, dims)] += 1
-    return res
-
-def gridify(lst, dims):
-    grid_counts = get_grid_counts(lst, dims)
+def gridify(points, dims):
+    grid_counts = get_grid_counts(points, dims)
     max_count = np.max(grid_counts)
-    if max_count == 0:
-        f = np.vectorize(float)
-    else:
-        f = np.vectorize(lambda grid_item: float(grid_item) / max_count)
-    return f(grid_counts)
+    if max_count > 0:
+        grid_counts /= max_count
+    return grid_counts
+
+def convert(filename, dims=(100, 100)):
+    points = np.loadtxt(filename, delimiter=",", ndmin=2)
+    if points.shape[1] != len(dims):
+        raise ValueError('{} has {} columns but {} grid sizes were given'.format(
+            filename, points.shape[1], len(dims)))
+    return gridify(move_to_unit_box(points), dims)
 
 def main(argv):
-    np.set_printoptions(threshold=np.nan, linewidth=np.nan, formatter={'float': lambda x: format(x, '.3f')})
-    lst = np.genfromtxt(argv[0], delimiter=",")
-    histogram = gridify(move_to_unit_box(lst), [100, 100])
-    print(" ".join(
-        np.array_str(histogram)
-            .replace('\n', '')
-            .split()
-    ))
+    parser = argparse.ArgumentParser(description='Histogram of 2d points in edn format.')
+    parser.add_argument('filename', help='numeric CSV file, one point per line')
+    parser.add_argument('--dims', nargs='+', type=int, default=[100, 100],
+                        help='number of bins along each dimension (default: 100 100)')
+    parser.add_argument('--binary', metavar='OUTPUT',
+                        help='write a binary observation file (see obsfile.py) instead of edn')
+    args = parser.parse_args(argv)
+
+    try:
+        histogram = convert(args.filename, args.dims)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.binary is not None:
+        save_obs(histogram, args.binary)
+    else:
+        write_edn(histogram, sys.stdout)
+        sys.stdout.write("\n")
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -0,0 +1,73 @@
+# Writer for NumPy arrays as nested [edn](https://github.com/edn-format/edn)
+# vectors, shared by csv2edn.py, csv2hst.py and png2edn.py.
+#
+# The array is written one innermost row at a time, so memory use is bounded by
+# the length of a row rather than by the size of the whole text, and nothing
+# depends on NumPy's print options.
+#
+# Example:
+#
+#   >>> import sys, numpy, edn
+#   >>> edn.write_edn(numpy.eye(2), sys.stdout, precision=1)
+#   [[1.0 0.0] [0.0 1.0]]
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+
+import io
+import numpy as np
+
+def get_row_formatter(dtype, precision):
+    """Returns a function mapping a 1d array of dtype to its space separated
+    edn elements."""
+    if dtype.kind == 'b':
+        return lambda row: " ".join(
+            'true' if x else 'false' for x in row.tolist())
+    if dtype.kind in 'iu':
+        element_format = '%d'
+    elif dtype.kind == 'f':
+        element_format = '%.{}f'.format(precision)
+    else:
+        raise ValueError('cannot write arrays of dtype {} as edn'.format(dtype))
+
+    row_formats = {}
+    def format_row(row):
+        if len(row) not in row_formats:
+            row_formats[len(row)] = " ".join([element_format] * len(row))
+        return row_formats[len(row)] % tuple(row.tolist())
+    return format_row
+
+def write_edn(array, stream, precision=3):
+    """Writes array to the text stream as nested edn vectors.
+
+    input:
+        array: array-like of booleans, integers or finite floats
+        stream: text file object
+        precision: number of decimals of floats
+    """
+    array = np.asarray(array)
+    if array.dtype.kind == 'f' and not np.all(np.isfinite(array)):
+        # Clojure 1.8's reader has no literal for nan or inf.
+        raise ValueError('cannot write nan or inf as edn')
+    format_row = get_row_formatter(array.dtype, precision)
+    if array.ndim == 0:
+        stream.write(format_row(array.reshape(1)))
+    else:
+        _write_vector(array, stream, format_row)
+
+def _write_vector(array, stream, format_row):
+    stream.write('[')
+    if array.ndim == 1:
+        stream.write(format_row(array))
+    else:
+        for i, subarray in enumerate(array):
+            if i > 0:
+                stream.write(' ')
+            _write_vector(subarray, stream, format_row)
+    stream.write(']')
+
+def to_edn(array, precision=3):
+    """Returns array as an edn string; see write_edn."""
+    stream = io.StringIO()
+    write_edn(array, stream, precision)
+    return stream.getvalue()
@@ -0,0 +1,178 @@
+# Python script which maps object detector hits from pixel coordinates into
+# the [-1, 1]x[-1, 1] frame that csv2hst.py and helpers.gmm/move-to-unit-box
+# work in, using the image size recorded in each hits file. It converts whole
+# directories in a single process.
+#
+# A hits file (see plots/gmm-variable-number-of-clusters/detector-hits-clustering/
+# gmm-object-counting-dataset) has the sections "Image id:", "Image size:"
+# (height width), "Category:", "Detections:", "Mid-points (x y):" and
+# "Bounding boxes (x1 y1 x2 y2 probability):". A pixel coordinate x becomes
+# x / width * 2 - 1 and y becomes y / height * 2 - 1.
+#
+# Output formats:
+#   - hits: a hits file like the input with normalized coordinates, the format
+#     of gmm-object-counting-dataset/normalized
+#   - csv: the normalized mid-points, one "x,y" line each, as read by
+#     csv2edn.py and csv2hst.py
+#   - edn: the normalized mid-points as a matrix in edn format
+#   - binary: the normalized mid-points as a binary observation file (see
+#     obsfile.py)
+#
+# Example:
+#
+#   > python hits2norm.py gmm-object-counting-dataset/raw --output-dir normalized
+#   > <normalized/1.txt, ..., normalized/9.txt>
+#
+#   > python hits2norm.py raw/1.txt --format edn
+#   > <22x2 matrix in edn format>
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+
+import argparse
+import io
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+from batch import expand_inputs
+from edn import write_edn
+from obsfile import save_obs
+
+FORMATS = {'hits': '.txt', 'csv': '.csv', 'edn': '.edn', 'binary': '.obs'}
+
+Hits = namedtuple('Hits', [
+    'image_id', 'image_size', 'category', 'midpoints', 'boxes'])
+
+def read_hits(filename):
+    """Returns the Hits of a hits file. image_size is (height, width),
+    midpoints is [num_detections, 2] and boxes is [num_detections, 5]."""
+    sections = {}
+    with open(filename) as f:
+        header = None
+        for line in f:
+            line = line.strip()
+            if line.endswith(':'):
+                header = line
+                sections[header] = []
+            elif line and header is not None:
+                sections[header].append(line)
+    try:
+        num_detections = int(sections['Detections:'][0])
+        midpoints = np.loadtxt(sections['Mid-points (x y):'], ndmin=2)
+        boxes = np.loadtxt(
+            sections['Bounding boxes (x1 y1 x2 y2 probability):'], ndmin=2)
+        hits = Hits(
+            image_id=sections['Image id:'][0],
+            image_size=tuple(int(x) for x in sections['Image size:'][0].split()),
+            category=sections['Category:'][0],
+            midpoints=np.reshape(midpoints, (-1, 2)),
+            boxes=np.reshape(boxes, (-1, 5)))
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError('{} is not a hits file: {!r}'.format(filename, e))
+    if len(hits.midpoints) != num_detections or len(hits.boxes) != num_detections:
+        raise ValueError('{} lists {} detections but has {} mid-points and {} boxes'.format(
+            filename, num_detections, len(hits.midpoints), len(hits.boxes)))
+    return hits
+
+def normalize_hits(hits):
+    """Returns hits with the mid-points and box corners mapped from pixels
+    into [-1, 1]x[-1, 1]. Box probabilities are kept."""
+    height, width = hits.image_size
+    scale = np.array([width, height], dtype=float)
+    boxes = hits.boxes.copy()
+    boxes[:, :4] = boxes[:, :4] / np.tile(scale, 2) * 2 - 1
+    return hits._replace(midpoints=hits.midpoints / scale * 2 - 1, boxes=boxes)
+
+def format_rows(array, formats):
+    return "".join(
+        "\t".join(formats) % tuple(row) + "\n" for row in array.tolist())
+
+def write_hits(hits, stream):
+    """Writes hits in the format read by read_hits, with coordinates to three
+    decimals and probabilities to six, as in the raw files."""
+    stream.write("Image id:\n{}\n\n".format(hits.image_id))
+    stream.write("Image size:\n{} {}\n\n".format(*hits.image_size))
+    stream.write("Category:\n{}\n\n".format(hits.category))
+    stream.write("Detections:\n{}\n\n".format(len(hits.midpoints)))
+    stream.write("Mid-points (x y):\n")
+    stream.write(format_rows(hits.midpoints, ['%.3f'] * 2))
+    stream.write("\nBounding boxes (x1 y1 x2 y2 probability):\n")
+    stream.write(format_rows(hits.boxes, ['%.3f'] * 4 + ['%.6f']))
+
+def write_output(hits, output_format, stream):
+    if output_format == 'hits':
+        write_hits(hits, stream)
+    elif output_format == 'csv':
+        stream.write("".join(
+            "%.3f,%.3f\n" % tuple(row) for row in hits.midpoints.tolist()))
+    elif output_format == 'edn':
+        write_edn(hits.midpoints, stream)
+        stream.write("\n")
+
+def convert_file(filename, output_format, output_dir):
+    """Normalizes one hits file. Returns its output as a string, or the name of
+    the written file if output_dir is given."""
+    hits = normalize_hits(read_hits(filename))
+    if output_dir is None:
+        stream = io.StringIO()
+        write_output(hits, output_format, stream)
+        return stream.getvalue()
+    path = os.path.join(
+        output_dir,
+        os.path.splitext(os.path.basename(filename))[0] + FORMATS[output_format])
+    if output_format == 'binary':
+        save_obs(hits.midpoints, path)
+    else:
+        with open(path, 'w') as f:
+            write_output(hits, output_format, f)
+    return path
+
+def is_hits_file(filename):
+    with open(filename) as f:
+        return f.readline().strip() == 'Image id:'
+
+def expand_directories(inputs):
+    """Returns inputs with every directory replaced by the hits files in it."""
+    filenames = []
+    for filename in inputs:
+        if os.path.isdir(filename):
+            filenames.extend(
+                path for path in sorted(
+                    os.path.join(filename, name) for name in os.listdir(filename)
+                    if name.endswith('.txt'))
+                if is_hits_file(path))
+        else:
+            filenames.append(filename)
+    return filenames
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Normalize detector hits into [-1, 1]x[-1, 1].')
+    parser.add_argument('inputs', nargs='+',
+                        help='hits files, directories of them or glob patterns')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='hits',
+                        help='output format (default: hits)')
+    parser.add_argument('--output-dir',
+                        help='write <output-dir>/<name><extension> per input '
+                        'instead of printing to stdout')
+    args = parser.parse_args(argv)
+
+    if args.format == 'binary' and args.output_dir is None:
+        parser.error('--format binary needs --output-dir')
+    filenames = expand_directories(expand_inputs(args.inputs))
+    if len(filenames) == 0:
+        parser.error('no hits files')
+    if args.output_dir is not None and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    for filename in filenames:
+        try:
+            result = convert_file(filename, args.format, args.output_dir)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.output_dir is None:
+            sys.stdout.write(result)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+# Binary observation files: an alternative to edn text for passing large
+# matrices, such as captcha images or histogram grids, to compile and infer.
+# They are not subject to argv length limits and need no text parsing.
+#
+# Layout (all integers big-endian, so a JVM DataInputStream reads it as is):
+#
+#   bytes 0-3        magic "OBSV"
+#   byte  4          format version, currently 1
+#   byte  5          element kind: 'b' boolean, 'i' signed int, 'u' unsigned
+#                    int, 'f' IEEE float
+#   byte  6          element size in bytes (1, 2, 4 or 8)
+#   byte  7          number of dimensions d
+#   bytes 8-(8+4d)   d uint32 dimension sizes
+#   rest             the elements in row-major order, big-endian
+#
+# Usage:
+#
+#   > python obsfile.py validate grid.obs captcha.obs
+#   > grid.obs: float64 [100 100]
+#   > captcha.obs: uint8 [50 200]
+#
+#   > python obsfile.py edn captcha.obs
+#   > <50x200 matrix in edn format>
+#
+# Files are written by csv2edn.py, csv2hst.py and png2edn.py with --binary, and
+# by batch.py with --format binary.
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+
+import argparse
+import os
+import struct
+import sys
+import numpy as np
+from edn import write_edn
+
+MAGIC = b'OBSV'
+VERSION = 1
+EXTENSION = '.obs'
+HEADER = struct.Struct('>4sBcBB')
+ELEMENT_SIZES = {b'b': (1,), b'i': (1, 2, 4, 8), b'u': (1, 2, 4, 8),
+                 b'f': (4, 8)}
+
+def get_dtype(kind, size):
+    if kind == b'b':
+        return np.dtype('?')
+    return np.dtype('>{}{}'.format(kind.decode('ascii'), size))
+
+def write_obs(array, stream):
+    """Writes array to the binary stream in the format described above."""
+    array = np.asarray(array)
+    kind = array.dtype.kind.encode('ascii')
+    if kind not in ELEMENT_SIZES or \
+            array.dtype.itemsize not in ELEMENT_SIZES[kind]:
+        raise ValueError('cannot write arrays of dtype {}'.format(array.dtype))
+    if array.ndim > 255:
+        raise ValueError('cannot write arrays of more than 255 dimensions')
+    stream.write(HEADER.pack(
+        MAGIC, VERSION, kind, array.dtype.itemsize, array.ndim))
+    stream.write(struct.pack('>{}I'.format(array.ndim), *array.shape))
+    stream.write(np.ascontiguousarray(
+        array, dtype=array.dtype.newbyteorder('>')).tobytes())
+
+def save_obs(array, filename):
+    with open(filename, 'wb') as f:
+        write_obs(array, f)
+
+def read_header(stream):
+    """Returns (dtype, shape) from the header of an observation file and leaves
+    the stream at the first element. Raises ValueError if it is malformed."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError('truncated header')
+    magic, version, kind, size, ndim = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError('not an observation file')
+    if version != VERSION:
+        raise ValueError('unsupported format version {}'.format(version))
+    if kind not in ELEMENT_SIZES or size not in ELEMENT_SIZES[kind]:
+        raise ValueError('unsupported element type {!r}{}'.format(
+            kind.decode('ascii', 'replace'), size))
+    shape_bytes = stream.read(4 * ndim)
+    if len(shape_bytes) < 4 * ndim:
+        raise ValueError('truncated header')
+    return get_dtype(kind, size), struct.unpack('>{}I'.format(ndim), shape_bytes)
+
+def load_obs(filename):
+    """Returns the array stored in an observation file, in native byte order."""
+    with open(filename, 'rb') as f:
+        dtype, shape = read_header(f)
+        count = int(np.prod(shape))
+        data = np.fromfile(f, dtype=dtype, count=count)
+        if len(data) < count or f.read(1):
+            raise ValueError('{}: data does not match the header shape {}'.format(
+                filename, list(shape)))
+    return data.astype(dtype.newbyteorder('='), copy=False).reshape(shape)
+
+def validate_obs(filename):
+    """Checks an observation file without reading its elements into memory.
+
+    Returns (dtype, shape). Raises ValueError if the header is malformed, the
+    file size does not match the header, or a float element is nan or inf.
+    """
+    with open(filename, 'rb') as f:
+        try:
+            dtype, shape = read_header(f)
+        except ValueError as e:
+            raise ValueError('{}: {}'.format(filename, e))
+        data_offset = f.tell()
+    expected_size = data_offset + int(np.prod(shape)) * dtype.itemsize
+    actual_size = os.path.getsize(filename)
+    if actual_size != expected_size:
+        raise ValueError('{}: {} bytes, expected {} for {} {}'.format(
+            filename, actual_size, expected_size, dtype.name, list(shape)))
+    if dtype.kind == 'f' and expected_size > data_offset:
+        data = np.memmap(filename, dtype=dtype, mode='r', offset=data_offset)
+        if not np.all(np.isfinite(data)):
+            raise ValueError('{}: contains nan or inf'.format(filename))
+    return dtype.newbyteorder('='), shape
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Check binary observation '
+                                     'files or print them in edn format.')
+    parser.add_argument('command', choices=['validate', 'edn'])
+    parser.add_argument('filenames', nargs='+')
+    args = parser.parse_args(argv)
+
+    num_invalid = 0
+    for filename in args.filenames:
+        try:
+            if args.command == 'validate':
+                dtype, shape = validate_obs(filename)
+                print('{}: {} {}'.format(
+                    filename, dtype.name, ' '.join(map(str, shape)).join('[]')))
+            else:
+                write_edn(load_obs(filename), sys.stdout)
+                sys.stdout.write('\n')
+        except (IOError, ValueError) as e:
+            num_invalid += 1
+            sys.stderr.write('{}\n'.format(e))
+    return 1 if num_invalid > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -11,21 +11,35 @@
 #      [4 5 6]
 #      [7 8 9]]
 #
+#   > python png2edn.py myfile.png --binary myfile.obs
+#   > <myfile.obs, readable with obsfile.load_obs>
+#
 # Dependencies:
 #   - Pillow (http://python-pillow.org/)
-#   - SciPy (https://www.scipy.org/)
 #   - NumPy (http://www.numpy.org/)
 
-import sys, numpy
-from scipy import misc
+import argparse, sys, numpy
+from edn import write_edn
+from obsfile import save_obs
+from PIL import Image
+
+def convert(filename):
+    # Same as the former scipy.misc.imread(filename, mode='L').
+    return numpy.asarray(Image.open(filename).convert('L'))
 
 def main(argv):
-    numpy.set_printoptions(threshold=numpy.nan, linewidth=numpy.nan)
-    print(" ".join(
-        numpy.array_str(misc.imread(argv[0], mode='L'))
-            .replace('\n', '')
-            .split()
-    ))
+    parser = argparse.ArgumentParser(description='8-bit PNG file as a matrix in edn format.')
+    parser.add_argument('filename', help='PNG file')
+    parser.add_argument('--binary', metavar='OUTPUT',
+                        help='write a binary observation file (see obsfile.py) instead of edn')
+    args = parser.parse_args(argv)
+
+    array = convert(args.filename)
+    if args.binary is not None:
+        save_obs(array, args.binary)
+    else:
+        write_edn(array, sys.stdout)
+        sys.stdout.write("\n")
 
 if __name__ == "__main__":
     main(sys.argv[1:])
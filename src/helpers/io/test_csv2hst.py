@@ -0,0 +1,48 @@
+# Tests of csv2hst.py against the per-point loops it replaced.
+#
+# Usage:
+#
+#   > python -m pytest test_csv2hst.py
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+#   - pytest (https://pytest.org/)
+
+import numpy as np
+import pytest
+import csv2hst
+
+def loop_histogram(points, dims):
+    """Returns the histogram of points as computed point by point before
+    csv2hst.py was vectorized."""
+    counts = np.zeros(dims)
+    for x in points:
+        if all(-1 <= x_d <= 1 for x_d in x):
+            index = [min(int((x_d + 1) / 2 * n), n - 1) for x_d, n in zip(x, dims)]
+            counts[tuple(index)] += 1
+    if np.max(counts) > 0:
+        counts /= np.max(counts)
+    return counts
+
+@pytest.mark.parametrize('dims', [(100, 100), (7, 3), (4, 5, 6)])
+def test_gridify_matches_loop(dims):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1.2, 1.2, size=(500, len(dims)))
+    points[:len(dims)] = np.eye(len(dims))
+    points[len(dims)] = -1
+    np.testing.assert_array_equal(
+        csv2hst.gridify(csv2hst.move_to_unit_box(points), dims),
+        loop_histogram(points, dims))
+
+def test_gridify_without_points_in_box():
+    histogram = csv2hst.gridify(
+        csv2hst.move_to_unit_box([[2.0, 0.0], [0.0, -3.0]]), (4, 4))
+    np.testing.assert_array_equal(histogram, np.zeros((4, 4)))
+
+def test_convert_checks_dims(tmp_path):
+    filename = str(tmp_path / 'points.csv')
+    np.savetxt(filename, [[0.5, -0.5], [1.0, 1.0]], delimiter=',')
+    histogram = csv2hst.convert(filename, (2, 2))
+    np.testing.assert_array_equal(histogram, [[0, 0], [1, 1]])
+    with pytest.raises(ValueError):
+        csv2hst.convert(filename, (2, 2, 2))
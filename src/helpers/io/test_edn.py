@@ -0,0 +1,46 @@
+# Tests of the streaming edn writer in edn.py.
+#
+# Usage:
+#
+#   > python -m pytest test_edn.py
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+#   - pytest (https://pytest.org/)
+
+import numpy as np
+import pytest
+from edn import to_edn
+
+def parse_edn(text):
+    """Returns the nested lists of numbers in an edn string of vectors."""
+    text = text.replace('[', ' [ ').replace(']', ' ] ')
+    stack = [[]]
+    for token in text.split():
+        if token == '[':
+            stack.append([])
+        elif token == ']':
+            vector = stack.pop()
+            stack[-1].append(vector)
+        else:
+            stack[-1].append(float(token))
+    return stack[0][0]
+
+def test_examples():
+    assert to_edn(np.eye(2), precision=1) == '[[1.0 0.0] [0.0 1.0]]'
+    assert to_edn(np.arange(3)) == '[0 1 2]'
+    assert to_edn(np.array([True, False])) == '[true false]'
+    assert to_edn(np.float64(2.5), precision=2) == '2.50'
+    assert to_edn(np.zeros((2, 0), dtype=int)) == '[[] []]'
+
+@pytest.mark.parametrize('shape', [(5,), (3, 4), (2, 3, 4)])
+def test_round_trip(shape):
+    array = np.random.default_rng(0).normal(size=shape)
+    np.testing.assert_allclose(
+        parse_edn(to_edn(array, precision=6)), array, atol=1e-6)
+
+def test_rejects_non_finite_and_unsupported():
+    with pytest.raises(ValueError):
+        to_edn(np.array([1.0, np.nan]))
+    with pytest.raises(ValueError):
+        to_edn(np.array(['a', 'b']))
@@ -0,0 +1,62 @@
+# Tests of the binary observation format in obsfile.py.
+#
+# Usage:
+#
+#   > python -m pytest test_obsfile.py
+#
+# Dependencies:
+#   - NumPy (http://www.numpy.org/)
+#   - pytest (https://pytest.org/)
+
+import io
+import numpy as np
+import pytest
+from obsfile import load_obs, save_obs, validate_obs, write_obs
+
+@pytest.mark.parametrize('array', [
+    np.random.default_rng(0).normal(size=(3, 4)),
+    np.arange(24, dtype=np.int16).reshape(2, 3, 4) - 12,
+    np.arange(10, dtype=np.uint8),
+    np.array([[True, False], [False, True]]),
+    np.float32(1.5),
+    np.zeros((0, 5))
+])
+def test_round_trip(tmp_path, array):
+    filename = str(tmp_path / 'array.obs')
+    save_obs(array, filename)
+    loaded = load_obs(filename)
+    assert loaded.dtype == array.dtype
+    np.testing.assert_array_equal(loaded, array)
+    dtype, shape = validate_obs(filename)
+    assert dtype == array.dtype
+    assert shape == array.shape
+
+def test_header_is_big_endian():
+    stream = io.BytesIO()
+    write_obs(np.array([[1, 2, 3]], dtype=np.int32), stream)
+    assert stream.getvalue() == (
+        b'OBSV\x01i\x04\x02' + b'\x00\x00\x00\x01\x00\x00\x00\x03' +
+        b'\x00\x00\x00\x01\x00\x00\x00\x02\x00\x00\x00\x03')
+
+def test_validate_rejects_bad_files(tmp_path):
+    filename = str(tmp_path / 'array.obs')
+    save_obs(np.ones((2, 2)), filename)
+    with open(filename, 'ab') as f:
+        f.write(b'\x00')
+    with pytest.raises(ValueError):
+        validate_obs(filename)
+    with pytest.raises(ValueError):
+        load_obs(filename)
+
+    save_obs(np.array([1.0, np.inf]), filename)
+    with pytest.raises(ValueError):
+        validate_obs(filename)
+
+    with open(filename, 'wb') as f:
+        f.write(b'NOPE\x01f\x08\x00')
+    with pytest.raises(ValueError):
+        validate_obs(filename)
+
+def test_write_rejects_unsupported_dtypes():
+    with pytest.raises(ValueError):
+        write_obs(np.array([1 + 2j]), io.BytesIO())